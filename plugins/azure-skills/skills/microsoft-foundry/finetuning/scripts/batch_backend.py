@@ -0,0 +1,143 @@
+"""
+batch_backend.py — Run many chat completions through the Batch API.
+
+For offline workloads (dataset scoring, judge grading, teacher generation)
+the Batch API trades latency for much higher throughput and ~50% lower cost
+than per-request calls. This module serializes requests into a batch JSONL,
+uploads it with common.upload_file(purpose="batch"), polls the batch job and
+maps each result back to its custom_id.
+
+On Azure the model must be a Global Batch deployment.
+
+Usage:
+    from batch_backend import run_batch, message_content
+
+    requests = [(str(i), {"model": "gpt-4o-batch", "messages": [...], "temperature": 0.0})
+                for i, row in enumerate(rows)]
+    results = run_batch(client, requests)
+    text = message_content(results["0"])  # None if that request failed
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import upload_file
+from jsonl_io import loads, write_jsonl
+
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def add_batch_arguments(parser):
+    """Add the --backend / batch options shared by the batch-capable scripts."""
+    parser.add_argument("--backend", choices=["sync", "batch"], default="sync",
+                        help="sync: one request per call (default). batch: submit all requests as one "
+                             "Batch API job — slower to finish, cheaper and higher throughput "
+                             "(Azure: requires a Global Batch deployment)")
+    parser.add_argument("--batch-poll-interval", type=int, default=30,
+                        help="Seconds between batch status checks (default: 30)")
+
+
+def message_content(body):
+    """Extract the assistant text from a chat completion body (dict), or None."""
+    try:
+        return body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def write_batch_file(requests, path, url="/chat/completions"):
+    """Write (custom_id, body) pairs as Batch API JSONL. Returns the count."""
+    return write_jsonl(path, ({"custom_id": custom_id, "method": "POST", "url": url, "body": body}
+                              for custom_id, body in requests))
+
+
+def wait_for_batch(client, batch_id, poll_interval=30):
+    """Poll a batch until it reaches a terminal state. Returns the batch."""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        if counts:
+            print(f"  Batch {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+        else:
+            print(f"  Batch {batch.status}")
+        if batch.status in TERMINAL_BATCH_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def _read_result_lines(client, file_id):
+    if not file_id:
+        return
+    content = client.files.content(file_id).content
+    for line in content.splitlines():
+        if line.strip():
+            yield loads(line)
+
+
+def run_batch(client, requests, poll_interval=30, completion_window="24h",
+              url="/chat/completions", cache=None):
+    """Run chat completion requests as one batch job.
+
+    requests: iterable of (custom_id, body) where body is the kwargs you'd
+    pass to chat.completions.create. Returns {custom_id: response body dict},
+    with None for requests that failed. With a ResponseCache, cached
+    requests are answered locally and only misses are submitted; fresh
+    results are written back to the cache.
+    """
+    requests = list(requests)
+    results = {}
+    pending = []
+    keys = {}
+    for custom_id, body in requests:
+        if cache is not None:
+            key = cache.make_key(client, body)
+            cached = cache.get(key)
+            if cached is not None:
+                results[custom_id] = json.loads(cached)
+                continue
+            keys[custom_id] = key
+        pending.append((custom_id, body))
+
+    if not pending:
+        return results
+    if results:
+        print(f"  {len(results)} request(s) answered from cache, batching {len(pending)}")
+
+    fd, path = tempfile.mkstemp(prefix="batch_", suffix=".jsonl")
+    os.close(fd)
+    try:
+        n = write_batch_file(pending, path, url=url)
+        print(f"📦 Submitting {n} requests as a batch job...")
+        input_file_id = upload_file(client, path, purpose="batch", dedup=False)
+    finally:
+        os.remove(path)
+
+    batch = client.batches.create(input_file_id=input_file_id, endpoint=url,
+                                  completion_window=completion_window)
+    print(f"  Batch ID: {batch.id}")
+    batch = wait_for_batch(client, batch.id, poll_interval)
+    if batch.status != "completed":
+        print(f"  ⚠️ Batch ended with status '{batch.status}' — collecting partial results")
+
+    failed = 0
+    for record in _read_result_lines(client, getattr(batch, "output_file_id", None)):
+        custom_id = record.get("custom_id")
+        response = record.get("response") or {}
+        if response.get("status_code") == 200 and response.get("body"):
+            results[custom_id] = response["body"]
+            if custom_id in keys:
+                cache.put(keys[custom_id], json.dumps(response["body"], ensure_ascii=False))
+        else:
+            results[custom_id] = None
+            failed += 1
+    # Requests reported only in the error file (or missing entirely) failed
+    for custom_id, _ in pending:
+        if custom_id not in results:
+            results[custom_id] = None
+            failed += 1
+    if failed:
+        print(f"  ⚠️ {failed} request(s) failed in the batch")
+    return results
@@ -0,0 +1,4 @@
+# Local benchmark harness for the API-bound finetuning scripts.
+# Usage:
+#   python scripts/benchmark/fake_server.py --port 8000      # stand-in OpenAI-compatible server
+#   python scripts/benchmark/run_benchmarks.py               # rows/sec + wall time per script
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""Local OpenAI-compatible stand-in server for benchmarking the finetuning scripts.
+
+Implements the subset of the API the scripts use — chat.completions, files,
+uploads, batches and fine_tuning.jobs (incl. list_events and checkpoints) —
+with configurable latency, rate-limit headers, quota enforcement and 429
+injection. No Azure resource needed; stdlib only.
+
+Serves both URL shapes the clients produce:
+  /v1/...                                   (openai.OpenAI with base_url=.../v1/)
+  /openai/deployments/<name>/chat/completions, /openai/files, ...  (openai.AzureOpenAI)
+
+Usage:
+  python fake_server.py --port 8000 --latency-ms 400 --rpm 600 --tpm 200000
+  OPENAI_BASE_URL=http://127.0.0.1:8000/v1/ AZURE_OPENAI_API_KEY=fake \\
+      python ../score_dataset.py --input train.jsonl --output scored.jsonl
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+_ids = itertools.count(1)
+
+
+def _new_id(prefix):
+    return f"{prefix}-{next(_ids):06d}"
+
+
+class LatencyModel:
+    """Per-request latency: a base distribution plus a per-output-token cost.
+
+    kind: "fixed" (always median), "uniform" (0.5x–1.5x median) or
+    "lognormal" (median with log-space spread `sigma`, i.e. a long tail).
+    """
+
+    def __init__(self, kind="lognormal", median_ms=300.0, sigma=0.5, per_token_ms=0.0):
+        self.kind = kind
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.per_token_ms = per_token_ms
+
+    def sample(self, completion_tokens):
+        if self.kind == "fixed":
+            base = self.median_ms
+        elif self.kind == "uniform":
+            base = random.uniform(0.5 * self.median_ms, 1.5 * self.median_ms)
+        else:
+            base = self.median_ms * math.exp(random.gauss(0.0, self.sigma))
+        return (base + self.per_token_ms * completion_tokens) / 1000.0
+
+
+class QuotaBucket:
+    """Server-side RPM/TPM enforcement mirroring Azure's per-deployment quota."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests, self.tokens = float(rpm or 0), float(tpm or 0)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, tokens):
+        """Consume quota. Returns (headers, retry_after_seconds or None)."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.updated = now - self.updated, now
+            if self.rpm:
+                self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60.0)
+            if self.tpm:
+                self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60.0)
+            waits = []
+            if self.rpm and self.requests < 1:
+                waits.append((1 - self.requests) * 60.0 / self.rpm)
+            if self.tpm and self.tokens < min(tokens, self.tpm):
+                waits.append((min(tokens, self.tpm) - self.tokens) * 60.0 / self.tpm)
+            if not waits:
+                if self.rpm:
+                    self.requests -= 1
+                if self.tpm:
+                    self.tokens -= tokens
+            headers = {}
+            if self.rpm:
+                headers["x-ratelimit-limit-requests"] = str(self.rpm)
+                headers["x-ratelimit-remaining-requests"] = str(max(0, int(self.requests)))
+            if self.tpm:
+                headers["x-ratelimit-limit-tokens"] = str(self.tpm)
+                headers["x-ratelimit-remaining-tokens"] = str(max(0, int(self.tokens)))
+            return headers, (max(waits) if waits else None)
+
+
+class FakeState:
+    """All server state: config, stored files/uploads/jobs/batches and counters."""
+
+    def __init__(self, latency=None, rpm=None, tpm=None, error_rate_429=0.0,
+                 reply_tokens=120, job_seconds=30.0, batch_seconds=2.0, seed=0):
+        self.latency = latency or LatencyModel()
+        self.rpm, self.tpm = rpm, tpm
+        self.error_rate_429 = error_rate_429
+        self.reply_tokens = reply_tokens
+        self.job_seconds = job_seconds
+        self.batch_seconds = batch_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.quotas = {}
+        self.files = {}
+        self.uploads = {}
+        self.jobs = {}
+        self.batches = {}
+        self.stats = {"chat": 0, "throttled": 0, "injected_429": 0}
+
+    def quota(self, deployment):
+        with self.lock:
+            if deployment not in self.quotas:
+                self.quotas[deployment] = QuotaBucket(self.rpm, self.tpm)
+            return self.quotas[deployment]
+
+    def add_file(self, data, filename, purpose):
+        file_id = _new_id("file")
+        meta = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.lock:
+            self.files[file_id] = {"meta": meta, "data": data}
+        return meta
+
+
+# ── Chat completions ─────────────────────────────────────────────────────────
+
+_JSON_KEY_RE = re.compile(r'"(\w+)"\s*:\s*(?:\d+|<int>)')
+_DEFAULT_SCORE_KEYS = ("correctness", "relevance", "quality")
+
+
+def fake_completion(state, body, deployment=None):
+    """Build a chat.completion for `body`. Judge-style prompts asking for a
+    JSON object get integer scores for the keys they mention; everything
+    else gets filler text of ~reply_tokens tokens."""
+    messages = body.get("messages") or []
+    prompt_text = " ".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+    last = str(messages[-1].get("content", "")) if messages and isinstance(messages[-1], dict) else ""
+    digest = int(hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(digest if body.get("temperature", 1.0) == 0 else None)
+
+    if "JSON" in last:
+        keys = list(dict.fromkeys(_JSON_KEY_RE.findall(last))) or list(_DEFAULT_SCORE_KEYS)
+        content = json.dumps({k: rng.randint(4, 10) for k in keys})
+    else:
+        limit = body.get("max_completion_tokens") or body.get("max_tokens") or state.reply_tokens
+        n_words = max(1, min(state.reply_tokens, limit))
+        content = " ".join(rng.choice(("lorem", "ipsum", "dolor", "sit", "amet", "consectetur"))
+                           for _ in range(n_words))
+    prompt_tokens = max(1, len(prompt_text) // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": _new_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or deployment or "fake",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+# ── Fine-tuning jobs ─────────────────────────────────────────────────────────
+
+def _job_view(state, job):
+    """Advance a job along validating → queued → running → succeeded by wall time."""
+    if job["status"] in ("cancelled", "succeeded", "failed"):
+        return job
+    progress = (time.time() - job["created_at"]) / max(state.job_seconds, 0.001)
+    if progress < 0.1:
+        job["status"] = "validating_files"
+    elif progress < 0.2:
+        job["status"] = "queued"
+    elif progress < 1.0:
+        job["status"] = "running"
+    else:
+        job["status"] = "succeeded"
+        job["finished_at"] = int(time.time())
+        job["fine_tuned_model"] = f"{job['model']}.ft-{job['id'][-6:]}"
+        train = state.files.get(job["training_file"])
+        epochs = (job.get("hyperparameters") or {}).get("n_epochs") or 2
+        job["trained_tokens"] = (train["meta"]["bytes"] // 4 if train else 10000) * int(epochs)
+        rows = ["step,train_loss,train_mean_token_accuracy,valid_loss,valid_mean_token_accuracy"]
+        for step in range(1, 51):
+            loss = 2.0 * math.exp(-step / 15) + 0.1
+            rows.append(f"{step},{loss:.4f},0.8,{loss * 1.1:.4f}," if step % 10 else
+                        f"{step},{loss:.4f},0.8,{loss * 1.1:.4f},0.75")
+        job["result_files"] = [state.add_file("\n".join(rows).encode(), "results.csv",
+                                              "fine-tune-results")["id"]]
+    return job
+
+
+def _job_events(job):
+    created = job["created_at"]
+    events = [{"id": f"{job['id']}-ev0", "object": "fine_tuning.job.event", "created_at": created,
+               "level": "info", "message": "Job started.", "type": "message"}]
+    running_for = min(time.time(), job.get("finished_at") or time.time()) - created
+    for step in range(1, int(max(0, running_for)) + 1):
+        events.append({"id": f"{job['id']}-ev{step}", "object": "fine_tuning.job.event",
+                       "created_at": created + step, "level": "info", "type": "metrics",
+                       "message": f"Step {step}: training loss={2.0 * math.exp(-step / 15) + 0.1:.4f}"})
+    if job["status"] == "succeeded":
+        events.append({"id": f"{job['id']}-done", "object": "fine_tuning.job.event",
+                       "created_at": job["finished_at"], "level": "info", "type": "message",
+                       "message": "The job has successfully completed."})
+    return list(reversed(events))  # newest first, like the service
+
+
+def _job_checkpoints(job):
+    if job["status"] != "succeeded":
+        return []
+    return [{"id": f"ftckpt-{job['id'][-6:]}-{step}", "object": "fine_tuning.job.checkpoint",
+             "created_at": job["finished_at"], "step_number": step, "fine_tuning_job_id": job["id"],
+             "fine_tuned_model_checkpoint": f"{job['fine_tuned_model']}:ckpt-step-{step}",
+             "metrics": {"step": step, "train_loss": 2.0 * math.exp(-step / 15) + 0.1,
+                         "valid_loss": 2.2 * math.exp(-step / 15) + 0.11}}
+            for step in (10, 30, 50)]
+
+
+# ── Batches ──────────────────────────────────────────────────────────────────
+
+def _run_batch(state, batch):
+    time.sleep(state.batch_seconds)
+    source = state.files.get(batch["input_file_id"])
+    lines = source["data"].decode("utf-8").splitlines() if source else []
+    out = []
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        body = fake_completion(state, request.get("body") or {})
+        out.append(json.dumps({"id": _new_id("batch_req"), "custom_id": request.get("custom_id"),
+                               "response": {"status_code": 200, "request_id": _new_id("req"), "body": body},
+                               "error": None}))
+    output = state.add_file(("\n".join(out) + "\n").encode(), "batch_output.jsonl", "batch_output")
+    batch.update(status="completed", output_file_id=output["id"], completed_at=int(time.time()),
+                 request_counts={"total": len(out), "completed": len(out), "failed": 0})
+
+
+# ── HTTP handler ─────────────────────────────────────────────────────────────
+
+def _multipart(content_type, body):
+    """Parse multipart/form-data into {field: bytes-or-str} plus filenames."""
+    msg = BytesParser(policy=default_policy).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    fields, filenames = {}, {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = part.get_payload(decode=True)
+        filename = part.get_filename()
+        if filename:
+            filenames[name] = filename
+    return fields, filenames
+
+
+def _page(items, query):
+    limit = int(query.get("limit", ["20"])[0])
+    after = query.get("after", [None])[0]
+    if after:
+        ids = [i["id"] for i in items]
+        items = items[ids.index(after) + 1:] if after in ids else []
+    return {"object": "list", "data": items[:limit], "has_more": len(items) > limit}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload, headers=None, raw=None, content_type="application/json"):
+            data = raw if raw is not None else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _error(self, status, message, headers=None):
+            self._send(status, {"error": {"message": message, "type": "fake_server", "code": str(status)}},
+                       headers)
+
+        def _body(self):
+            length = int(self.headers.get("content-length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _route(self):
+            parts = urlsplit(self.path)
+            path = re.sub(r"^/(openai/v1|openai|v1)(?=/)", "", parts.path).rstrip("/")
+            return path, parse_qs(parts.query)
+
+        # -- dispatch -------------------------------------------------------
+
+        def do_GET(self):
+            path, query = self._route()
+            if path == "/files":
+                return self._send(200, {"object": "list", "data": [f["meta"] for f in state.files.values()],
+                                        "has_more": False})
+            m = re.fullmatch(r"/files/([^/]+)(/content)?", path)
+            if m:
+                f = state.files.get(m.group(1))
+                if not f:
+                    return self._error(404, "File not found")
+                if m.group(2):
+                    return self._send(200, None, raw=f["data"], content_type="application/octet-stream")
+                return self._send(200, f["meta"])
+            if path == "/fine_tuning/jobs":
+                jobs = sorted(state.jobs.values(), key=lambda j: j["created_at"], reverse=True)
+                return self._send(200, _page([_job_view(state, j) for j in jobs], query))
+            m = re.fullmatch(r"/fine_tuning/jobs/([^/]+)(/events|/checkpoints)?", path)
+            if m:
+                job = state.jobs.get(m.group(1))
+                if not job:
+                    return self._error(404, "Job not found")
+                job = _job_view(state, job)
+                if m.group(2) == "/events":
+                    return self._send(200, _page(_job_events(job), query))
+                if m.group(2) == "/checkpoints":
+                    return self._send(200, _page(_job_checkpoints(job), query))
+                return self._send(200, job)
+            m = re.fullmatch(r"/batches/([^/]+)", path)
+            if m and m.group(1) in state.batches:
+                return self._send(200, state.batches[m.group(1)])
+            return self._error(404, f"Not found: {path}")
+
+        def do_DELETE(self):
+            path, _ = self._route()
+            m = re.fullmatch(r"/files/([^/]+)", path)
+            if m and state.files.pop(m.group(1), None):
+                return self._send(200, {"id": m.group(1), "object": "file", "deleted": True})
+            return self._error(404, f"Not found: {path}")
+
+        def do_POST(self):
+            path, _ = self._route()
+            body = self._body()
+            ctype = self.headers.get("content-type", "")
+            m = re.fullmatch(r"(?:/deployments/([^/]+))?/chat/completions", path)
+            if m:
+                return self._chat(json.loads(body or b"{}"), m.group(1))
+            if path == "/files":
+                fields, names = _multipart(ctype, body)
+                return self._send(200, state.add_file(fields.get("file") or b"", names.get("file", "upload.jsonl"),
+                                                      (fields.get("purpose") or b"fine-tune").decode()))
+            if path == "/uploads":
+                req = json.loads(body)
+                upload = {"id": _new_id("upload"), "object": "upload", "status": "pending",
+                          "bytes": req.get("bytes"), "filename": req.get("filename"),
+                          "purpose": req.get("purpose"), "created_at": int(time.time()),
+                          "expires_at": int(time.time()) + 3600, "parts": {}}
+                state.uploads[upload["id"]] = upload
+                return self._send(200, {k: v for k, v in upload.items() if k != "parts"})
+            m = re.fullmatch(r"/uploads/([^/]+)/(parts|complete|cancel)", path)
+            if m:
+                upload = state.uploads.get(m.group(1))
+                if not upload:
+                    return self._error(404, "Upload not found")
+                if m.group(2) == "parts":
+                    fields, _ = _multipart(ctype, body)
+                    part_id = _new_id("part")
+                    upload["parts"][part_id] = fields.get("data") or b""
+                    return self._send(200, {"id": part_id, "object": "upload.part",
+                                            "upload_id": upload["id"], "created_at": int(time.time())})
+                if m.group(2) == "cancel":
+                    upload["status"] = "cancelled"
+                else:
+                    part_ids = json.loads(body).get("part_ids", [])
+                    data = b"".join(upload["parts"][p] for p in part_ids)
+                    upload["status"] = "completed"
+                    upload["file"] = state.add_file(data, upload["filename"], upload["purpose"])
+                return self._send(200, {k: v for k, v in upload.items() if k != "parts"})
+            if path == "/fine_tuning/jobs":
+                req = json.loads(body)
+                job = {"id": _new_id("ftjob"), "object": "fine_tuning.job", "model": req.get("model"),
+                       "created_at": int(time.time()), "status": "validating_files",
+                       "training_file": req.get("training_file"), "validation_file": req.get("validation_file"),
+                       "hyperparameters": req.get("hyperparameters") or {"n_epochs": 2},
+                       "method": req.get("method"), "fine_tuned_model": None, "finished_at": None,
+                       "trained_tokens": None, "result_files": [], "organization_id": "fake",
+                       "seed": 0, "error": None}
+                state.jobs[job["id"]] = job
+                return self._send(200, job)
+            m = re.fullmatch(r"/fine_tuning/jobs/([^/]+)/cancel", path)
+            if m and m.group(1) in state.jobs:
+                state.jobs[m.group(1)]["status"] = "cancelled"
+                return self._send(200, state.jobs[m.group(1)])
+            if path == "/batches":
+                req = json.loads(body)
+                batch = {"id": _new_id("batch"), "object": "batch", "endpoint": req.get("endpoint"),
+                         "input_file_id": req.get("input_file_id"), "completion_window": req.get("completion_window"),
+                         "status": "in_progress", "created_at": int(time.time()),
+                         "output_file_id": None, "error_file_id": None,
+                         "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+                state.batches[batch["id"]] = batch
+                threading.Thread(target=_run_batch, args=(state, batch), daemon=True).start()
+                return self._send(200, batch)
+            return self._error(404, f"Not found: {path}")
+
+        def _chat(self, body, deployment):
+            deployment = deployment or body.get("model") or "fake"
+            if state.error_rate_429 and state.rng.random() < state.error_rate_429:
+                with state.lock:
+                    state.stats["injected_429"] += 1
+                return self._error(429, "Injected rate limit", {"retry-after-ms": "500"})
+            resp = fake_completion(state, body, deployment)
+            cost = resp["usage"]["prompt_tokens"] + (body.get("max_completion_tokens") or body.get("max_tokens") or 0)
+            headers, retry_after = state.quota(deployment).take(cost)
+            if retry_after is not None:
+                with state.lock:
+                    state.stats["throttled"] += 1
+                headers["retry-after-ms"] = str(int(retry_after * 1000) + 1)
+                headers["retry-after"] = str(math.ceil(retry_after))
+                return self._error(429, "Requests to this deployment have exceeded the rate limit", headers)
+            time.sleep(state.latency.sample(resp["usage"]["completion_tokens"]))
+            with state.lock:
+                state.stats["chat"] += 1
+            return self._send(200, resp, headers)
+
+    return Handler
+
+
+def start_server(state, host="127.0.0.1", port=0):
+    """Start the server on a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_server_arguments(parser):
+    """Latency / quota / fault-injection knobs, shared with run_benchmarks.py."""
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="Latency distribution (default: lognormal)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Median request latency (default: 300)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal spread (default: 0.5)")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="Extra latency per output token")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests/minute quota per deployment")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens/minute quota per deployment")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Fraction of random injected 429s")
+    parser.add_argument("--reply-tokens", type=int, default=120, help="Length of non-JSON replies")
+    parser.add_argument("--job-seconds", type=float, default=30, help="Fine-tuning job duration")
+    parser.add_argument("--batch-seconds", type=float, default=2, help="Batch job processing delay")
+
+
+def state_from_args(args):
+    return FakeState(
+        latency=LatencyModel(args.latency, args.latency_ms, args.latency_sigma, args.per_token_ms),
+        rpm=args.rpm, tpm=args.tpm, error_rate_429=args.error_rate_429, reply_tokens=args.reply_tokens,
+        job_seconds=args.job_seconds, batch_seconds=args.batch_seconds,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    state = state_from_args(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Fake OpenAI server on http://{args.host}:{args.port}/v1/  (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStats: {state.stats}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Throughput benchmarks for the API-bound finetuning scripts.
+
+Starts the local stand-in server (fake_server.py), generates a synthetic
+dataset, runs each script end-to-end as a subprocess against it and reports
+wall time and rows/sec. Save a run with --json-out and compare later runs
+with --baseline to catch throughput regressions (exit code 1).
+
+Workloads:
+  score_dataset                 judge scoring (--concurrency)
+  evaluate_model                generate + judge per row (--concurrency)
+  generate_distillation_data    teacher generation + grading
+  calibrate_grader              sequential base-model runs (--sequential-rows)
+  convert_dataset_dpo           sequential rejection generation (--sequential-rows)
+
+Usage:
+  python run_benchmarks.py
+  python run_benchmarks.py --rows 500 --concurrency 16 --latency-ms 800 --rpm 600
+  python run_benchmarks.py --only score_dataset,evaluate_model --json-out before.json
+  python run_benchmarks.py --baseline before.json --max-regression 0.15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_server import add_server_arguments, start_server, state_from_args
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GRADER_SOURCE = '''def grade(sample, item):
+    return 1.0 if item.get("expected_answer", "") in sample["output_text"] else 0.5
+'''
+
+
+def write_datasets(work_dir, rows):
+    """Write synthetic SFT + RFT datasets and a trivial grader. Returns paths."""
+    sft_path = os.path.join(work_dir, "sft.jsonl")
+    rft_path = os.path.join(work_dir, "rft.jsonl")
+    grader_path = os.path.join(work_dir, "grader.py")
+    with open(sft_path, "w", encoding="utf-8") as sft, open(rft_path, "w", encoding="utf-8") as rft:
+        for i in range(rows):
+            question = f"Question {i}: explain concept number {i} in a few sentences."
+            answer = f"Concept {i} is explained here. " * 8
+            sft.write(json.dumps({"messages": [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": answer},
+            ]}) + "\n")
+            rft.write(json.dumps({"messages": [{"role": "user", "content": question}],
+                                  "expected_answer": "lorem"}) + "\n")
+    with open(grader_path, "w", encoding="utf-8") as f:
+        f.write(GRADER_SOURCE)
+    return {"sft": sft_path, "rft": rft_path, "grader": grader_path}
+
+
+def build_workloads(paths, work_dir, rows, concurrency, sequential_rows):
+    """Return {name: (argv, rows_processed)} for every workload."""
+    out = lambda name: os.path.join(work_dir, name)  # noqa: E731
+    seq = min(rows, sequential_rows)
+    return {
+        "score_dataset": (["score_dataset.py", "--model", "judge", "--input", paths["sft"],
+                           "--output", out("scored.jsonl"), "--concurrency", str(concurrency)], rows),
+        "evaluate_model": (["evaluate_model.py", "--deployment-name", "ft-model", "--judge-model", "judge",
+                            "--test-file", paths["sft"], "--output", out("eval.json"),
+                            "--concurrency", str(concurrency)], rows),
+        "generate_distillation_data": (["generate_distillation_data.py", "--teacher", "teacher",
+                                        "--topics", "math,history,science,cooking,travel",
+                                        "--num-prompts", str(rows), "--output-dir", out("distill")], rows),
+        "calibrate_grader": (["calibrate_grader.py", "--model", "base", "--data", paths["rft"],
+                              "--grader", paths["grader"], "--n", str(seq)], seq),
+        "convert_dataset_dpo": (["convert_dataset.py", "--format", "dpo", "--base-model", "base",
+                                 "--input", _head(paths["sft"], seq, out("sft_head.jsonl")),
+                                 "--output", out("dpo.jsonl")], seq),
+    }
+
+
+def _head(src, n, dst):
+    with open(src, encoding="utf-8") as f, open(dst, "w", encoding="utf-8") as g:
+        for i, line in enumerate(f):
+            if i >= n:
+                break
+            g.write(line)
+    return dst
+
+
+def run_workload(name, argv, env, log_path, metrics_path):
+    """Run one script to completion. Returns (wall_seconds, returncode).
+
+    The script's own per-model request metrics land in `metrics_path`.
+    """
+    cmd = [sys.executable, os.path.join(SCRIPTS_DIR, argv[0])] + argv[1:] + ["--metrics-out", metrics_path]
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        rc = subprocess.call(cmd, env=env, stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(log_path))
+    return time.perf_counter() - start, rc
+
+
+def compare(results, baseline, max_regression):
+    """Return a list of human-readable regressions vs a baseline results file."""
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("rows_per_sec") or not res.get("rows_per_sec"):
+            continue
+        drop = 1 - res["rows_per_sec"] / base["rows_per_sec"]
+        if drop > max_regression:
+            regressions.append(f"{name}: {res['rows_per_sec']:.2f} rows/s vs baseline "
+                               f"{base['rows_per_sec']:.2f} ({drop:.0%} slower)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the finetuning scripts")
+    parser.add_argument("--rows", type=int, default=200, help="Rows for the concurrent workloads (default: 200)")
+    parser.add_argument("--sequential-rows", type=int, default=40,
+                        help="Rows for the sequential workloads (default: 40)")
+    parser.add_argument("--concurrency", type=int, default=8, help="--concurrency passed to scripts (default: 8)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per workload; the median is reported")
+    parser.add_argument("--only", default=None, help="Comma-separated workload names to run")
+    parser.add_argument("--server-url", default=None,
+                        help="Use an already-running server (e.g. fake_server.py in another shell) "
+                             "instead of starting one in-process")
+    parser.add_argument("--json-out", default=None, help="Write results as JSON (use as a later --baseline)")
+    parser.add_argument("--baseline", default=None, help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed rows/sec drop vs baseline before failing (default: 0.15)")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory (datasets, outputs, logs)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    state = None
+    if args.server_url:
+        base_url = args.server_url.rstrip("/")
+    else:
+        state = state_from_args(args)
+        server, base_url = start_server(state)
+    print(f"🧪 Benchmarking against {base_url}/v1/ "
+          f"(latency {args.latency} {args.latency_ms:.0f}ms, rpm={args.rpm}, tpm={args.tpm}, "
+          f"429 rate={args.error_rate_429})")
+
+    work_dir = tempfile.mkdtemp(prefix="ft_bench_")
+    paths = write_datasets(work_dir, args.rows)
+    workloads = build_workloads(paths, work_dir, args.rows, args.concurrency, args.sequential_rows)
+    if args.only:
+        wanted = [w.strip() for w in args.only.split(",") if w.strip()]
+        unknown = [w for w in wanted if w not in workloads]
+        if unknown:
+            print(f"❌ Unknown workload(s): {', '.join(unknown)}. Choose from: {', '.join(workloads)}")
+            sys.exit(2)
+        workloads = {k: v for k, v in workloads.items() if k in wanted}
+
+    env = dict(os.environ)
+    for var in ("AZURE_OPENAI_ENDPOINT", "AZURE_AI_PROJECT_ENDPOINT"):
+        env.pop(var, None)
+    env.update(OPENAI_BASE_URL=f"{base_url}/v1/", AZURE_OPENAI_API_KEY="fake",
+               FOUNDRY_FT_NO_CACHE="1", PYTHONIOENCODING="utf-8")
+
+    results = {}
+    print(f"\n{'Workload':<28} {'Rows':>6} {'Wall (s)':>10} {'Rows/s':>9} {'p95 (ms)':>9}  Status")
+    print("-" * 76)
+    for name, (argv, rows) in workloads.items():
+        walls, rc = [], 0
+        log_path = os.path.join(work_dir, f"{name}.log")
+        metrics_path = os.path.join(work_dir, f"{name}.metrics.json")
+        for _ in range(args.repeat):
+            wall, rc = run_workload(name, argv, env, log_path, metrics_path)
+            walls.append(wall)
+            if rc != 0:
+                break
+        wall = statistics.median(walls)
+        rate = rows / wall if rc == 0 and wall > 0 else 0.0
+        try:
+            with open(metrics_path, encoding="utf-8") as f:
+                request_metrics = json.load(f)["models"]
+        except (OSError, ValueError, KeyError):
+            request_metrics = {}
+        results[name] = {"rows": rows, "wall_seconds": round(wall, 3), "rows_per_sec": round(rate, 3),
+                         "returncode": rc, "runs": len(walls), "requests": request_metrics}
+        p95 = max((m["latency_ms"]["p95"] or 0 for m in request_metrics.values()), default=0)
+        status = "✅" if rc == 0 else f"❌ exit {rc} (see {log_path})"
+        print(f"{name:<28} {rows:>6} {wall:>10.2f} {rate:>9.2f} {p95:>9.0f}  {status}")
+
+    if state is not None:
+        print(f"\nServer: {state.stats['chat']} chat completions, {state.stats['throttled']} quota 429s, "
+              f"{state.stats['injected_429']} injected 429s")
+
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("json_out", "baseline", "keep")},
+              "results": results}
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json_out}")
+
+    failed = any(r["returncode"] != 0 for r in results.values())
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"\n❌ Throughput regressions (> {args.max_regression:.0%}):")
+            for r in regressions:
+                print(f"  - {r}")
+            failed = True
+        else:
+            print(f"\n✅ No regressions vs {args.baseline}")
+
+    if args.keep or failed:
+        print(f"Work directory: {work_dir}")
+    else:
+        import shutil
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,10 +30,12 @@ try:
     sys.stderr.reconfigure(encoding="utf-8")
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
-import time
-
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients
+from common import (
+    HelpOnErrorParser, add_metrics_argument, chat_completion,
+    get_clients, write_metrics_on_exit,
+)
+from jsonl_io import load_jsonl
 
 
 def load_grader(grader_path):
@@ -64,24 +66,20 @@ def run_model(client, model, messages, tools_schema=None, max_retries=3):
     if tools_schema:
         kwargs["tools"] = tools_schema
 
-    for attempt in range(max_retries):
-        try:
-            resp = client.chat.completions.create(**kwargs)
-            msg = resp.choices[0].message
-            output_text = msg.content or ""
-            output_tools = []
-            if msg.tool_calls:
-                output_tools = [
-                    {"type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
-                    for tc in msg.tool_calls
-                ]
-            return output_text, output_tools
-        except Exception as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                time.sleep(5 * (attempt + 1))
-            else:
-                return f"ERROR: {e}", []
-    return "ERROR: max retries", []
+    try:
+        # chat_completion waits out 429s (Retry-After) and retries transient errors
+        resp = chat_completion(client, max_retries=max_retries, **kwargs)
+    except Exception as e:
+        return f"ERROR: {e}", []
+    msg = resp.choices[0].message
+    output_text = msg.content or ""
+    output_tools = []
+    if msg.tool_calls:
+        output_tools = [
+            {"type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+            for tc in msg.tool_calls
+        ]
+    return output_text, output_tools
 
 
 def calibrate(client, model, data, grade_fn, tools_schema=None, n=30):
@@ -125,8 +123,6 @@ def calibrate(client, model, data, grade_fn, tools_schema=None, n=30):
         print(f"  [{i+1:3d}] {score:.3f} {status}  {user_msg[:55]}")
         scores.append(score)
 
-        time.sleep(0.5)  # Rate limiting
-
     # Analysis
     scored = [s for s in scores if s is not None]
     if not scored:
@@ -210,6 +206,7 @@ def build_parser():
     parser.add_argument("--tools", default=None,
                         help="Tool schemas as JSON array (for tool-calling models). Pass as a JSON string.")
     parser.add_argument("--seed", type=int, default=42, help="Random seed for sampling (default: 42)")
+    add_metrics_argument(parser)
     return parser
 
 
@@ -220,20 +217,13 @@ if __name__ == "__main__":
         sys.exit(0)
 
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
     random.seed(args.seed)
 
     client, method = get_clients(base_url=args.base_url, azure_endpoint=args.endpoint, project_endpoint=args.project_endpoint, api_key=args.api_key)
 
     # Load data
-    with open(args.data, encoding="utf-8") as f:
-        data = []
-        for ln, line in enumerate(f, 1):
-            if not line.strip():
-                continue
-            try:
-                data.append(json.loads(line))
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Skipping malformed JSON on line {ln}: {e}")
+    data = load_jsonl(args.data, on_error=lambda e: print(f"⚠️ Skipping malformed JSON on line {e.line_no}: {e}"))
     print(f"Loaded {len(data)} examples from {args.data}")
 
     # Load grader
@@ -25,7 +25,7 @@ try:
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients
+from common import HelpOnErrorParser, add_metrics_argument, get_clients, write_metrics_on_exit
 
 
 def analyze_job(client, job_id, download_csv=None):
@@ -173,7 +173,9 @@ def main():
     parser.add_argument("--api-key", default=os.environ.get("AZURE_OPENAI_API_KEY"))
     parser.add_argument("--job-id", required=True, help="Fine-tuning job ID")
     parser.add_argument("--download-csv", help="Save results CSV to this path")
+    add_metrics_argument(parser)
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
 
     client, method = get_clients(
         base_url=args.base_url, azure_endpoint=args.endpoint,
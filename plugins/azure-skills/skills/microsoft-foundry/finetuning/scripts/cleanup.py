@@ -32,7 +32,7 @@ except (AttributeError, OSError):
 from datetime import datetime, timezone
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients
+from common import HelpOnErrorParser, add_metrics_argument, get_clients, write_metrics_on_exit
 
 
 def list_deployments(client):
@@ -255,7 +255,9 @@ if __name__ == "__main__":
         parser.print_help()
         sys.exit(0)
 
+    add_metrics_argument(parser)
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
     client, method = get_clients(base_url=args.base_url, azure_endpoint=args.endpoint, project_endpoint=args.project_endpoint, api_key=args.api_key)
 
     if args.list:
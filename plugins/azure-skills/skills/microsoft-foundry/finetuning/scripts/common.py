@@ -7,10 +7,14 @@ Supports three connection methods in order of preference:
 3. Azure OpenAI endpoint (classic)
 
 AAD tokens are auto-refreshed via azure.identity for long-running scripts
-(monitor_training.py, generate_distillation_data.py, etc.).
+(monitor_training.py, generate_distillation_data.py, etc.). Tokens are cached
+in-process until ~5 min before expiry, and the connection method and credential
+source that worked last time are remembered in ~/.cache/foundry-finetuning so
+short commands skip re-probing (FOUNDRY_FT_CACHE_DIR to relocate,
+FOUNDRY_FT_NO_CACHE=1 to disable).
 
 Usage:
-    from common import get_clients, upload_file
+    from common import get_clients, get_async_clients, upload_file
 
     # Method 1: Project /v1/ endpoint (preferred)
     clients = get_clients(base_url="https://<resource>.services.ai.azure.com/api/projects/<project>/openai/v1/",
@@ -22,11 +26,28 @@ Usage:
     # Method 3: Azure OpenAI endpoint
     clients = get_clients(azure_endpoint="https://<resource>.openai.azure.com",
                           api_key="KEY")
+
+    # Async variant (same methods, shared httpx.AsyncClient connection pool)
+    client, method = get_async_clients(base_url=..., api_key="KEY", max_connections=200)
+
+    # Rate-limited chat completions (paced by x-ratelimit-* / Retry-After headers)
+    resp = chat_completion(client, model="gpt-4o", messages=[...])
+    resp = await achat_completion(async_client, model="gpt-4o", messages=[...])
+
+    # Per-model latency/token/retry metrics for every client built here
+    add_metrics_argument(parser); ...; write_metrics_on_exit(args.metrics_out)
 """
 import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
 import os
+import random
 import sys
-
+import threading
+import time
 
 
 try:
@@ -65,27 +86,334 @@ class HelpOnErrorParser(argparse.ArgumentParser):
         self.exit(2, f"\nerror: {message}\n")
 
 
-def _make_token_provider():
-    """Create an auto-refreshing AAD token provider for long-running scripts.
-    
-    Returns a callable that the OpenAI SDK calls before each request to get
-    a fresh token. Tokens are cached and refreshed ~5 min before expiry.
+# ── Local cache (connection resolution, upload manifests, ...) ──────────────
+#
+# Best-effort state under ~/.cache/foundry-finetuning (override with
+# FOUNDRY_FT_CACHE_DIR, disable with FOUNDRY_FT_NO_CACHE=1). Never holds
+# secrets: only method names, credential class names, and file IDs.
+
+def _cache_dir():
+    """Return the local cache directory, or None if caching is disabled."""
+    if os.environ.get("FOUNDRY_FT_NO_CACHE"):
+        return None
+    return os.environ.get("FOUNDRY_FT_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "foundry-finetuning")
+
+
+def _load_cache(name):
+    """Load a JSON cache file. Returns {} if missing, corrupt, or disabled."""
+    cache_dir = _cache_dir()
+    if not cache_dir:
+        return {}
+    try:
+        with open(os.path.join(cache_dir, name), encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(name, data):
+    """Atomically write a JSON cache file. Failures are silently ignored."""
+    cache_dir = _cache_dir()
+    if not cache_dir:
+        return
+    try:
+        path = os.path.join(cache_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # Cache is an optimization only
+
+
+def _delete_cache(name):
+    cache_dir = _cache_dir()
+    if cache_dir:
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+
+
+_CONNECTION_CACHE = "connection.json"
+
+# Credentials DefaultAzureCredential may settle on that can be rebuilt directly
+# (from environment / local login state) without re-probing the whole chain.
+_DIRECT_CREDENTIALS = {
+    "EnvironmentCredential", "WorkloadIdentityCredential", "ManagedIdentityCredential",
+    "SharedTokenCacheCredential", "AzureCliCredential", "AzureDeveloperCliCredential",
+    "AzurePowerShellCredential", "VisualStudioCodeCredential",
+}
+
+
+def _get_credential():
+    """Return (credential, from_cache).
+
+    If a previous run recorded which credential in the DefaultAzureCredential
+    chain succeeded, build that one directly — this skips the slow probing of
+    the credentials ahead of it (IMDS timeouts, missing CLIs, ...).
     """
-    from azure.identity import DefaultAzureCredential
-    credential = DefaultAzureCredential()
+    import azure.identity
+
+    name = _load_cache(_CONNECTION_CACHE).get("credential")
+    if name in _DIRECT_CREDENTIALS and hasattr(azure.identity, name):
+        try:
+            if name == "ManagedIdentityCredential" and os.environ.get("AZURE_CLIENT_ID"):
+                return azure.identity.ManagedIdentityCredential(client_id=os.environ["AZURE_CLIENT_ID"]), True
+            return getattr(azure.identity, name)(), True
+        except Exception:
+            pass  # Fall through to the full chain
+    return azure.identity.DefaultAzureCredential(), False
+
+
+def _remember_credential(credential):
+    """Persist which credential in the chain produced a token."""
+    successful = getattr(credential, "_successful_credential", None) or credential
+    name = type(successful).__name__
+    if name not in _DIRECT_CREDENTIALS:
+        return
+    cache = _load_cache(_CONNECTION_CACHE)
+    if cache.get("credential") != name:
+        cache["credential"] = name
+        _save_cache(_CONNECTION_CACHE, cache)
+
+
+class _CachedTokenProvider:
+    """Callable returning an AAD bearer token, refreshed only near expiry.
+
+    The OpenAI SDK (and _AzureADAuth) call this before every request, so the
+    common case must be a lock-free check of the in-process cache. A token is
+    only fetched when none is held or it expires within `refresh_margin` seconds.
+    """
+
+    def __init__(self, credential, from_cache=False, refresh_margin=300):
+        self._credential = credential
+        self._from_cache = from_cache
+        self._refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._cached = (None, 0)  # (token, expires_on) — swapped atomically
+
+    def peek(self):
+        """Return the cached token if it is still fresh, else None."""
+        token, expires_on = self._cached
+        if token and expires_on - time.time() > self._refresh_margin:
+            return token
+        return None
 
-    def get_token():
+    def __call__(self):
+        token = self.peek()
+        if token:
+            return token
+        with self._lock:
+            token = self.peek()
+            if token:
+                return token
+            access = self._fetch()
+            self._cached = (access.token, access.expires_on)
+            if not self._from_cache:
+                _remember_credential(self._credential)
+            return access.token
+
+    def _fetch(self):
         try:
-            token = credential.get_token(_AZURE_COGSERVICES_SCOPE)
-            return token.token
+            return self._credential.get_token(_AZURE_COGSERVICES_SCOPE)
         except Exception as e:
+            if self._from_cache:
+                # The remembered credential stopped working (logged out, env
+                # changed) — fall back to the full chain once.
+                from azure.identity import DefaultAzureCredential
+                self._credential, self._from_cache = DefaultAzureCredential(), False
+                return self._fetch()
             raise RuntimeError(
                 f"Azure AD authentication failed: {e}\n"
                 "Ensure you're logged in (az login) or have valid "
                 "AZURE_CLIENT_ID/AZURE_TENANT_ID/AZURE_CLIENT_SECRET set."
             ) from e
 
-    return get_token
+
+def _make_token_provider():
+    """Create an auto-refreshing AAD token provider for long-running scripts.
+    
+    Returns a callable that the OpenAI SDK calls before each request to get
+    a fresh token. Tokens are cached in-process and refreshed ~5 min before
+    expiry; the credential source that worked is remembered across runs.
+    """
+    credential, from_cache = _get_credential()
+    return _CachedTokenProvider(credential, from_cache=from_cache)
+
+
+def _make_aad_auth(token_provider):
+    """Build an httpx.Auth that sets a fresh AAD bearer token on every request.
+
+    Works for both httpx.Client and httpx.AsyncClient. On the async path a
+    token refresh (a blocking credential call) runs in a worker thread so it
+    never stalls the event loop; cache hits stay on the loop.
+    """
+    import httpx
+
+    class _AzureADAuth(httpx.Auth):
+        def __init__(self, provider):
+            self._provider = provider
+
+        def auth_flow(self, request):
+            request.headers["Authorization"] = f"Bearer {self._provider()}"
+            yield request
+
+        async def async_auth_flow(self, request):
+            peek = getattr(self._provider, "peek", None)
+            token = peek() if peek else None
+            if token is None:
+                import anyio
+                token = await anyio.to_thread.run_sync(self._provider)
+            request.headers["Authorization"] = f"Bearer {token}"
+            yield request
+
+    return _AzureADAuth(token_provider)
+
+
+# ── Connection resolution ────────────────────────────────────────────────────
+
+_API_VERSION = "2025-04-01-preview"
+
+
+def _connect_v1(base_url, api_key, use_async, http_kwargs):
+    """Method 1: /v1/ project endpoint. Returns (client, method) or None."""
+    import openai
+    client_cls = openai.AsyncOpenAI if use_async else openai.OpenAI
+    label = "async, " if use_async else ""
+    if not api_key:
+        try:
+            token_provider = _make_token_provider()
+            token_provider()  # verify it works (cached for the first real request)
+            # Use a custom httpx auth class that refreshes the token on each request
+            auth = _make_aad_auth(token_provider)
+            if use_async:
+                http_client = _make_async_http_client(auth=auth, **http_kwargs)
+            else:
+                import httpx
+                http_client = httpx.Client(auth=auth)
+            client = client_cls(
+                base_url=base_url,
+                api_key="aad",  # required by SDK but overridden by auth
+                http_client=http_client,
+            )
+            print(f"✅ Connected via /v1/ project endpoint ({label}DefaultAzureCredential, auto-refresh)")
+            return client, "project-v1-aad"
+        except Exception as e:
+            print(f"⚠️ No API key and DefaultAzureCredential failed: {e}")
+            return None
+    extra = {"http_client": _make_async_http_client(**http_kwargs)} if use_async else {}
+    client = client_cls(base_url=base_url, api_key=api_key, **extra)
+    print(f"✅ Connected via /v1/ project endpoint{' (async)' if use_async else ''}")
+    return client, "project-v1"
+
+
+def _connect_foundry(project_endpoint, use_async, http_kwargs):
+    """Method 2: Foundry SDK. Returns (client, method) or None."""
+    try:
+        from azure.ai.projects import AIProjectClient
+
+        credential, from_cache = _get_credential()
+        project_client = AIProjectClient(endpoint=project_endpoint, credential=credential)
+        openai_client = project_client.get_openai_client()
+        if use_async:
+            # Let the SDK resolve the project's OpenAI endpoint, then talk to
+            # it asynchronously with the same credential.
+            import openai
+            openai_client = openai.AsyncOpenAI(
+                base_url=str(openai_client.base_url),
+                api_key="aad",  # required by SDK but overridden by auth
+                default_query=openai_client.default_query or None,
+                http_client=_make_async_http_client(
+                    auth=_make_aad_auth(_CachedTokenProvider(credential, from_cache=from_cache)),
+                    **http_kwargs),
+            )
+        print(f"✅ Connected via Foundry SDK{' (async)' if use_async else ''}")
+        return openai_client, "foundry-sdk"
+    except Exception as e:
+        print(f"⚠️ Foundry SDK failed: {e}")
+        return None
+
+
+def _connect_azure(azure_endpoint, api_key, use_async, http_kwargs):
+    """Method 3: Azure OpenAI endpoint. Returns (client, method) or None."""
+    import openai
+    client_cls = openai.AsyncAzureOpenAI if use_async else openai.AzureOpenAI
+    extra = {"http_client": _make_async_http_client(**http_kwargs)} if use_async else {}
+    label = "async, " if use_async else ""
+    if api_key:
+        client = client_cls(
+            azure_endpoint=azure_endpoint,
+            api_key=api_key,
+            api_version=_API_VERSION,
+            **extra,
+        )
+        print(f"✅ Connected via Azure OpenAI endpoint{' (async)' if use_async else ''}")
+        return client, "azure-openai"
+    # No API key — use DefaultAzureCredential with auto-refresh
+    try:
+        token_provider = _make_token_provider()
+        token_provider()  # verify it works (cached for the first real request)
+        client = client_cls(
+            azure_endpoint=azure_endpoint,
+            azure_ad_token_provider=token_provider,
+            api_version=_API_VERSION,
+            **extra,
+        )
+        print(f"✅ Connected via Azure OpenAI endpoint ({label}DefaultAzureCredential, auto-refresh)")
+        return client, "azure-openai-aad"
+    except Exception as e:
+        print(f"⚠️ DefaultAzureCredential failed for Azure endpoint: {e}")
+        return None
+
+
+def _resolve_connection(base_url, azure_endpoint, project_endpoint, api_key,
+                        use_async=False, http_kwargs=None):
+    """Try each configured connection method; return (client, method).
+
+    Methods are tried in preference order, except that the method which
+    succeeded last time for the same endpoints is tried first, so a setup
+    where e.g. the /v1/ AAD path always fails doesn't pay for that failure
+    on every start.
+    """
+    http_kwargs = http_kwargs or {}
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+    api_key = api_key or os.environ.get("AZURE_OPENAI_API_KEY")
+    project_endpoint = project_endpoint or os.environ.get("AZURE_AI_PROJECT_ENDPOINT")
+    azure_endpoint = azure_endpoint or os.environ.get("AZURE_OPENAI_ENDPOINT")
+
+    attempts = []
+    if base_url:
+        attempts.append(("v1", lambda: _connect_v1(base_url, api_key, use_async, http_kwargs)))
+    if project_endpoint:
+        attempts.append(("foundry", lambda: _connect_foundry(project_endpoint, use_async, http_kwargs)))
+    if azure_endpoint:
+        attempts.append(("azure", lambda: _connect_azure(azure_endpoint, api_key, use_async, http_kwargs)))
+
+    key = hashlib.sha256(json.dumps(
+        [base_url, project_endpoint, azure_endpoint, bool(api_key)]).encode()).hexdigest()[:16]
+    cache = _load_cache(_CONNECTION_CACHE)
+    preferred = cache.get("methods", {}).get(key)
+    attempts.sort(key=lambda a: a[0] != preferred)  # stable: keeps default order otherwise
+
+    for name, attempt in attempts:
+        result = attempt()
+        if result:
+            _instrument_client(result[0])
+            if name != preferred:
+                cache = _load_cache(_CONNECTION_CACHE)
+                cache.setdefault("methods", {})[key] = name
+                _save_cache(_CONNECTION_CACHE, cache)
+            return result
+
+    print("❌ No valid connection method. Set one of:")
+    print("   OPENAI_BASE_URL (preferred)")
+    print("   AZURE_AI_PROJECT_ENDPOINT (Foundry SDK)")
+    print("   AZURE_OPENAI_ENDPOINT + AZURE_OPENAI_API_KEY")
+    raise SystemExit(1)
 
 
 def get_clients(base_url=None, azure_endpoint=None, project_endpoint=None, api_key=None):
@@ -96,102 +424,871 @@ def get_clients(base_url=None, azure_endpoint=None, project_endpoint=None, api_k
     2. Foundry SDK with AIProjectClient.get_openai_client() (no API key needed)
     3. Azure OpenAI endpoint with openai.AzureOpenAI() (classic)
 
-    When using DefaultAzureCredential (no API key), tokens are auto-refreshed
-    so long-running scripts won't fail with 401 after ~60 min.
+    The method that succeeded last time for the same endpoints is tried first
+    (see _resolve_connection). When using DefaultAzureCredential (no API key),
+    tokens are auto-refreshed so long-running scripts won't fail with 401
+    after ~60 min.
 
     Returns: (openai_client, method_name)
     """
-    # Method 1: /v1/ project endpoint
-    base_url = base_url or os.environ.get("OPENAI_BASE_URL")
-    api_key = api_key or os.environ.get("AZURE_OPENAI_API_KEY")
+    return _resolve_connection(base_url, azure_endpoint, project_endpoint, api_key)
 
-    if base_url:
-        import openai
-        if not api_key:
-            try:
-                token_provider = _make_token_provider()
-                token_provider()  # verify it works
-                # Use a custom httpx auth class that refreshes the token on each request
-                import httpx
 
-                class _AzureADAuth(httpx.Auth):
-                    def __init__(self, provider):
-                        self._provider = provider
-
-                    def auth_flow(self, request):
-                        request.headers["Authorization"] = f"Bearer {self._provider()}"
-                        yield request
-
-                client = openai.OpenAI(
-                    base_url=base_url,
-                    api_key="aad",  # required by SDK but overridden by auth
-                    http_client=httpx.Client(auth=_AzureADAuth(token_provider)),
-                )
-                print(f"✅ Connected via /v1/ project endpoint (DefaultAzureCredential, auto-refresh)")
-                return client, "project-v1-aad"
-            except Exception as e:
-                print(f"⚠️ No API key and DefaultAzureCredential failed: {e}")
-        else:
-            client = openai.OpenAI(base_url=base_url, api_key=api_key)
-            print(f"✅ Connected via /v1/ project endpoint")
-            return client, "project-v1"
-
-    # Method 2: Foundry SDK
-    project_endpoint = project_endpoint or os.environ.get("AZURE_AI_PROJECT_ENDPOINT")
-    if project_endpoint:
+# One connection pool for every async client in the process. Each client gets
+# its own thin httpx.AsyncClient (so per-client auth still works) on top of
+# this shared transport, so hundreds of concurrent calls reuse the same
+# keep-alive connections instead of opening one pool per client.
+_ASYNC_POOL = None
+
+
+def _get_async_pool(max_connections=100, max_keepalive_connections=20):
+    """Return the process-wide async transport, creating it on first use.
+
+    Limits are fixed by the first caller; later calls reuse the same pool.
+    """
+    global _ASYNC_POOL
+    if _ASYNC_POOL is None:
+        import httpx
+
+        class _SharedAsyncTransport(httpx.AsyncHTTPTransport):
+            # Closing one client must not tear down the pool under the others;
+            # the pool is closed explicitly via close_async_pool().
+            async def aclose(self):
+                pass
+
+            async def close_pool(self):
+                await super().aclose()
+
+        _ASYNC_POOL = _SharedAsyncTransport(limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        ))
+    return _ASYNC_POOL
+
+
+async def close_async_pool():
+    """Close the shared async connection pool. Call once at the end of a run."""
+    global _ASYNC_POOL
+    if _ASYNC_POOL is not None:
+        pool, _ASYNC_POOL = _ASYNC_POOL, None
+        await pool.close_pool()
+
+
+def _make_async_http_client(auth=None, timeout=600.0,
+                            max_connections=100, max_keepalive_connections=20):
+    import httpx
+    return httpx.AsyncClient(
+        transport=_get_async_pool(max_connections, max_keepalive_connections),
+        auth=auth,
+        timeout=httpx.Timeout(timeout, connect=5.0),
+        follow_redirects=True,
+    )
+
+
+def get_async_clients(base_url=None, azure_endpoint=None, project_endpoint=None, api_key=None,
+                      max_connections=100, max_keepalive_connections=20, timeout=600.0):
+    """Async counterpart of get_clients().
+
+    Resolves the same three connection methods in the same order, but returns
+    openai.AsyncOpenAI / openai.AsyncAzureOpenAI backed by one shared httpx
+    connection pool. Use this to run many concurrent judge/teacher calls from
+    one event loop instead of a thread per request:
+
+        client, method = get_async_clients(base_url=..., max_connections=200)
+        results = await asyncio.gather(*(client.chat.completions.create(...) for ...))
+        await close_async_pool()
+
+    max_connections / max_keepalive_connections tune the shared pool (set by
+    the first call in the process). AAD tokens are auto-refreshed exactly as
+    in get_clients().
+
+    Returns: (async_openai_client, method_name)
+    """
+    return _resolve_connection(
+        base_url, azure_endpoint, project_endpoint, api_key, use_async=True,
+        http_kwargs={
+            "timeout": timeout,
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+        },
+    )
+
+
+# ── Adaptive rate limiting ───────────────────────────────────────────────────
+
+def _header_number(headers, name):
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after_seconds(headers):
+    """Parse retry-after-ms / Retry-After (seconds or HTTP date). None if absent."""
+    if not headers:
+        return None
+    ms = _header_number(headers, "retry-after-ms")
+    if ms is not None:
+        return ms / 1000.0
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        from email.utils import parsedate_to_datetime
         try:
-            from azure.ai.projects import AIProjectClient
-            from azure.identity import DefaultAzureCredential
-
-            credential = DefaultAzureCredential()
-            project_client = AIProjectClient(endpoint=project_endpoint, credential=credential)
-            openai_client = project_client.get_openai_client()
-            print(f"✅ Connected via Foundry SDK")
-            return openai_client, "foundry-sdk"
-        except Exception as e:
-            print(f"⚠️ Foundry SDK failed: {e}")
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
 
-    # Method 3: Azure OpenAI endpoint
-    azure_endpoint = azure_endpoint or os.environ.get("AZURE_OPENAI_ENDPOINT")
-    if azure_endpoint:
-        import openai
-        if api_key:
-            client = openai.AzureOpenAI(
-                azure_endpoint=azure_endpoint,
-                api_key=api_key,
-                api_version="2025-04-01-preview",
-            )
-            print(f"✅ Connected via Azure OpenAI endpoint")
-            return client, "azure-openai"
-        else:
-            # No API key — use DefaultAzureCredential with auto-refresh
+
+def _backoff_seconds(attempt, cap=60.0):
+    """Exponential backoff with jitter for retries without a Retry-After hint."""
+    return min(cap, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+class _Bucket:
+    """One token bucket that refills its full capacity once per minute.
+
+    Capacity is unknown (no pacing) until the first rate-limit header arrives.
+    """
+    __slots__ = ("capacity", "level", "updated", "synced")
+
+    def __init__(self):
+        self.capacity = None
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.synced = False
+
+    def refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_for(self, cost):
+        if not self.capacity:
+            return 0.0
+        # A request larger than the whole bucket just waits for a full bucket
+        deficit = min(cost, self.capacity) - self.level
+        return deficit * 60.0 / self.capacity if deficit > 0 else 0.0
+
+    def observe(self, remaining, limit):
+        if limit:
+            self.capacity = limit
+        elif remaining is not None:
+            self.capacity = max(self.capacity or 0.0, remaining)
+        if remaining is not None:
+            # The server's count is authoritative, but requests still in flight
+            # are already deducted locally — keep the more conservative value.
+            self.level = min(self.level, remaining) if self.synced else remaining
+            self.synced = True
+
+
+class RateLimiter:
+    """Paces requests to one deployment using Azure's rate-limit headers.
+
+    Keeps a request bucket and a token bucket sized from
+    x-ratelimit-limit-requests/-tokens (or the largest remaining count seen)
+    and resynced to x-ratelimit-remaining-requests/-tokens after every
+    response. A 429 blocks every caller until its Retry-After has passed, so
+    concurrent workers back off together instead of hammering the endpoint.
+    Until the first headers arrive nothing is paced. Thread-safe; the async
+    acquire shares the same state.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = _Bucket()
+        self._tokens = _Bucket()
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    def _reserve(self, tokens):
+        """Take one request + `tokens` from the buckets, or return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            wait = max(self._blocked_until - now,
+                       self._requests.wait_for(1),
+                       self._tokens.wait_for(tokens))
+            if wait > 0:
+                return wait
+            self._requests.level -= 1
+            self._tokens.level -= tokens
+            return 0.0
+
+    def acquire(self, tokens=0):
+        """Block until a request costing `tokens` may be sent."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=0):
+        """Async variant of acquire()."""
+        import asyncio
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def observe(self, headers):
+        """Resync the buckets from a successful response's headers."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self._requests, "requests"), (self._tokens, "tokens")):
+                bucket.refill(now)
+                bucket.observe(_header_number(headers, f"x-ratelimit-remaining-{kind}"),
+                               _header_number(headers, f"x-ratelimit-limit-{kind}"))
+
+    def on_throttled(self, headers, attempt):
+        """Record a 429: pause all callers for Retry-After (or a backoff)."""
+        delay = _retry_after_seconds(headers)
+        if delay is None:
+            delay = _backoff_seconds(attempt)
+        with self._lock:
+            self.throttled += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(client, model):
+    """Return the process-wide RateLimiter for a (endpoint, deployment) pair.
+
+    Azure quotas are per deployment, so every script thread or coroutine
+    calling the same deployment shares one limiter.
+    """
+    key = (str(getattr(client, "base_url", "")), model)
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(key)
+        if limiter is None:
+            limiter = _RATE_LIMITERS[key] = RateLimiter()
+        return limiter
+
+
+def _estimate_request_tokens(kwargs):
+    """Estimate the TPM cost Azure charges up front: prompt + max output tokens."""
+    prompt_chars = len(json.dumps(kwargs.get("messages", []), ensure_ascii=False, default=str))
+    max_out = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or 0
+    return prompt_chars // 4 + max_out
+
+
+def _cache_lookup(cache, client, kwargs, refresh):
+    """Return (key, cached ChatCompletion or None) for an optional ResponseCache."""
+    if cache is None:
+        return None, None
+    key = cache.make_key(client, kwargs)
+    value = None if refresh else cache.get(key)
+    if value is None:
+        return key, None
+    from openai.types.chat import ChatCompletion
+    data = json.loads(value)
+    if hasattr(ChatCompletion, "model_validate"):
+        return key, ChatCompletion.model_validate(data)
+    return key, ChatCompletion.parse_obj(data)  # pydantic v1
+
+
+def chat_completion(client, max_retries=5, cache=None, cache_refresh=False, **kwargs):
+    """Create a chat completion paced by the shared RateLimiter.
+
+    Drop-in replacement for client.chat.completions.create(**kwargs). 429s
+    wait for Retry-After; connection errors and 5xx back off exponentially.
+    The SDK's own retries are disabled so every 429 reaches the limiter.
+    Other API errors (400, 404, content filter) are raised immediately.
+
+    With a ResponseCache (see response_cache.py), identical requests are
+    answered from disk; `cache_refresh=True` skips the lookup but still
+    stores the fresh response (used when a cached reply was unusable).
+    """
+    import openai
+    key, cached = _cache_lookup(cache, client, kwargs, cache_refresh)
+    if cached is not None:
+        return cached
+    limiter = get_rate_limiter(client, kwargs.get("model"))
+    cost = _estimate_request_tokens(kwargs)
+    create = client.with_options(max_retries=0).chat.completions.with_raw_response.create
+    for attempt in range(max_retries + 1):
+        limiter.acquire(cost)
+        try:
+            raw = create(**kwargs)
+        except openai.RateLimitError as e:
+            limiter.on_throttled(e.response.headers, attempt)
+            if attempt >= max_retries:
+                raise
+            _METRICS.record_retry(kwargs.get("model"))
+            continue
+        except (openai.APIConnectionError, openai.InternalServerError):
+            if attempt >= max_retries:
+                raise
+            _METRICS.record_retry(kwargs.get("model"))
+            time.sleep(_backoff_seconds(attempt))
+            continue
+        limiter.observe(raw.headers)
+        resp = raw.parse()
+        if key:
+            cache.put(key, resp.model_dump_json())
+        return resp
+
+
+async def achat_completion(client, max_retries=5, cache=None, cache_refresh=False, **kwargs):
+    """Async variant of chat_completion() for clients from get_async_clients()."""
+    import asyncio
+    import openai
+    key, cached = _cache_lookup(cache, client, kwargs, cache_refresh)
+    if cached is not None:
+        return cached
+    limiter = get_rate_limiter(client, kwargs.get("model"))
+    cost = _estimate_request_tokens(kwargs)
+    create = client.with_options(max_retries=0).chat.completions.with_raw_response.create
+    for attempt in range(max_retries + 1):
+        await limiter.acquire_async(cost)
+        try:
+            raw = await create(**kwargs)
+        except openai.RateLimitError as e:
+            limiter.on_throttled(e.response.headers, attempt)
+            if attempt >= max_retries:
+                raise
+            _METRICS.record_retry(kwargs.get("model"))
+            continue
+        except (openai.APIConnectionError, openai.InternalServerError):
+            if attempt >= max_retries:
+                raise
+            _METRICS.record_retry(kwargs.get("model"))
+            await asyncio.sleep(_backoff_seconds(attempt))
+            continue
+        limiter.observe(raw.headers)
+        resp = raw.parse()
+        if key:
+            cache.put(key, resp.model_dump_json())
+        return resp
+
+
+def row_api_errors():
+    """Exceptions from chat_completion() that fail one request, not the run.
+
+    A rejected request (400, e.g. content filter), or throttling and outages
+    that outlasted chat_completion's retries. Authentication, permission and
+    missing-deployment errors are left out: they would fail every request,
+    so callers let them propagate and stop the run.
+    """
+    import openai
+    return (openai.BadRequestError, openai.RateLimitError,
+            openai.APIConnectionError, openai.InternalServerError)
+
+
+# ── Request metrics ──────────────────────────────────────────────────────────
+#
+# Every client from get_clients()/get_async_clients() carries httpx event
+# hooks that time each HTTP attempt and read `usage` from chat completion
+# bodies into one process-wide RequestMetrics. Scripts expose it via
+# --metrics-out (add_metrics_argument + write_metrics_on_exit).
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100.0) - 1))
+    return sorted_values[rank]
+
+
+class RequestMetrics:
+    """Per-model latency, token and retry counters. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._models = {}
+
+    def _model(self, model):
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = {
+                "latencies": [], "requests": 0, "ok": 0, "throttled": 0, "errors": 0,
+                "retries": 0, "tokens_in": 0, "tokens_out": 0,
+                "first": time.monotonic(), "last": time.monotonic(),
+            }
+        return stats
+
+    def record_response(self, model, seconds, status):
+        """One HTTP attempt finished (headers received) with `status`."""
+        with self._lock:
+            stats = self._model(model)
+            stats["requests"] += 1
+            stats["latencies"].append(seconds)
+            stats["last"] = time.monotonic()
+            stats["first"] = min(stats["first"], stats["last"] - seconds)
+            if status == 429:
+                stats["throttled"] += 1
+            elif status >= 400:
+                stats["errors"] += 1
+            else:
+                stats["ok"] += 1
+
+    def record_usage(self, model, usage):
+        """Add a response's `usage` block (dict) to the model's token totals."""
+        if not usage:
+            return
+        with self._lock:
+            stats = self._model(model)
+            stats["tokens_in"] += usage.get("prompt_tokens") or usage.get("input_tokens") or 0
+            stats["tokens_out"] += usage.get("completion_tokens") or usage.get("output_tokens") or 0
+
+    def record_retry(self, model):
+        with self._lock:
+            self._model(model)["retries"] += 1
+
+    def summary(self):
+        """Return {"wall_seconds", "models": {model: {...}}} ready for json.dump."""
+        with self._lock:
+            models = {}
+            for model, stats in sorted(self._models.items()):
+                lat = sorted(stats["latencies"])
+                active = max(stats["last"] - stats["first"], 1e-9)
+                ms = lambda v: None if v is None else round(v * 1000, 1)  # noqa: E731
+                models[model] = {
+                    "requests": stats["requests"], "ok": stats["ok"], "throttled": stats["throttled"],
+                    "errors": stats["errors"], "retries": stats["retries"],
+                    "latency_ms": {"p50": ms(_percentile(lat, 50)), "p95": ms(_percentile(lat, 95)),
+                                   "p99": ms(_percentile(lat, 99)),
+                                   "mean": ms(sum(lat) / len(lat)) if lat else None,
+                                   "max": ms(lat[-1]) if lat else None},
+                    "tokens_in": stats["tokens_in"], "tokens_out": stats["tokens_out"],
+                    "tokens_per_sec": round((stats["tokens_in"] + stats["tokens_out"]) / active, 1),
+                    "output_tokens_per_sec": round(stats["tokens_out"] / active, 1),
+                }
+            return {"wall_seconds": round(time.time() - self._started, 3), "models": models}
+
+
+_METRICS = RequestMetrics()
+
+
+def get_metrics():
+    """Return the process-wide RequestMetrics fed by every instrumented client."""
+    return _METRICS
+
+
+def _request_model(request):
+    """Best-effort model/deployment label for an outgoing httpx request."""
+    path = request.url.path
+    if "/deployments/" in path:
+        return path.split("/deployments/", 1)[1].split("/", 1)[0]
+    if request.method == "POST" and path.endswith(("/chat/completions", "/responses", "/embeddings")):
+        try:
+            return json.loads(request.content).get("model") or "unknown"
+        except (ValueError, AttributeError):
+            return "unknown"
+    # Non-model calls (files, uploads, fine_tuning, batches) are grouped by resource
+    parts = [p for p in path.split("/") if p and p not in ("openai", "v1", "api", "projects")]
+    return f"<{parts[0]}>" if parts else "<other>"
+
+
+def _wants_usage(response):
+    return (response.status_code == 200
+            and response.request.url.path.endswith(("/chat/completions", "/responses", "/embeddings"))
+            and "text/event-stream" not in response.headers.get("content-type", ""))
+
+
+def _record_usage(response, model):
+    try:
+        _METRICS.record_usage(model, response.json().get("usage"))
+    except ValueError:
+        pass
+
+
+def _instrument_client(client):
+    """Attach timing/usage event hooks to an OpenAI client's httpx client."""
+    http = getattr(client, "_client", None)  # the SDK's underlying httpx client
+    if http is None or getattr(http, "_ft_instrumented", False):
+        return client
+    import httpx
+
+    def on_request(request):
+        request.extensions["ft_start"] = time.perf_counter()
+
+    def on_response(response):
+        request = response.request
+        model = _request_model(request)
+        start = request.extensions.get("ft_start", time.perf_counter())
+        _METRICS.record_response(model, time.perf_counter() - start, response.status_code)
+        if _wants_usage(response):
+            response.read()
+            _record_usage(response, model)
+
+    async def on_request_async(request):
+        on_request(request)
+
+    async def on_response_async(response):
+        request = response.request
+        model = _request_model(request)
+        start = request.extensions.get("ft_start", time.perf_counter())
+        _METRICS.record_response(model, time.perf_counter() - start, response.status_code)
+        if _wants_usage(response):
+            await response.aread()
+            _record_usage(response, model)
+
+    is_async = isinstance(http, httpx.AsyncClient)
+    hooks = http.event_hooks
+    hooks["request"].append(on_request_async if is_async else on_request)
+    hooks["response"].append(on_response_async if is_async else on_response)
+    http.event_hooks = hooks
+    http._ft_instrumented = True
+    return client
+
+
+def add_metrics_argument(parser):
+    parser.add_argument("--metrics-out", default=None, metavar="PATH",
+                        help="Write per-model latency (p50/p95/p99), token, retry and throttle "
+                             "metrics as JSON when the script exits")
+
+
+def write_metrics_on_exit(path):
+    """Register an atexit handler writing get_metrics().summary() to `path`."""
+    if not path:
+        return
+    import atexit
+
+    def _write():
+        summary = _METRICS.summary()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        for model, m in summary["models"].items():
+            lat = m["latency_ms"]
+            print(f"📊 {model}: {m['requests']} calls, p50 {lat['p50']}ms / p95 {lat['p95']}ms / "
+                  f"p99 {lat['p99']}ms, {m['tokens_in']} in / {m['tokens_out']} out tokens, "
+                  f"{m['throttled']} throttled, {m['retries']} retries")
+        print(f"📊 Metrics written to {path}")
+
+    atexit.register(_write)
+
+
+# Files above this go through the chunked Uploads API — files.create()
+# silently fails on JSONL above ~150MB (see references/large-file-uploads.md).
+_CHUNKED_UPLOAD_THRESHOLD = 100 * 1024 * 1024
+_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+
+
+def _upload_state_name(filepath, size, mtime, purpose, base_url=""):
+    # The endpoint is part of the key: an upload ID opened on one resource
+    # means nothing to another, so switching endpoints starts a new upload.
+    key = hashlib.sha256(json.dumps(
+        [os.path.abspath(filepath), size, mtime, purpose, str(base_url)]).encode()).hexdigest()[:24]
+    return os.path.join("uploads", f"{key}.json")
+
+
+def _upload_part(openai_client, upload_id, filepath, offset, length, retries=3):
+    """Read one part from disk and upload it. Returns the part ID."""
+    import openai
+    with open(filepath, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    for attempt in range(retries):
+        try:
+            return openai_client.uploads.parts.create(upload_id=upload_id, data=data).id
+        except (openai.NotFoundError, openai.BadRequestError):
+            raise  # the upload itself is gone or closed; retrying won't help
+        except Exception:
+            if attempt >= retries - 1:
+                raise
+            time.sleep(_backoff_seconds(attempt))
+
+
+def _start_upload(openai_client, filepath, purpose, size, part_size, state_name):
+    """Open a new upload and persist its (empty) resume state."""
+    import openai
+    try:
+        upload = openai_client.uploads.create(
+            filename=os.path.basename(filepath), purpose=purpose,
+            bytes=size, mime_type="application/jsonl",
+        )
+    except openai.NotFoundError as e:
+        raise RuntimeError(
+            "Uploads API not available on this endpoint. Large uploads require an "
+            "Azure OpenAI endpoint (--endpoint), not the /v1/ project URL."
+        ) from e
+    state = {"upload_id": upload.id, "part_size": part_size, "parts": {},
+             "expires_at": getattr(upload, "expires_at", None) or time.time() + 3600}
+    _save_cache(state_name, state)
+    return state
+
+
+def _send_parts(openai_client, filepath, size, part_size, workers, state_name, state):
+    """Send every part not yet recorded in `state`, then complete the upload."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    n_parts = (size + part_size - 1) // part_size
+    upload_id = state["upload_id"]
+    done = {int(i): pid for i, pid in state.get("parts", {}).items()}
+    pending = [i for i in range(n_parts) if i not in done]
+    print(f"   Uploading {len(pending)} part(s) of {part_size // (1024 * 1024)}MB "
+          f"with {min(workers, max(1, len(pending)))} worker(s)...")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_upload_part, openai_client, upload_id, filepath,
+                        i * part_size, min(part_size, size - i * part_size)): i
+            for i in pending
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            done[i] = future.result()  # re-raises; finished parts stay recorded
+            state["parts"] = {str(k): v for k, v in done.items()}
+            _save_cache(state_name, state)
+            print(f"   Part {len(done)}/{n_parts} uploaded")
+
+    completed = openai_client.uploads.complete(
+        upload_id=upload_id, part_ids=[done[i] for i in range(n_parts)])
+    _delete_cache(state_name)
+    return completed.file.id
+
+
+def _chunked_upload(openai_client, filepath, purpose, workers, part_size):
+    """Upload via the Uploads API: parts in parallel, resumable across runs.
+
+    Each worker reads only its own part from disk, so memory stays at
+    ~workers × part_size regardless of file size. Finished part IDs are
+    persisted after every part; rerunning after an interruption reuses the
+    open upload and only sends the missing parts. If the service no longer
+    accepts the saved upload (404/400 — cancelled, expired early, or already
+    completed), the saved state is dropped and a fresh upload is started.
+    """
+    import openai
+
+    stat = os.stat(filepath)
+    size = stat.st_size
+    n_parts = (size + part_size - 1) // part_size
+    state_name = _upload_state_name(filepath, size, stat.st_mtime, purpose,
+                                    getattr(openai_client, "base_url", ""))
+    state = _load_cache(state_name)
+
+    if (state.get("upload_id") and state.get("part_size") == part_size
+            and state.get("expires_at", 0) > time.time() + 60):
+        print(f"   Resuming upload {state['upload_id']} "
+              f"({len(state.get('parts', {}))}/{n_parts} parts already sent)")
+        try:
+            return _send_parts(openai_client, filepath, size, part_size, workers, state_name, state)
+        except (openai.NotFoundError, openai.BadRequestError) as e:
+            print(f"   ⚠️ Saved upload {state['upload_id']} was rejected ({e.status_code}); "
+                  f"starting a fresh upload")
+            _delete_cache(state_name)
+
+    state = _start_upload(openai_client, filepath, purpose, size, part_size, state_name)
+    return _send_parts(openai_client, filepath, size, part_size, workers, state_name, state)
+
+
+_UPLOAD_MANIFEST = os.path.join("uploads", "manifest.json")
+_LOCK_TIMEOUT = 30  # seconds; an older lock file is assumed abandoned
+
+
+@contextlib.contextmanager
+def _cache_lock(name):
+    """Exclusive lock on cache file `name` (a sibling .lock file), so
+    read-modify-write updates from concurrent processes don't overwrite
+    each other. Best-effort: proceeds unlocked if the lock can't be taken."""
+    cache_dir = _cache_dir()
+    if not cache_dir:
+        yield
+        return
+    lock = os.path.join(cache_dir, name + ".lock")
+    deadline = time.time() + _LOCK_TIMEOUT
+    held = False
+    while not held:
+        try:
+            os.makedirs(os.path.dirname(lock), exist_ok=True)
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            held = True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > _LOCK_TIMEOUT:
+                    os.remove(lock)
+                    continue
+            except OSError:
+                continue  # released meanwhile
+            if time.time() > deadline:
+                break
+            time.sleep(0.05)
+        except OSError:
+            break
+    try:
+        yield
+    finally:
+        if held:
             try:
-                token_provider = _make_token_provider()
-                token_provider()  # verify it works
-                client = openai.AzureOpenAI(
-                    azure_endpoint=azure_endpoint,
-                    azure_ad_token_provider=token_provider,
-                    api_version="2025-04-01-preview",
-                )
-                print(f"✅ Connected via Azure OpenAI endpoint (DefaultAzureCredential, auto-refresh)")
-                return client, "azure-openai-aad"
-            except Exception as e:
-                print(f"⚠️ DefaultAzureCredential failed for Azure endpoint: {e}")
+                os.remove(lock)
+            except OSError:
+                pass
 
-    print("❌ No valid connection method. Set one of:")
-    print("   OPENAI_BASE_URL (preferred)")
-    print("   AZURE_AI_PROJECT_ENDPOINT (Foundry SDK)")
-    print("   AZURE_OPENAI_ENDPOINT + AZURE_OPENAI_API_KEY")
-    raise SystemExit(1)
 
+def _update_upload_manifest(update):
+    """Apply update(manifest) to the manifest as it is on disk now, under a
+    lock — training and validation files upload concurrently, and each must
+    not drop the other's entries."""
+    with _cache_lock(_UPLOAD_MANIFEST):
+        manifest = _load_cache(_UPLOAD_MANIFEST)
+        update(manifest)
+        _save_cache(_UPLOAD_MANIFEST, manifest)
 
-def upload_file(openai_client, filepath: str, purpose: str = "fine-tune") -> str:
-    """Upload a file to Microsoft Foundry and wait for processing."""
-    print(f"📤 Uploading {filepath}...")
+
+def _file_sha256(filepath, block_size=8 * 1024 * 1024):
+    """SHA-256 of a file, streamed in blocks."""
+    h = hashlib.sha256()
     with open(filepath, "rb") as f:
-        file_obj = openai_client.files.create(file=f, purpose=purpose)
-    print(f"   File ID: {file_obj.id}")
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+class _HashingReader(io.IOBase):
+    """Binary file wrapper that hashes the bytes as the upload reads them.
+
+    An io.IOBase so the openai SDK accepts it as file content.
+
+    digest() is the SHA-256 of the whole file only if it was read through
+    from offset 0 to EOF (a retry that seeks back to 0 starts over);
+    otherwise it is None and the caller hashes the file separately.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self.name = f.name
+        self._reset()
+
+    def _reset(self):
+        self._hash = hashlib.sha256()
+        self._pos = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        if self._pos is not None:
+            self._hash.update(data)
+            self._pos += len(data)
+            self._eof = self._eof or not data or size is None or size < 0
+        return data
+
+    def seek(self, offset, whence=0):
+        result = self._f.seek(offset, whence)
+        if result == 0:
+            self._reset()
+        elif result != self._pos:
+            self._pos = None  # jumped: the streamed hash no longer covers the file
+        return result
+
+    def tell(self):
+        return self._f.tell()
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def digest(self):
+        if self._pos is None or not self._eof:
+            return None
+        return self._hash.hexdigest()
+
+
+def _known_sha256(manifest, filepath, stat):
+    """The manifest's digest for `filepath` if its size and mtime are unchanged."""
+    known = manifest.get("hashes", {}).get(os.path.abspath(filepath))
+    if known and known.get("size") == stat.st_size and known.get("mtime") == stat.st_mtime:
+        return known["sha256"]
+    return None
+
+
+def _may_match(manifest, prefix, size):
+    """Whether any recorded upload under `prefix` (endpoint|purpose|) could be
+    this file: same size, or an older entry without one."""
+    return any(key.startswith(prefix) and entry.get("size", size) == size
+               for key, entry in manifest.get("files", {}).items())
+
+
+def _cached_upload(openai_client, manifest, key):
+    """Return a previously uploaded file ID for `key` if it is still processed."""
+    entry = manifest.get("files", {}).get(key)
+    if not entry:
+        return None
+    try:
+        if openai_client.files.retrieve(entry["file_id"]).status == "processed":
+            return entry["file_id"]
+    except Exception:
+        pass  # Deleted (cleanup.py) or otherwise unavailable — upload again
+    _update_upload_manifest(lambda m: m.get("files", {}).pop(key, None))
+    return None
+
+
+def upload_file(openai_client, filepath: str, purpose: str = "fine-tune",
+                workers: int = 4, part_size: int = _UPLOAD_PART_SIZE, dedup: bool = True) -> str:
+    """Upload a file to Microsoft Foundry and wait for processing.
+
+    Files above 100MB are sent through the chunked Uploads API with `workers`
+    parallel part uploads, and can resume after an interruption.
+
+    With `dedup`, identical content already uploaded to the same endpoint
+    (tracked by SHA-256 in a local manifest) is reused if the service still
+    reports it as processed — no upload, no processing wait, no extra slot
+    of the 100-file quota. The file is only hashed up front when a recorded
+    upload of the same size could match; otherwise the hash is taken while
+    the upload streams the file (chunked uploads: on a thread alongside the
+    part uploads), so new files are read once.
+    """
+    stat = os.stat(filepath)
+    prefix = f"{getattr(openai_client, 'base_url', '')}|{purpose}|"
+    digest = None
+    if dedup:
+        manifest = _load_cache(_UPLOAD_MANIFEST)
+        digest = _known_sha256(manifest, filepath, stat)
+        if digest is None and _may_match(manifest, prefix, stat.st_size):
+            digest = _file_sha256(filepath)
+        file_id = _cached_upload(openai_client, manifest, prefix + digest) if digest else None
+        if file_id:
+            print(f"♻️ {filepath} already uploaded (sha256 {digest[:12]}) — reusing {file_id}")
+            _record_upload(filepath, stat, digest)
+            return file_id
+
+    print(f"📤 Uploading {filepath}...")
+    if stat.st_size > _CHUNKED_UPLOAD_THRESHOLD:
+        hashing = None
+        if dedup and digest is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            hasher = ThreadPoolExecutor(max_workers=1)
+            hashing = hasher.submit(_file_sha256, filepath)
+            hasher.shutdown(wait=False)
+        file_id = _chunked_upload(openai_client, filepath, purpose, workers, part_size)
+        if hashing is not None:
+            digest = hashing.result()
+    else:
+        with open(filepath, "rb") as f:
+            reader = _HashingReader(f)
+            file_id = openai_client.files.create(file=reader, purpose=purpose).id
+        if dedup and digest is None:
+            digest = reader.digest() or _file_sha256(filepath)
+    print(f"   File ID: {file_id}")
     print(f"   Waiting for processing...")
-    openai_client.files.wait_for_processing(file_obj.id)
+    openai_client.files.wait_for_processing(file_id)
     print(f"   ✅ File ready")
-    return file_obj.id
+    if dedup:
+        _record_upload(filepath, stat, digest, prefix + digest, file_id)
+    return file_id
+
+
+def _record_upload(filepath, stat, digest, key=None, file_id=None):
+    def update(manifest):
+        manifest.setdefault("hashes", {})[os.path.abspath(filepath)] = {
+            "size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+        if key:
+            manifest.setdefault("files", {})[key] = {
+                "file_id": file_id, "filename": os.path.basename(filepath), "size": stat.st_size,
+                "uploaded_at": int(time.time()),
+            }
+
+    _update_upload_manifest(update)
@@ -22,7 +22,6 @@ Usage:
   python convert_dataset.py --input dpo.jsonl --output sft.jsonl --format sft-from-dpo
 """
 
-import json
 import os
 import sys
 
@@ -31,9 +30,12 @@ try:
     sys.stderr.reconfigure(encoding="utf-8")
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
-import time
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients
+from common import (
+    HelpOnErrorParser, add_metrics_argument, chat_completion,
+    get_clients, write_metrics_on_exit,
+)
+from jsonl_io import JsonlWriter, ParseError, load_jsonl, read_jsonl
 
 
 def parquet_to_sft(input_path, output_path, user_col, assistant_col, system_prompt=None):
@@ -60,7 +62,7 @@ def parquet_to_sft(input_path, output_path, user_col, assistant_col, system_prom
         sys.exit(1)
 
     count = 0
-    with open(output_path, "w", encoding="utf-8") as f:
+    with JsonlWriter(output_path) as out:
         for _, row in df.iterrows():
             user_content = str(row[user_col]).strip()
             asst_content = str(row[assistant_col]).strip()
@@ -73,7 +75,7 @@ def parquet_to_sft(input_path, output_path, user_col, assistant_col, system_prom
             messages.append({"role": "user", "content": user_content})
             messages.append({"role": "assistant", "content": asst_content})
 
-            f.write(json.dumps({"messages": messages}, ensure_ascii=False) + "\n")
+            out.write({"messages": messages})
             count += 1
 
     print(f"Converted {count} examples to SFT JSONL → {output_path}")
@@ -84,18 +86,11 @@ def sft_to_dpo(input_path, output_path, client, base_model):
 
     DPO format uses: input (system+user messages), preferred_output, non_preferred_output.
     """
-    with open(input_path, encoding="utf-8") as inf:
-        examples = []
-        for ln, raw in enumerate(inf, 1):
-            if not raw.strip():
-                continue
-            try:
-                examples.append(json.loads(raw))
-            except json.JSONDecodeError as e:
-                print(f"  ⚠️ Skipping malformed JSON on line {ln}: {e}")
+    examples = load_jsonl(input_path, on_error=lambda e: print(
+        f"  ⚠️ Skipping malformed JSON on line {e.line_no}: {e}"))
     count = 0
 
-    with open(output_path, "w", encoding="utf-8") as f:
+    with JsonlWriter(output_path) as out:
         for i, ex in enumerate(examples):
             msgs = ex["messages"]
             system_msgs = [m for m in msgs if m["role"] == "system"]
@@ -107,7 +102,8 @@ def sft_to_dpo(input_path, output_path, client, base_model):
             # Generate a non-preferred response from the base model
             try:
                 gen_msgs = system_msgs + [user_msg]
-                resp = client.chat.completions.create(
+                resp = chat_completion(
+                    client,
                     model=base_model,
                     messages=gen_msgs,
                     temperature=1.0,  # High temp for diversity
@@ -131,12 +127,11 @@ def sft_to_dpo(input_path, output_path, client, base_model):
                 "preferred_output": [asst_msg],
                 "non_preferred_output": [{"role": "assistant", "content": rejected_content}],
             }
-            f.write(json.dumps(dpo_entry, ensure_ascii=False) + "\n")
+            out.write(dpo_entry)
             count += 1
 
             if (i + 1) % 50 == 0:
                 print(f"  Processed {i+1}/{len(examples)}")
-                time.sleep(1)
 
     print(f"Converted {count} examples to DPO JSONL → {output_path}")
 
@@ -150,29 +145,23 @@ def sft_to_rft(input_path, output_path):
     """
     count = 0
     skipped = 0
-    with open(output_path, "w", encoding="utf-8") as out:
-        with open(input_path, encoding="utf-8") as inf:
-            for ln, line in enumerate(inf, 1):
-                if not line.strip():
-                    continue
-                try:
-                    ex = json.loads(line)
-                except json.JSONDecodeError as e:
-                    print(f"  ⚠️ Skipping malformed JSON on line {ln}: {e}")
-                    skipped += 1
-                    continue
-                msgs = ex.get("messages", [])
-                # Keep only system + user messages; RFT last message must be user
-                rft_msgs = [m for m in msgs if m["role"] in ("system", "user")]
-                if not rft_msgs or rft_msgs[-1]["role"] != "user":
-                    skipped += 1
-                    continue
-                # Extract assistant content as a reference answer placeholder
-                asst_msgs = [m for m in msgs if m["role"] == "assistant"]
-                expected = asst_msgs[-1]["content"] if asst_msgs else ""
-                rft_entry = {"messages": rft_msgs, "expected_answer": expected}
-                out.write(json.dumps(rft_entry, ensure_ascii=False) + "\n")
-                count += 1
+    with JsonlWriter(output_path) as out:
+        for ln, ex in read_jsonl(input_path):
+            if isinstance(ex, ParseError):
+                print(f"  ⚠️ Skipping malformed JSON on line {ln}: {ex}")
+                skipped += 1
+                continue
+            msgs = ex.get("messages", [])
+            # Keep only system + user messages; RFT last message must be user
+            rft_msgs = [m for m in msgs if m["role"] in ("system", "user")]
+            if not rft_msgs or rft_msgs[-1]["role"] != "user":
+                skipped += 1
+                continue
+            # Extract assistant content as a reference answer placeholder
+            asst_msgs = [m for m in msgs if m["role"] == "assistant"]
+            expected = asst_msgs[-1]["content"] if asst_msgs else ""
+            out.write({"messages": rft_msgs, "expected_answer": expected})
+            count += 1
     print(f"Converted {count} examples to RFT JSONL → {output_path}")
     if skipped:
         print(f"  Skipped {skipped} examples (no user message)")
@@ -182,28 +171,23 @@ def sft_to_rft(input_path, output_path):
 def dpo_to_sft(input_path, output_path, system_prompt=None):
     """Extract chosen responses from DPO format to SFT format."""
     count = 0
-    with open(output_path, "w", encoding="utf-8") as f:
-        with open(input_path, encoding="utf-8") as inf:
-            for ln, line in enumerate(inf, 1):
-                if not line.strip():
-                    continue
-                try:
-                    ex = json.loads(line)
-                except json.JSONDecodeError as e:
-                    print(f"  ⚠️ Skipping malformed JSON on line {ln}: {e}")
-                    continue
-                input_messages = ex["input"]["messages"]
-                chosen_messages = ex["preferred_output"]
-
-                messages = []
-                if system_prompt:
-                    messages.append({"role": "system", "content": system_prompt})
-                    messages.extend(m for m in input_messages if m["role"] != "system")
-                else:
-                    messages.extend(input_messages)
-                messages.extend(chosen_messages)
-                f.write(json.dumps({"messages": messages}, ensure_ascii=False) + "\n")
-                count += 1
+    with JsonlWriter(output_path) as out:
+        for ln, ex in read_jsonl(input_path):
+            if isinstance(ex, ParseError):
+                print(f"  ⚠️ Skipping malformed JSON on line {ln}: {ex}")
+                continue
+            input_messages = ex["input"]["messages"]
+            chosen_messages = ex["preferred_output"]
+
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+                messages.extend(m for m in input_messages if m["role"] != "system")
+            else:
+                messages.extend(input_messages)
+            messages.extend(chosen_messages)
+            out.write({"messages": messages})
+            count += 1
     print(f"Extracted {count} chosen examples to SFT JSONL → {output_path}")
 
 
@@ -230,7 +214,9 @@ def main():
     parser.add_argument("--api-key", default=os.environ.get("AZURE_OPENAI_API_KEY"))
     parser.add_argument("--base-model", default="gpt-4.1-mini", help="Base model for generating rejections")
 
+    add_metrics_argument(parser)
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
 
     if args.format == "sft":
         if args.input.endswith(".jsonl"):
@@ -30,8 +30,6 @@ import time
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from common import HelpOnErrorParser
 
-import requests
-
 
 def _safe_error_msg(resp):
     """Extract error message from response, handling non-JSON bodies (HTML 502/503)."""
@@ -44,21 +42,31 @@ def _safe_error_msg(resp):
 DEFAULT_SUB = os.environ.get("AZURE_SUBSCRIPTION_ID", "")
 DEFAULT_RG = os.environ.get("AZURE_RESOURCE_GROUP", "")
 DEFAULT_ACCOUNT = os.environ.get("AZURE_COGSERVICES_ACCOUNT", "")
-AZ_CLI = os.environ.get("AZ_CLI_PATH")
-if not AZ_CLI:
-    import shutil
-    AZ_CLI = shutil.which("az")
-    if not AZ_CLI:
-        # Common Windows paths
-        for candidate in [
-            r"C:\Program Files (x86)\Microsoft SDKs\Azure\CLI2\wbin\az.cmd",
-            r"C:\Program Files\Microsoft SDKs\Azure\CLI2\wbin\az.cmd",
-        ]:
-            if os.path.exists(candidate):
-                AZ_CLI = candidate
-                break
-    if not AZ_CLI:
-        AZ_CLI = "az"  # last resort, hope it's on PATH
+_AZ_CLI = None
+
+
+def az_cli():
+    """Locate the Azure CLI on first use (not at import, so --help stays fast)."""
+    global _AZ_CLI
+    if _AZ_CLI:
+        return _AZ_CLI
+    az = os.environ.get("AZ_CLI_PATH")
+    if not az:
+        import shutil
+        az = shutil.which("az")
+        if not az:
+            # Common Windows paths
+            for candidate in [
+                r"C:\Program Files (x86)\Microsoft SDKs\Azure\CLI2\wbin\az.cmd",
+                r"C:\Program Files\Microsoft SDKs\Azure\CLI2\wbin\az.cmd",
+            ]:
+                if os.path.exists(candidate):
+                    az = candidate
+                    break
+        if not az:
+            az = "az"  # last resort, hope it's on PATH
+    _AZ_CLI = az
+    return az
 
 # Model format auto-detection rules
 FORMAT_RULES = [
@@ -73,7 +81,7 @@ FORMAT_RULES = [
 def get_arm_token():
     """Get a fresh ARM token from Azure CLI."""
     result = subprocess.run(
-        [AZ_CLI, "account", "get-access-token", "--query", "accessToken", "-o", "tsv"],
+        [az_cli(), "account", "get-access-token", "--query", "accessToken", "-o", "tsv"],
         capture_output=True, text=True,
     )
     token = result.stdout.strip()
@@ -103,6 +111,8 @@ def detect_format(model_id):
 
 def create_deployment(sub, rg, account, name, model_id, model_format, sku, capacity):
     """Create a deployment via ARM REST API."""
+    import requests
+
     token = get_arm_token()
     url = arm_url(sub, rg, account, name)
 
@@ -132,6 +142,8 @@ def create_deployment(sub, rg, account, name, model_id, model_format, sku, capac
 
 def wait_for_deployment(sub, rg, account, name, timeout=600, poll_interval=15):
     """Wait for deployment to reach 'Succeeded' state."""
+    import requests
+
     url = arm_url(sub, rg, account, name)
     start = time.time()
 
@@ -162,6 +174,8 @@ def wait_for_deployment(sub, rg, account, name, timeout=600, poll_interval=15):
 
 def delete_deployment(sub, rg, account, name):
     """Delete a deployment."""
+    import requests
+
     token = get_arm_token()
     url = arm_url(sub, rg, account, name)
     resp = requests.delete(url, headers={"Authorization": f"Bearer {token}"}, timeout=(10, 60))
@@ -173,6 +187,8 @@ def delete_deployment(sub, rg, account, name):
 
 def list_deployments(sub, rg, account):
     """List all deployments."""
+    import requests
+
     token = get_arm_token()
     url = arm_url(sub, rg, account)
     resp = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=(10, 60))
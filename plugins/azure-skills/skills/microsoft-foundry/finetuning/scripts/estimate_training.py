@@ -0,0 +1,277 @@
+# /// script
+# dependencies = [
+#   "openai>=1.0",
+#   "azure-identity",
+#   "azure-ai-projects",
+# ]
+# ///
+"""
+estimate_training.py — Predict the trained tokens, cost and duration of a
+fine-tuning job before submitting it.
+
+Trained tokens are the dataset's tokens (counted by the validation engine,
+exact with tiktoken installed) times the number of epochs — what the service
+bills. Cost comes from a per-model training price table (USD per 1M trained
+tokens, or per training hour for RFT on o4-mini); override or extend it with
+--pricing prices.json for your region or agreement.
+
+Duration is fitted on your own completed jobs: each succeeded job with
+`trained_tokens` and created/finished timestamps (listed with
+cleanup._iter_all_jobs) is one sample of wall-clock seconds, queueing
+included. With 3+ jobs of the same base model, seconds = overhead +
+tokens / throughput is fitted by least squares; otherwise the median
+tokens-per-second of those jobs is used. The likely range scales the
+prediction by the spread of the past jobs around the fit.
+
+Usage:
+  python estimate_training.py train.jsonl --model gpt-4.1-mini --epochs 2
+  python estimate_training.py train.jsonl --model gpt-4.1-mini --no-history
+  python estimate_training.py train.jsonl --model o4-mini --pricing prices.json --json
+
+prices.json: {"gpt-4.1-mini": {"per_mtok": 5.0}, "o4-mini": {"per_hour": 100.0}}
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+from statistics import median
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "validate"))
+from common import HelpOnErrorParser, add_metrics_argument, get_clients, write_metrics_on_exit
+from engine import _token_basis, validate_file
+
+# USD training list prices (Global Standard) at the time of writing — check the
+# Azure OpenAI pricing page for your region and pass --pricing to override.
+TRAINING_PRICES = {
+    "gpt-4.1": {"per_mtok": 25.00},
+    "gpt-4.1-mini": {"per_mtok": 5.00},
+    "gpt-4.1-nano": {"per_mtok": 1.50},
+    "gpt-4o": {"per_mtok": 25.00},
+    "gpt-4o-mini": {"per_mtok": 3.00},
+    "o4-mini": {"per_hour": 100.00},
+}
+MIN_FIT_JOBS = 3       # fewer same-model jobs: median throughput, no overhead term
+MIN_RANGE_JOBS = 4     # fewer: no likely range
+DEFAULT_HISTORY = 200  # most recent jobs read from the listing
+_DATE_SUFFIX = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+
+def base_model(name):
+    """'gpt-4.1-mini-2025-04-14' / 'ft:gpt-4.1-mini:org::id' -> 'gpt-4.1-mini'."""
+    if name.startswith("ft:"):
+        name = name.split(":")[1]
+    return _DATE_SUFFIX.sub("", name)
+
+
+def load_pricing(path=None):
+    """TRAINING_PRICES updated with the {model: {"per_mtok"|"per_hour": USD}} file at `path`."""
+    prices = dict(TRAINING_PRICES)
+    if not path:
+        return prices
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+    for model, price in overrides.items():
+        if not isinstance(price, dict) or not ({"per_mtok", "per_hour"} & set(price)):
+            raise ValueError(f"{path}: price of '{model}' must be {{\"per_mtok\": USD}} or {{\"per_hour\": USD}}")
+        prices[model] = price
+    return prices
+
+
+def job_samples(jobs, model):
+    """[(trained_tokens, wall-clock seconds)] of the succeeded jobs on `model`'s base model."""
+    samples = []
+    target = base_model(model)
+    for job in jobs:
+        tokens = getattr(job, "trained_tokens", None)
+        created, finished = getattr(job, "created_at", None), getattr(job, "finished_at", None)
+        if getattr(job, "status", None) != "succeeded" or not tokens or not created or not finished:
+            continue
+        if base_model(getattr(job, "model", "") or "") == target and finished > created:
+            samples.append((tokens, finished - created))
+    return samples
+
+
+def fit_throughput(samples):
+    """{"overhead_s", "tokens_per_s", "jobs", "spread"} from job samples, or None.
+
+    spread is the (25th, 75th) percentile of actual / predicted seconds over
+    the samples, None with fewer than MIN_RANGE_JOBS.
+    """
+    if not samples:
+        return None
+    overhead, rate = 0.0, median(tokens / seconds for tokens, seconds in samples)
+    if len(samples) >= MIN_FIT_JOBS:
+        n = len(samples)
+        mean_t = sum(t for t, _ in samples) / n
+        mean_s = sum(s for _, s in samples) / n
+        var = sum((t - mean_t) ** 2 for t, _ in samples)
+        if var:
+            slope = sum((t - mean_t) * (s - mean_s) for t, s in samples) / var
+            intercept = mean_s - slope * mean_t
+            if slope > 0 and intercept >= 0:  # otherwise the sizes don't explain the durations
+                overhead, rate = intercept, 1 / slope
+    fit = {"overhead_s": round(overhead, 1), "tokens_per_s": round(rate, 2), "jobs": len(samples), "spread": None}
+    if len(samples) >= MIN_RANGE_JOBS:
+        ratios = sorted(s / (overhead + t / rate) for t, s in samples)
+        fit["spread"] = (round(ratios[len(ratios) // 4], 3), round(ratios[(3 * len(ratios)) // 4], 3))
+    return fit
+
+
+def predict(dataset_tokens, epochs, model, prices, throughput=None):
+    """The estimate as a JSON-serializable dict; cost / duration are None when unknown."""
+    trained = dataset_tokens * epochs
+    seconds = low = high = None
+    if throughput:
+        seconds = throughput["overhead_s"] + trained / throughput["tokens_per_s"]
+        if throughput["spread"]:
+            low, high = (seconds * r for r in throughput["spread"])
+    price = prices.get(base_model(model))
+    cost = None
+    if price and "per_mtok" in price:
+        cost = trained / 1_000_000 * price["per_mtok"]
+    elif price and seconds is not None:
+        cost = seconds / 3600 * price["per_hour"]  # wall clock includes queueing: an upper bound
+    return {
+        "model": model,
+        "epochs": epochs,
+        "dataset_tokens": dataset_tokens,
+        "trained_tokens": trained,
+        "price": price,
+        "cost_usd": None if cost is None else round(cost, 2),
+        "duration_s": None if seconds is None else round(seconds),
+        "duration_range_s": None if low is None else [round(low), round(high)],
+        "throughput": throughput,
+    }
+
+
+def format_duration(seconds):
+    """Format seconds as '2h 05m' / '14m' / '40s'."""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+def print_estimate(estimate, filepath, basis, history_note):
+    print(f"\n{'='*60}")
+    print(f"Training Estimate: {filepath}")
+    print(f"{'='*60}")
+    print(f"Base model:       {estimate['model']} ({estimate['epochs']} epoch{'s' * (estimate['epochs'] != 1)})")
+    print(f"Dataset tokens:   {estimate['dataset_tokens']:,} ({basis})")
+    print(f"Trained tokens:   {estimate['trained_tokens']:,}")
+
+    price = estimate["price"]
+    if estimate["cost_usd"] is not None:
+        rate = f"${price['per_mtok']:.2f} / 1M training tokens" if "per_mtok" in price else \
+            f"${price['per_hour']:.2f} / training hour, wall clock as an upper bound"
+        print(f"Cost:             ${estimate['cost_usd']:,.2f} (at {rate})")
+    elif price:
+        print(f"Cost:             — (billed per training hour; needs a duration estimate)")
+    else:
+        print(f"Cost:             — (no price for '{base_model(estimate['model'])}'; pass --pricing prices.json)")
+
+    throughput = estimate["throughput"]
+    if estimate["duration_s"] is None:
+        print(f"Duration:         — (unknown: {history_note}; pass --tokens-per-second to set a throughput)")
+    else:
+        likely = ""
+        if estimate["duration_range_s"]:
+            low, high = estimate["duration_range_s"]
+            likely = f", likely {format_duration(low)} – {format_duration(high)}"
+        print(f"Duration:         ~{format_duration(estimate['duration_s'])}{likely}")
+        overhead = f" + {format_duration(throughput['overhead_s'])} overhead" if throughput["overhead_s"] else ""
+        print(f"  Based on {history_note}: {throughput['tokens_per_s']:,.0f} trained tokens/s{overhead}")
+    if basis == "approx":
+        print(f"\n⚠️  Token counts are ~4 chars/token estimates — install tiktoken for exact counts.")
+
+
+def build_parser():
+    parser = HelpOnErrorParser(
+        description="Predict the trained tokens, cost and duration of a fine-tuning job",
+        epilog=(
+            "Examples:\n"
+            "  python estimate_training.py train.jsonl --model gpt-4.1-mini --epochs 2\n"
+            "  python estimate_training.py train.jsonl --model gpt-4.1-mini --no-history\n"
+            "  python estimate_training.py train.jsonl --model o4-mini --pricing prices.json --json"
+        ),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("filepath", help="Training JSONL file")
+    parser.add_argument("--model", required=True, help="Base model name (e.g., gpt-4.1-mini)")
+    parser.add_argument("--epochs", type=int, default=2, help="Training epochs (default: 2, as submit_training.py)")
+    parser.add_argument("--pricing", default=None,
+                        help="JSON file of training prices: {model: {\"per_mtok\": USD} or {\"per_hour\": USD}}")
+    parser.add_argument("--tokens-per-second", type=float, default=None,
+                        help="Use this training throughput instead of fitting past jobs")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Don't list past jobs (cost only, unless --tokens-per-second is given)")
+    parser.add_argument("--history", type=int, default=DEFAULT_HISTORY,
+                        help=f"Most recent jobs to learn throughput from (default: {DEFAULT_HISTORY})")
+    parser.add_argument("--json", action="store_true", help="Print the estimate as JSON")
+    parser.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL"), help="Project /v1/ endpoint URL")
+    parser.add_argument("--endpoint", default=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+                        help="Azure OpenAI endpoint (fallback)")
+    parser.add_argument("--api-key", default=os.environ.get("AZURE_OPENAI_API_KEY"), help="API key")
+    parser.add_argument("--project-endpoint", default=os.environ.get("AZURE_AI_PROJECT_ENDPOINT"),
+                        help="Azure AI project endpoint")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    add_metrics_argument(parser)
+    args = parser.parse_args(argv)
+    write_metrics_on_exit(args.metrics_out)
+    if args.epochs < 1:
+        parser.error("--epochs must be at least 1")
+    if not os.path.isfile(args.filepath):
+        print(f"❌ File not found: {args.filepath}")
+        sys.exit(1)
+    try:
+        prices = load_pricing(args.pricing)
+    except (OSError, ValueError) as e:
+        parser.error(f"--pricing: {e}")
+
+    result = validate_file(args.filepath, model=args.model)
+    if not result.stats or not result.stats.records:
+        print(f"❌ No valid records found in {args.filepath}")
+        sys.exit(1)
+    if not result.ok:
+        print(f"⚠️  {args.filepath} has validation errors — run `ft.py validate` first; "
+              "invalid records are not counted.")
+
+    throughput, history_note = None, "--no-history"
+    if args.tokens_per_second:
+        throughput = {"overhead_s": 0.0, "tokens_per_s": args.tokens_per_second, "jobs": 0, "spread": None}
+        history_note = "--tokens-per-second"
+    elif not args.no_history:
+        from cleanup import _iter_all_jobs
+
+        client, _ = get_clients(base_url=args.base_url, azure_endpoint=args.endpoint,
+                                project_endpoint=args.project_endpoint, api_key=args.api_key)
+        samples = job_samples(itertools.islice(_iter_all_jobs(client), args.history), args.model)
+        throughput = fit_throughput(samples)
+        history_note = (f"{len(samples)} past {base_model(args.model)} job{'s' * (len(samples) != 1)}" if samples
+                        else f"no completed {base_model(args.model)} jobs in the last {args.history}")
+
+    estimate = predict(result.stats.token_counts.total, args.epochs, args.model, prices, throughput)
+    if args.json:
+        estimate.update(filepath=args.filepath, tokens=_token_basis(result))
+        print(json.dumps(estimate, indent=2))
+        return
+    print_estimate(estimate, args.filepath, _token_basis(result), history_note)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,13 @@ Usage:
       --deployment-name my-ft-eval \
       --test-file test.jsonl \
       --concurrency 4
+
+  # Warn if the "held-out" test prompts also appear in training
+  python evaluate_model.py --deployment-name my-ft-eval --test-file test.jsonl --train-file train.jsonl
+
+  # Grade through one Batch API job (judge must be a Global Batch deployment)
+  python evaluate_model.py --deployment-name my-ft-eval --test-file test.jsonl \
+      --judge-model gpt-4o-batch --backend batch
 """
 
 import json
@@ -44,10 +51,14 @@ try:
     sys.stderr.reconfigure(encoding="utf-8")
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
-import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients, _clamp_score
+from batch_backend import add_batch_arguments
+from common import (
+    HelpOnErrorParser, add_metrics_argument, chat_completion,
+    get_clients, row_api_errors, write_metrics_on_exit, _clamp_score,
+)
+from jsonl_io import ParseError, read_jsonl
 
 
 JUDGE_PROMPT = """You are evaluating the quality of a model's output for a given task.
@@ -87,30 +98,25 @@ def load_test_data(filepath):
     reference from each example so per-example system prompts are preserved.
     """
     data = []
-    with open(filepath, encoding="utf-8") as f:
-        for i, line in enumerate(f):
-            if not line.strip():
-                continue
-            try:
-                ex = json.loads(line)
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Skipping malformed JSON on line {i+1}: {e}")
-                continue
-            msgs = ex.get("messages")
-            if not isinstance(msgs, list):
-                print(f"⚠️ Skipping example {i}: missing or invalid 'messages' list")
-                continue
-            prompt = next((m["content"] for m in msgs if m["role"] == "user"), None)
-            reference = next((m["content"] for m in msgs if m["role"] == "assistant"), None)
-            if not prompt:
-                print(f"⚠️ Skipping example {i}: missing 'user' message")
-                continue
-            if not reference:
-                print(f"⚠️ Skipping example {i}: missing 'assistant' message")
-                continue
-            system_msgs = [m["content"] for m in msgs if m["role"] == "system"]
-            system_prompt = system_msgs[0] if system_msgs else None
-            data.append({"prompt": prompt, "reference": reference, "system_prompt": system_prompt})
+    for line_no, ex in read_jsonl(filepath):
+        if isinstance(ex, ParseError):
+            print(f"⚠️ Skipping malformed JSON on line {line_no}: {ex}")
+            continue
+        msgs = ex.get("messages")
+        if not isinstance(msgs, list):
+            print(f"⚠️ Skipping line {line_no}: missing or invalid 'messages' list")
+            continue
+        prompt = next((m["content"] for m in msgs if m["role"] == "user"), None)
+        reference = next((m["content"] for m in msgs if m["role"] == "assistant"), None)
+        if not prompt:
+            print(f"⚠️ Skipping line {line_no}: missing 'user' message")
+            continue
+        if not reference:
+            print(f"⚠️ Skipping line {line_no}: missing 'assistant' message")
+            continue
+        system_msgs = [m["content"] for m in msgs if m["role"] == "system"]
+        system_prompt = system_msgs[0] if system_msgs else None
+        data.append({"prompt": prompt, "reference": reference, "system_prompt": system_prompt})
     return data
 
 
@@ -121,56 +127,92 @@ def generate_response(client, deployment, prompt, system_prompt=None, max_retrie
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": prompt})
 
-    for attempt in range(max_retries):
-        try:
-            resp = client.chat.completions.create(
-                model=deployment,
-                messages=messages,
-                temperature=0.0,
-                max_completion_tokens=2048,
-            )
-            content = resp.choices[0].message.content
-            if content is None:
-                # Content filter or empty completion — surface as an error sentinel
-                # so the aggregate filter at line ~`.startswith("ERROR:")` skips it.
-                finish = getattr(resp.choices[0], "finish_reason", "unknown")
-                return f"ERROR: empty content (finish_reason={finish})"
-            return content
-        except Exception as e:
-            if attempt >= max_retries - 1:
-                return f"ERROR: {e}"
-            time.sleep(3 * (attempt + 1))
-    return "ERROR: max retries exceeded"
-
-
-def grade_response(judge_client, judge_model, prompt, reference, output, max_retries=3):
-    """Grade a response using the LLM judge."""
+    try:
+        # chat_completion paces requests and retries throttling/transient errors
+        resp = chat_completion(
+            client,
+            max_retries=max_retries,
+            model=deployment,
+            messages=messages,
+            temperature=0.0,
+            max_completion_tokens=2048,
+        )
+    except Exception as e:
+        return f"ERROR: {e}"
+    content = resp.choices[0].message.content
+    if content is None:
+        # Content filter or empty completion — surface as an error sentinel
+        # so the aggregate filter at line ~`.startswith("ERROR:")` skips it.
+        finish = getattr(resp.choices[0], "finish_reason", "unknown")
+        return f"ERROR: empty content (finish_reason={finish})"
+    return content
+
+
+def build_grade_request(judge_model, prompt, reference, output):
+    """Build the judge request (chat.completions kwargs) for one response."""
     judge_input = JUDGE_PROMPT.format(prompt=prompt, reference=reference, output=output)
+    return {
+        "model": judge_model,
+        "messages": [{"role": "user", "content": judge_input}],
+        "temperature": 0.0,
+        "max_completion_tokens": 200,
+    }
+
+
+def parse_grade(text):
+    """Parse the judge's JSON reply into clamped scores, or None if unparseable."""
+    # Extract JSON from response
+    match = re.search(r'\{[^}]+\}', (text or "").strip())
+    if not match:
+        return None
+    try:
+        scores = json.loads(match.group())
+    except json.JSONDecodeError:
+        return None
+    return {
+        "correctness": _clamp_score(scores.get("correctness")),
+        "conciseness": _clamp_score(scores.get("conciseness")),
+    }
+
+
+def grade_response(judge_client, judge_model, prompt, reference, output, parse_attempts=3, cache=None):
+    """Grade a response using the LLM judge. `cache` is an optional ResponseCache.
 
-    for attempt in range(max_retries):
-        try:
-            resp = judge_client.chat.completions.create(
-                model=judge_model,
-                messages=[{"role": "user", "content": judge_input}],
-                temperature=0.0,
-                max_completion_tokens=200,
-            )
-            text = (resp.choices[0].message.content or "").strip()
-            # Extract JSON from response
-            match = re.search(r'\{[^}]+\}', text)
-            if match:
-                scores = json.loads(match.group())
-                return {
-                    "correctness": _clamp_score(scores.get("correctness")),
-                    "conciseness": _clamp_score(scores.get("conciseness")),
-                }
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(2)
-            else:
-                return {"correctness": 0, "conciseness": 0, "error": str(e)}
-
-    return {"correctness": 0, "conciseness": 0, "error": "All retries failed"}
+    API errors are raised (chat_completion has already retried them); an
+    unparseable judge reply is re-asked up to `parse_attempts` times.
+    """
+    request = build_grade_request(judge_model, prompt, reference, output)
+
+    for attempt in range(parse_attempts):
+        resp = chat_completion(
+            judge_client,
+            cache=cache,
+            cache_refresh=attempt > 0,  # a cached reply that failed to parse is replaced
+            **request,
+        )
+        scores = parse_grade(resp.choices[0].message.content)
+        if scores:
+            return scores
+
+    return {"correctness": 0, "conciseness": 0, "error": "unparseable judge reply"}
+
+
+def grade_batch(judge_client, judge_model, test_data, poll_interval=30, cache=None):
+    """Grade every response in one Batch API job. Returns scores per example."""
+    from batch_backend import message_content, run_batch
+
+    requests = [(str(i), build_grade_request(judge_model, ex["prompt"], ex["reference"], ex["output"]))
+                for i, ex in enumerate(test_data)]
+    results = run_batch(judge_client, requests, poll_interval=poll_interval, cache=cache)
+    graded = []
+    for i in range(len(test_data)):
+        body = results.get(str(i))
+        scores = parse_grade(message_content(body))
+        if scores is None:
+            scores = {"correctness": 0, "conciseness": 0,
+                      "error": "batch request failed" if body is None else "unparseable judge reply"}
+        graded.append(scores)
+    return graded
 
 
 def main():
@@ -184,6 +226,8 @@ def main():
     parser.add_argument("--api-key", default=os.environ.get("AZURE_OPENAI_API_KEY"))
     parser.add_argument("--deployment-name", required=True, help="Deployed model name")
     parser.add_argument("--test-file", required=True, help="Held-out test set (JSONL)")
+    parser.add_argument("--train-file", nargs="+", default=None,
+                        help="Training file(s) the model was tuned on; warns when test prompts overlap them")
     parser.add_argument("--system-prompt", default=None,
                         help="Override system prompt for all examples (default: use per-example system prompt from test data)")
 
@@ -196,8 +240,15 @@ def main():
     parser.add_argument("--output", default="eval_results.json", help="Output file")
     parser.add_argument("--concurrency", type=int, default=1,
                         help="Parallel grading workers (generation is always sequential)")
+    add_batch_arguments(parser)
+    parser.add_argument("--cache", default=None, metavar="PATH",
+                        help="SQLite file caching judge responses (temperature=0), so re-runs skip paid calls")
+    parser.add_argument("--cache-max-mb", type=float, default=512,
+                        help="Evict least-recently-used cached responses beyond this size (default: 512)")
 
+    add_metrics_argument(parser)
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
 
     # Set up model client via shared auth (supports /v1/, Foundry SDK, AzureOpenAI)
     model_client, method = get_clients(
@@ -218,9 +269,23 @@ def main():
     else:
         judge_client = model_client
 
+    cache = None
+    if args.cache:
+        from response_cache import ResponseCache
+        cache = ResponseCache(args.cache, max_mb=args.cache_max_mb)
+
     # Load data
     test_data = load_test_data(args.test_file)
     print(f"Loaded {len(test_data)} test examples from {args.test_file}")
+    if args.train_file:
+        from validate.leakage import check_leakage
+        report = check_leakage(args.train_file, [args.test_file])[0]
+        if report.leaked:
+            print(f"⚠️ {report.leaked}/{report.records} test prompts also appear in the training data "
+                  f"({len(report.exact)} exact, {len(report.normalized)} after normalization) — "
+                  "scores will be inflated. Run validate/leakage.py for line numbers.")
+        else:
+            print(f"✅ No test prompts found in the training data")
 
     # Phase 1: Generate responses (sequential to avoid rate limits)
     print(f"\nGenerating responses from {args.deployment_name}...")
@@ -236,18 +301,31 @@ def main():
     errors = sum(1 for ex in test_data if ex["output"].startswith("ERROR:"))
     print(f"  Done. {errors} errors out of {len(test_data)}.")
 
-    # Phase 2: Grade responses (parallel)
-    print(f"\nGrading with {args.judge_model} (concurrency={args.concurrency})...")
+    # Phase 2: Grade responses (parallel, or one batch job)
+    if args.backend == "batch":
+        print(f"\nGrading with {args.judge_model} (batch)...")
+        for ex, scores in zip(test_data, grade_batch(judge_client, args.judge_model, test_data,
+                                                     args.batch_poll_interval, cache)):
+            ex["scores"] = scores
+    else:
+        print(f"\nGrading with {args.judge_model} (concurrency={args.concurrency})...")
 
-    def grade_one(ex):
-        return grade_response(judge_client, args.judge_model,
-                              ex["prompt"], ex["reference"], ex["output"])
+        row_errors = row_api_errors()
+
+        def grade_one(ex):
+            # A rejected or exhausted judge call fails this example only;
+            # auth / missing-deployment errors propagate and stop the run.
+            try:
+                return grade_response(judge_client, args.judge_model,
+                                      ex["prompt"], ex["reference"], ex["output"], cache=cache)
+            except row_errors as e:
+                return {"correctness": 0, "conciseness": 0, "error": f"{type(e).__name__}: {e}"}
 
-    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
-        futures = {pool.submit(grade_one, ex): i for i, ex in enumerate(test_data)}
-        for future in as_completed(futures):
-            idx = futures[future]
-            test_data[idx]["scores"] = future.result()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = {pool.submit(grade_one, ex): i for i, ex in enumerate(test_data)}
+            for future in as_completed(futures):
+                idx = futures[future]
+                test_data[idx]["scores"] = future.result()
 
     # Aggregate
     valid_scores = [ex["scores"] for ex in test_data
@@ -289,6 +367,8 @@ def main():
     with open(args.output, "w", encoding="utf-8") as f:
         json.dump(results, f, indent=2)
     print(f"\nDetailed results saved to {args.output}")
+    if cache:
+        print(cache.summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+ft.py — Single entry point for the finetuning scripts.
+
+Dispatches `ft <command> [args...]` to the existing script, which is only
+loaded when its command runs — so `ft validate` and `ft stats` never import
+openai, azure-identity, requests or pandas and start in tens of milliseconds.
+Arguments after the command are passed through unchanged (`ft score --help`).
+
+Usage:
+  python ft.py validate train.jsonl              # auto-detects SFT/DPO/RFT
+  python ft.py validate train.jsonl --format rft --expected-field answer
+  python ft.py validate train.jsonl --no-stats
+  python ft.py stats train.jsonl
+  python ft.py dedup train.jsonl --on prompt --output train.dedup.jsonl
+  python ft.py leakage --train train.jsonl --check validation.jsonl test.jsonl
+  python ft.py score --input train.jsonl --output scored.jsonl --min-score 7
+  python ft.py eval --deployment-name my-ft --test-file test.jsonl
+  python ft.py estimate train.jsonl --model gpt-4.1-mini --epochs 2
+  python ft.py submit --model gpt-4.1-mini --training-file train.jsonl
+  python ft.py monitor --job-id ftjob-abc123
+  python ft.py deploy --model-id "ft:gpt-4.1-mini:..." --name my-ft
+  python ft.py cleanup --list
+"""
+import os
+import sys
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# command -> (script path relative to SCRIPTS_DIR, one-line help)
+COMMANDS = {
+    "validate": ("validate/engine.py", "Validate a SFT/DPO/RFT JSONL file + stats (format auto-detected)"),
+    "stats": ("validate/data_stats.py", "Dataset statistics and token estimates"),
+    "dedup": ("validate/dedup.py", "Find near-duplicate records; optionally write a deduplicated copy"),
+    "leakage": ("validate/leakage.py", "Check validation/test prompts for overlap with training"),
+    "score": ("score_dataset.py", "LLM-judge quality scoring of training data"),
+    "eval": ("evaluate_model.py", "LLM-judge evaluation of a deployed model"),
+    "distill": ("generate_distillation_data.py", "Generate synthetic training data from a teacher"),
+    "convert": ("convert_dataset.py", "Convert between SFT/DPO/RFT formats"),
+    "calibrate": ("calibrate_grader.py", "Find the optimal RFT pass_threshold"),
+    "estimate": ("estimate_training.py", "Predict trained tokens, cost and duration of a job"),
+    "submit": ("submit_training.py", "Submit a fine-tuning job"),
+    "monitor": ("monitor_training.py", "Poll a job until completion"),
+    "check": ("check_training.py", "Analyze training curves, list checkpoints"),
+    "deploy": ("deploy_model.py", "Deploy a fine-tuned model via ARM"),
+    "cleanup": ("cleanup.py", "Delete old files and deployments"),
+}
+
+
+def print_usage(out=sys.stdout):
+    out.write("usage: ft <command> [args...]\n\nCommands:\n")
+    for name, (_, help_text) in COMMANDS.items():
+        out.write(f"  {name:<10} {help_text}\n")
+    out.write("\nRun 'ft <command> --help' for command options.\n")
+
+
+def run_script(relpath, argv):
+    """Run a script as __main__ with `argv`, as if invoked from the shell."""
+    import runpy
+
+    path = os.path.join(SCRIPTS_DIR, relpath)
+    sys.argv = [path] + list(argv)
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help", "help"):
+        print_usage()
+        return
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        sys.stderr.write(f"ft: unknown command '{command}'\n\n")
+        print_usage(sys.stderr)
+        sys.exit(2)
+    run_script(COMMANDS[command][0], rest)
+
+
+if __name__ == "__main__":
+    main()
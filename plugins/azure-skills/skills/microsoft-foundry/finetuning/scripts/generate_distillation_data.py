@@ -28,6 +28,10 @@ Usage:
       --teacher gpt-4.1-mini \
       --prompts-file my_prompts.txt \
       --output-dir ./my_dataset
+
+  # Teacher phase as one Batch API job (teacher must be a Global Batch deployment)
+  python generate_distillation_data.py --teacher gpt-4.1-batch --judge gpt-4.1-mini \
+      --topics "earnings,risk" --backend batch --output-dir ./my_dataset
 """
 
 import json
@@ -41,17 +45,23 @@ try:
     sys.stderr.reconfigure(encoding="utf-8")
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
-import time
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients, _clamp_score
-
-import openai
+from batch_backend import add_batch_arguments
+from common import (
+    HelpOnErrorParser, add_metrics_argument, chat_completion,
+    get_clients, write_metrics_on_exit, _clamp_score,
+)
+from jsonl_io import write_jsonl
 
 
 def verify_deployment(client, model):
     """Verify a model deployment exists by sending a trivial request."""
+    import openai
+
     try:
-        client.chat.completions.create(
+        chat_completion(
+            client,
+            max_retries=2,
             model=model,
             messages=[{"role": "user", "content": "Hi"}],
             max_completion_tokens=1,
@@ -74,26 +84,39 @@ def generate_combinatorial_prompts(topics, formats, contexts, n):
     return prompts
 
 
+def build_teacher_request(model, system_prompt, prompt):
+    """Build the teacher request (chat.completions kwargs) for one prompt."""
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.7,
+        "max_completion_tokens": 1024,
+    }
+
+
 def teacher_generate(client, model, system_prompt, prompt, retries=3):
     """Generate a single response from the teacher."""
-    for attempt in range(retries):
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.7,
-                max_completion_tokens=1024,
-            )
-            return resp.choices[0].message.content
-        except Exception as e:
-            if attempt >= retries - 1:
-                print(f"  Failed after {retries} attempts: {e}")
-                return None
-            time.sleep(2 * (attempt + 1))
-    return None
+    try:
+        # chat_completion paces requests and retries throttling/transient errors
+        resp = chat_completion(client, max_retries=retries,
+                               **build_teacher_request(model, system_prompt, prompt))
+        return resp.choices[0].message.content
+    except Exception as e:
+        print(f"  Failed after {retries} retries: {e}")
+        return None
+
+
+def teacher_generate_batch(client, model, system_prompt, prompts, poll_interval=30):
+    """Generate all teacher responses in one Batch API job. Returns a list
+    aligned with `prompts` (None where the request failed)."""
+    from batch_backend import message_content, run_batch
+
+    requests = [(str(i), build_teacher_request(model, system_prompt, p)) for i, p in enumerate(prompts)]
+    results = run_batch(client, requests, poll_interval=poll_interval)
+    return [message_content(results.get(str(i))) for i in range(len(prompts))]
 
 
 QUALITY_PROMPT = """Rate this AI-generated text on quality dimensions (1-10 each).
@@ -109,10 +132,16 @@ QUALITY_PROMPT = """Rate this AI-generated text on quality dimensions (1-10 each
 Return ONLY JSON: {{"accuracy": <int>, "quality": <int>, "task_fit": <int>}}"""
 
 
-def grade_output(client, judge_model, output, retries=3):
+def grade_output(client, judge_model, output, retries=3, cache=None):
+    """Grade a teacher response. `cache` is an optional ResponseCache."""
+    # chat_completion paces and retries API errors; this loop re-asks when the
+    # judge reply isn't parseable JSON.
     for attempt in range(retries):
         try:
-            resp = client.chat.completions.create(
+            resp = chat_completion(
+                client,
+                cache=cache,
+                cache_refresh=attempt > 0,  # a cached reply that failed to parse is replaced
                 model=judge_model,
                 messages=[{"role": "user", "content": QUALITY_PROMPT.format(output=output)}],
                 temperature=0.0,
@@ -124,8 +153,7 @@ def grade_output(client, judge_model, output, retries=3):
                 scores = json.loads(match.group())
                 return {k: _clamp_score(v) for k, v in scores.items()}
         except Exception:
-            if attempt < retries - 1:
-                time.sleep(2)
+            pass
     return None
 
 
@@ -141,6 +169,7 @@ def main():
     parser.add_argument("--teacher", required=True, help="Teacher model deployment name")
     parser.add_argument("--judge", default=None, help="Judge model (default: same as teacher)")
     parser.add_argument("--system-prompt", default="You are a helpful assistant.", help="System prompt for teacher")
+    add_batch_arguments(parser)
 
     # Prompt generation (either combinatorial or from file)
     parser.add_argument("--prompts-file", help="File with one prompt per line (skips combinatorial generation)")
@@ -153,13 +182,19 @@ def main():
     # Quality
     parser.add_argument("--min-score", type=float, default=7.0, help="Minimum average quality score to keep")
     parser.add_argument("--skip-grading", action="store_true", help="Skip quality grading (keep all)")
+    parser.add_argument("--cache", default=None, metavar="PATH",
+                        help="SQLite file caching judge responses (temperature=0), so re-runs skip paid calls")
+    parser.add_argument("--cache-max-mb", type=float, default=512,
+                        help="Evict least-recently-used cached responses beyond this size (default: 512)")
 
     # Output
     parser.add_argument("--output-dir", default="./distillation_data", help="Output directory")
     parser.add_argument("--train-split", type=float, default=0.8)
     parser.add_argument("--val-split", type=float, default=0.1)
 
+    add_metrics_argument(parser)
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
 
     client, method = get_clients(
         base_url=args.base_url, azure_endpoint=args.endpoint,
@@ -196,19 +231,28 @@ def main():
     # Step 2: Teacher generates responses
     print(f"\nTeacher ({args.teacher}) generating responses...")
     examples = []
-    for i, prompt in enumerate(prompts):
-        response = teacher_generate(client, args.teacher, args.system_prompt, prompt)
-        if response:
-            examples.append({"prompt": prompt, "response": response})
-        if (i + 1) % 25 == 0:
-            print(f"  {i+1}/{len(prompts)} ({len(examples)} successful)")
+    if args.backend == "batch":
+        responses = teacher_generate_batch(client, args.teacher, args.system_prompt, prompts,
+                                           args.batch_poll_interval)
+        examples = [{"prompt": p, "response": r} for p, r in zip(prompts, responses) if r]
+    else:
+        for i, prompt in enumerate(prompts):
+            response = teacher_generate(client, args.teacher, args.system_prompt, prompt)
+            if response:
+                examples.append({"prompt": prompt, "response": response})
+            if (i + 1) % 25 == 0:
+                print(f"  {i+1}/{len(prompts)} ({len(examples)} successful)")
     print(f"  Teacher produced {len(examples)}/{len(prompts)} responses")
 
     # Step 3: Quality grade and filter
     if not args.skip_grading:
         print(f"\nGrading with {judge}...")
+        cache = None
+        if args.cache:
+            from response_cache import ResponseCache
+            cache = ResponseCache(args.cache, max_mb=args.cache_max_mb)
         for i, ex in enumerate(examples):
-            scores = grade_output(client, judge, ex["response"])
+            scores = grade_output(client, judge, ex["response"], cache=cache)
             if scores:
                 ex["scores"] = scores
                 ex["avg_score"] = sum(scores.values()) / len(scores)
@@ -222,6 +266,8 @@ def main():
         print(f"  Passed filter (>= {args.min_score}): {len(filtered)}/{len(examples)}")
         if avgs:
             print(f"  Scores: min={min(avgs):.1f}, max={max(avgs):.1f}, mean={sum(avgs)/len(avgs):.1f}")
+        if cache:
+            print(f"  {cache.summary()}")
     else:
         filtered = examples
         print(f"Skipping grading — keeping all {len(filtered)} examples")
@@ -242,11 +288,17 @@ def main():
     os.makedirs(args.output_dir, exist_ok=True)
     for name, data in splits.items():
         path = os.path.join(args.output_dir, f"{name}.jsonl")
-        with open(path, "w", encoding="utf-8") as f:
-            for ex in data:
-                f.write(json.dumps(ex, ensure_ascii=False) + "\n")
+        write_jsonl(path, data)
         print(f"  {name}: {len(data)} examples → {path}")
 
+    # The teacher can repeat prompts; a repeat that lands in two splits leaks
+    from validate.leakage import check_leakage
+    held_out = [os.path.join(args.output_dir, f"{name}.jsonl") for name in ("validation", "test")]
+    for report in check_leakage([os.path.join(args.output_dir, "train.jsonl")], held_out):
+        if report.leaked:
+            print(f"  ⚠️ {report.leaked} {os.path.basename(report.path)} prompt(s) also appear in train — "
+                  f"run validate/leakage.py --split-dir {args.output_dir} for details")
+
     print(f"\n✅ Done! Dataset ready in {args.output_dir}/")
 
 
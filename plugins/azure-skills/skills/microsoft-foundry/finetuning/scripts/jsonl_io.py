@@ -0,0 +1,280 @@
+"""
+jsonl_io.py — Fast streaming JSONL reader/writer shared by all scripts.
+
+Reads files in large binary blocks and parses each line with orjson or
+msgspec when installed (several times faster than json on multi-GB
+datasets), falling back to the stdlib json module. Malformed lines are
+reported as ParseError values instead of raising, so validators can keep
+going and report every bad line. Writes are buffered and flushed in
+batches.
+
+Usage:
+    from jsonl_io import ParseError, read_jsonl, JsonlWriter
+
+    for line_no, record in read_jsonl("train.jsonl"):
+        if isinstance(record, ParseError):
+            print(f"Line {line_no}: {record}")
+            continue
+        ...
+
+    with JsonlWriter("out.jsonl") as out:
+        out.write({"messages": [...]})
+"""
+import hashlib
+import json
+import os
+import zlib
+
+try:
+    import orjson
+
+    BACKEND = "orjson"
+    _DECODE_ERRORS = (orjson.JSONDecodeError,)
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def _encode(obj):
+        try:
+            return orjson.dumps(obj)
+        except TypeError:  # e.g. ints beyond 64 bits, non-str keys
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = "msgspec"
+        _DECODE_ERRORS = (msgspec.DecodeError,)
+        _decoder = msgspec.json.Decoder()
+        _encoder = msgspec.json.Encoder()
+
+        def loads(data):
+            return _decoder.decode(data)
+
+        def _encode(obj):
+            try:
+                return _encoder.encode(obj)
+            except (TypeError, OverflowError, msgspec.EncodeError):
+                return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    except ImportError:
+        BACKEND = "json"
+        _DECODE_ERRORS = ()
+
+        def loads(data):
+            return json.loads(data)
+
+        def _encode(obj):
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Every backend's parse failure, plus invalid UTF-8 and stdlib json errors
+PARSE_ERRORS = _DECODE_ERRORS + (ValueError, UnicodeDecodeError)
+
+READ_BLOCK_SIZE = 8 * 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+_BOM = b"\xef\xbb\xbf"
+
+
+def dumps(obj):
+    """Serialize to a compact JSON str (non-ASCII kept as UTF-8, like ensure_ascii=False)."""
+    return _encode(obj).decode("utf-8")
+
+
+class ParseError:
+    """A JSONL line that could not be parsed. str() gives the parser message."""
+
+    __slots__ = ("line_no", "message", "line")
+
+    def __init__(self, line_no, message, line):
+        self.line_no = line_no
+        self.message = message
+        self.line = line  # raw bytes of the offending line
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"ParseError(line_no={self.line_no}, message={self.message!r})"
+
+
+def iter_lines(path, block_size=READ_BLOCK_SIZE, start=0, end=None, line_no=0):
+    """Yield (line_no, raw_line_bytes) reading the file in large blocks.
+
+    Line numbers are 1-based and count every line. A UTF-8 BOM at the start
+    of the file is dropped; trailing \\r (CRLF files) is stripped.
+
+    start/end restrict reading to the byte range [start, end) — use
+    shard_ranges() so both fall on line boundaries. line_no is the number of
+    lines before `start`, so yielded numbers stay file-global.
+    """
+    tail = b""
+    remaining = None if end is None else end - start
+    with open(path, "rb") as f:
+        f.seek(start)
+        first = start == 0
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            if first:
+                if block.startswith(_BOM):
+                    block = block[len(_BOM):]
+                first = False
+            lines = (tail + block).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                line_no += 1
+                yield line_no, line[:-1] if line.endswith(b"\r") else line
+    if tail:
+        yield line_no + 1, tail[:-1] if tail.endswith(b"\r") else tail
+
+
+def shard_ranges(path, n):
+    """Split `path` into at most n (start, end) byte ranges that each begin
+    at the start of a line. Ranges are contiguous and cover the whole file."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n):
+            f.seek(max(size * i // n, bounds[-1]))
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                f.readline()  # finish the line the cut point landed in
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def count_lines(path, start=0, end=None, block_size=READ_BLOCK_SIZE):
+    """Number of newline characters in the byte range [start, end)."""
+    count = 0
+    remaining = None if end is None else end - start
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            count += block.count(b"\n")
+    return count
+
+
+CHUNK_MIN_BYTES = 8 * 1024 * 1024
+CHUNK_MAX_BYTES = 64 * 1024 * 1024
+_CHUNK_CUT_MASK = 0x3F  # past CHUNK_MIN_BYTES, ~1 in 64 lines ends a chunk
+
+
+def content_chunks(path, min_bytes=CHUNK_MIN_BYTES, max_bytes=CHUNK_MAX_BYTES):
+    """Split `path` into content-defined chunks of whole lines.
+
+    Yields (start, end, lines, digest) per chunk: the byte range, its line
+    count and a blake2b digest of its bytes. Once a chunk holds min_bytes,
+    it ends after the first line whose crc32 has its low 6 bits clear (or
+    at max_bytes), so the cut points depend on content, not on offsets:
+    appending rows or editing one region leaves the other chunks — and
+    their digests — unchanged.
+    """
+    start = size = lines = 0
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for line in f:
+            digest.update(line)
+            size += len(line)
+            lines += 1
+            if size >= max_bytes or (size >= min_bytes and not zlib.crc32(line) & _CHUNK_CUT_MASK):
+                yield start, start + size, lines, digest.digest()
+                start += size
+                size = lines = 0
+                digest = hashlib.blake2b(digest_size=16)
+    if size:
+        yield start, start + size, lines, digest.digest()
+
+
+def parse_line(line_no, line):
+    """Parse one raw line. Returns the record or a ParseError."""
+    try:
+        return loads(line)
+    except PARSE_ERRORS as e:
+        return ParseError(line_no, str(e), line)
+
+
+def read_jsonl(path, skip_blank=True, block_size=READ_BLOCK_SIZE):
+    """Yield (line_no, record) for each line; record is a ParseError on bad JSON.
+
+    Blank lines are skipped unless skip_blank=False (then they yield a ParseError).
+    """
+    for line_no, line in iter_lines(path, block_size):
+        if skip_blank and not line.strip():
+            continue
+        yield line_no, parse_line(line_no, line)
+
+
+def load_jsonl(path, on_error=None):
+    """Read all valid records into a list. `on_error(ParseError)` is called for
+    each bad line (default: ignored)."""
+    records = []
+    for _, record in read_jsonl(path):
+        if isinstance(record, ParseError):
+            if on_error:
+                on_error(record)
+            continue
+        records.append(record)
+    return records
+
+
+class JsonlWriter:
+    """Buffered JSONL writer: records are serialized immediately and written
+    to disk in batches of ~`buffer_size` bytes. Use as a context manager."""
+
+    def __init__(self, path, mode="w", buffer_size=WRITE_BUFFER_SIZE):
+        self.path = path
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+        self._f = open(path, mode.replace("b", "") + "b")
+
+    def write(self, record):
+        data = _encode(record)
+        self._buffer.append(data)
+        self._buffer.append(b"\n")
+        self._buffered += len(data) + 1
+        self.count += 1
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if self._buffer:
+            self._f.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self.flush()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_jsonl(path, records, mode="w"):
+    """Write an iterable of records. Returns the number written."""
+    with JsonlWriter(path, mode) as out:
+        out.write_many(records)
+        return out.count
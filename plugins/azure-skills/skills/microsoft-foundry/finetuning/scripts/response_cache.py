@@ -0,0 +1,97 @@
+"""
+response_cache.py — Persistent on-disk cache for deterministic chat completions.
+
+Judge calls (score_dataset.py, evaluate_model.py, generate_distillation_data.py)
+run at temperature=0, so re-running a script after a crash or a threshold
+tweak would otherwise pay for every call again. This cache stores responses
+in SQLite keyed by endpoint, model, messages and sampling parameters, evicts
+least-recently-used entries beyond a size budget, and reports hit/miss stats.
+
+Usage:
+    from response_cache import ResponseCache
+
+    cache = ResponseCache("judge_cache.sqlite", max_mb=512)
+    resp = chat_completion(client, cache=cache, model="gpt-4o", messages=[...], temperature=0.0)
+    print(cache.summary())
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of chat completion responses. Thread-safe."""
+
+    def __init__(self, path, max_mb=512):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(client, kwargs):
+        """Key on everything that determines the response: endpoint + request body."""
+        payload = json.dumps([str(getattr(client, "base_url", "")), kwargs],
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response JSON for `key`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, value):
+        """Store response JSON under `key`, evicting LRU entries over budget."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Trim to 90% of the budget so we don't evict on every insert
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            doomed.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (f"Response cache: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), "
+                f"{self.evictions} evicted, {self._size / 1_000_000:.1f} MB in {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -10,6 +10,14 @@ score_dataset.py — Assess training data quality using an LLM judge.
 Scores each example on correctness and relevance, optionally filters
 out low-quality examples.
 
+Rows stream through a bounded window of in-flight judge requests
+(--concurrency x 4) and are appended to the output as they finish, so the
+output follows completion order, not input order. Every 25 rows the output
+is flushed and <output>.ckpt records the input line numbers it now holds;
+after a crash or Ctrl-C, --resume skips those rows and appends the rest.
+Memory stays flat however large the input is (the batch backend still
+holds the rows of its single job).
+
 Usage:
   # Score all examples
   python score_dataset.py --input training.jsonl --output scored.jsonl
@@ -17,9 +25,16 @@ Usage:
   # Score and filter (keep only score >= 7)
   python score_dataset.py --input training.jsonl --output filtered.jsonl --min-score 7
 
+  # Continue an interrupted run (same arguments plus --resume)
+  python score_dataset.py --input training.jsonl --output filtered.jsonl --min-score 7 --resume
+
   # Custom scoring dimensions
   python score_dataset.py --input training.jsonl --output scored.jsonl \
       --dimensions "correctness,clarity,completeness"
+
+  # Large offline runs: one Batch API job instead of per-row calls
+  python score_dataset.py --input training.jsonl --output scored.jsonl \
+      --model gpt-4o-batch --backend batch
 """
 
 import json
@@ -32,10 +47,20 @@ try:
     sys.stderr.reconfigure(encoding="utf-8")
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients, _clamp_score
+from batch_backend import add_batch_arguments
+from common import (
+    HelpOnErrorParser, add_metrics_argument, chat_completion,
+    get_clients, row_api_errors, write_metrics_on_exit, _clamp_score,
+)
+from jsonl_io import JsonlWriter, ParseError, count_lines, read_jsonl
+
+PARSE_ATTEMPTS = 3           # judge replies per example before scoring it 0
+CHECKPOINT_SUFFIX = ".ckpt"  # sidecar of completed line numbers, next to the output
+CHECKPOINT_EVERY = 25        # rows per checkpoint commit
+IN_FLIGHT_PER_WORKER = 4     # judge requests queued per --concurrency worker
 
 
 QUALITY_PROMPT = """You are a data quality assessor for machine learning training data.
@@ -65,8 +90,8 @@ DEFAULT_DIMENSIONS = {
 }
 
 
-def score_example(client, model, user_content, assistant_content, dimensions):
-    """Score a single training example."""
+def build_score_request(model, user_content, assistant_content, dimensions):
+    """Build the judge request (chat.completions kwargs) for one example."""
     dims_text = "\n".join(f"**{k}** (1-10): {v}" for k, v in dimensions.items())
     example = {k: 8 for k in dimensions}
 
@@ -76,28 +101,246 @@ def score_example(client, model, user_content, assistant_content, dimensions):
         dimensions_text=dims_text,
         example_json=json.dumps(example),
     )
-
-    for attempt in range(3):
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.0,
-                max_completion_tokens=200,
-            )
-            text = (resp.choices[0].message.content or "").strip()
-            match = re.search(r'\{[^}]+\}', text)
-            if match:
-                scores = json.loads(match.group())
-                return {k: _clamp_score(scores.get(k)) for k in dimensions}
-        except Exception:
-            if attempt < 2:
-                time.sleep(2)
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.0,
+        "max_completion_tokens": 200,
+    }
+
+
+def parse_scores(text, dimensions):
+    """Parse the judge's JSON reply into clamped scores, or None if unparseable."""
+    match = re.search(r'\{[^}]+\}', (text or "").strip())
+    if not match:
+        return None
+    try:
+        scores = json.loads(match.group())
+    except json.JSONDecodeError:
+        return None
+    return {k: _clamp_score(scores.get(k)) for k in dimensions}
+
+
+def score_example(client, model, user_content, assistant_content, dimensions, cache=None):
+    """Score a single training example. `cache` is an optional ResponseCache."""
+    request = build_score_request(model, user_content, assistant_content, dimensions)
+
+    # chat_completion paces and retries API errors and raises once they are
+    # exhausted; this loop only re-asks when the judge reply isn't parseable.
+    for attempt in range(PARSE_ATTEMPTS):
+        resp = chat_completion(
+            client,
+            cache=cache,
+            cache_refresh=attempt > 0,  # a cached reply that failed to parse is replaced
+            **request,
+        )
+        scores = parse_scores(resp.choices[0].message.content, dimensions)
+        if scores:
+            return scores
 
     return {k: 0 for k in dimensions}
 
 
-def main():
+def score_batch(client, model, examples, dimensions, poll_interval=30, cache=None):
+    """Score all examples in one Batch API job. Returns scores per example index.
+
+    Unlike score_example there is no re-ask: unparseable or failed rows
+    score 0 and are reported as failures in the summary.
+    """
+    from batch_backend import message_content, run_batch
+
+    requests = [(str(i), build_score_request(model, ex["user"], ex["assistant"], dimensions))
+                for i, ex in enumerate(examples)]
+    results = run_batch(client, requests, poll_interval=poll_interval, cache=cache)
+    zero = {k: 0 for k in dimensions}
+    return [parse_scores(message_content(results.get(str(i))), dimensions) or dict(zero)
+            for i in range(len(examples))]
+
+
+class QualityDistribution:
+    """Mean / min / max / median of the average scores, accumulated one row
+    at a time. Averages of integer 1-10 scores take few distinct values, so
+    counting each value keeps the median exact in bounded memory."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.n = 0
+
+    def add(self, avg):
+        self.counts[avg] += 1
+        self.n += 1
+
+    def median(self):
+        values = sorted(self.counts)
+
+        def nth(rank):
+            for value in values:
+                rank -= self.counts[value]
+                if rank < 0:
+                    return value
+        return (nth((self.n - 1) // 2) + nth(self.n // 2)) / 2
+
+    def print_summary(self):
+        if not self.n:
+            return
+        print(f"\nQuality Distribution:")
+        print(f"  Mean:   {sum(v * c for v, c in self.counts.items()) / self.n:.1f}")
+        print(f"  Min:    {min(self.counts):.1f}")
+        print(f"  Max:    {max(self.counts):.1f}")
+        print(f"  Median: {self.median():.1f}")
+
+
+def checkpoint_path(output):
+    return output + CHECKPOINT_SUFFIX
+
+
+def load_checkpoint(path, settings):
+    """{line_no: [avg, kept]} and the committed output size from a checkpoint.
+
+    Raises ValueError when the checkpoint was written with other settings.
+    A torn last entry (crash mid-write) is ignored.
+    """
+    done, output_bytes = {}, 0
+    for _, entry in read_jsonl(path):
+        if isinstance(entry, ParseError):
+            break
+        if "settings" in entry:
+            if entry["settings"] != settings:
+                changed = sorted(k for k in settings if entry["settings"].get(k) != settings[k])
+                raise ValueError(f"{path} was written with different {', '.join(changed)}; "
+                                 "rerun without --resume to start over")
+            continue
+        for line_no, avg, kept in entry["done"]:
+            done[line_no] = [avg, kept]
+        output_bytes = entry["output_bytes"]
+    return done, output_bytes
+
+
+class ScoredOutput:
+    """Appends scored rows to the output as they finish and commits the
+    checkpoint after every CHECKPOINT_EVERY rows: output flushed first, then
+    one checkpoint entry listing the rows it now holds and its size."""
+
+    def __init__(self, path, settings, min_score=None, strip_metadata=False, resume=None):
+        self.path = path
+        self.min_score = min_score
+        self.strip_metadata = strip_metadata
+        self.stats = QualityDistribution()
+        self.kept = self.filtered = self.failed = 0
+        self.first_error = None
+        self._pending = []
+        done, output_bytes = resume or ({}, 0)
+        for avg, kept in done.values():
+            self._count(avg, kept)
+        ckpt = checkpoint_path(path)
+        if resume:
+            with open(path, "r+b") as f:
+                f.truncate(output_bytes)  # rows written after the last commit are scored again
+        # The checkpoint is rewritten compactly, dropping a torn last entry
+        with JsonlWriter(ckpt + ".tmp") as out:
+            out.write({"settings": settings})
+            if done:
+                out.write({"done": [[k, *v] for k, v in done.items()], "output_bytes": output_bytes})
+        os.replace(ckpt + ".tmp", ckpt)
+        self._out = JsonlWriter(path, "a" if resume else "w")
+        self._ckpt = JsonlWriter(ckpt, "a")
+
+    def _count(self, avg, kept):
+        if avg is not None:
+            self.stats.add(avg)
+        if kept:
+            self.kept += 1
+        else:
+            self.filtered += 1
+
+    def add(self, line_no, data, scores):
+        avg = sum(scores.values()) / len(scores) if scores and any(v > 0 for v in scores.values()) else None
+        if not self.strip_metadata:
+            data["_quality_scores"] = scores
+            data["_avg_quality"] = avg or 0
+        kept = not (self.min_score and (avg or 0) < self.min_score)
+        if kept:
+            self._out.write(data)
+        self._count(avg, kept)
+        self._pending.append([line_no, avg, kept])
+        if len(self._pending) >= CHECKPOINT_EVERY:
+            self.commit()
+
+    def fail(self, line_no, error):
+        """A row the judge API rejected. It is left out of the output and the
+        checkpoint, so a --resume run scores it again."""
+        self.failed += 1
+        if self.first_error is None:
+            self.first_error = f"line {line_no}: {type(error).__name__}: {error}"
+
+    def commit(self):
+        if not self._pending:
+            return
+        self._out.flush()
+        self._ckpt.write({"done": self._pending, "output_bytes": os.path.getsize(self.path)})
+        self._ckpt.flush()
+        self._pending = []
+
+    def close(self):
+        self.commit()
+        self._out.close()
+        self._ckpt.close()
+
+
+def iter_examples(path, skip=()):
+    """Yield (line_no, record, user, assistant) for the rows not in `skip`."""
+    for line_no, ex in read_jsonl(path):
+        if line_no in skip:
+            continue
+        if isinstance(ex, ParseError):
+            print(f"⚠️ Skipping malformed JSON on line {line_no}: {ex}")
+            continue
+        msgs = ex.get("messages", [])
+        user = next((m["content"] for m in msgs if m["role"] == "user"), "")
+        asst = next((m["content"] for m in msgs if m["role"] == "assistant"), "")
+        yield line_no, ex, user, asst
+
+
+def score_streaming(client, model, examples, dimensions, output, concurrency=4, cache=None, total=None):
+    """Score `examples` with at most concurrency * IN_FLIGHT_PER_WORKER rows in
+    flight, handing each to `output` as it finishes. Rows whose judge call
+    fails (see common.row_api_errors) go to output.fail(); other errors stop
+    the run."""
+    window = max(1, concurrency) * IN_FLIGHT_PER_WORKER
+    row_errors = row_api_errors()
+    in_flight = {}
+    done = 0
+
+    def finish(futures):
+        nonlocal done
+        for future in futures:
+            line_no, data = in_flight.pop(future)
+            try:
+                scores = future.result()
+            except row_errors as e:
+                output.fail(line_no, e)
+            else:
+                output.add(line_no, data, scores)
+            done += 1
+            if done % 25 == 0:
+                print(f"  Scored {done}/{total}" if total else f"  Scored {done}")
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for line_no, data, user, asst in examples:
+            if len(in_flight) >= window:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                finish(finished)
+            future = pool.submit(score_example, client, model, user, asst, dimensions, cache)
+            in_flight[future] = (line_no, data)
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            finish(finished)
+    finally:
+        pool.shutdown(wait=not in_flight, cancel_futures=True)
+
+
+def main(argv=None):
     parser = HelpOnErrorParser(description="Score training data quality with LLM judge")
     parser.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL"),
                         help="Project /v1/ URL (preferred)")
@@ -114,14 +357,19 @@ def main():
     parser.add_argument("--dimensions", default=None,
                         help="Comma-separated dimension names (default: correctness,relevance,quality)")
     parser.add_argument("--concurrency", type=int, default=4, help="Parallel scoring workers")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Continue an interrupted run: skip the rows listed in <output>{CHECKPOINT_SUFFIX} "
+                             "and append to the output")
+    add_batch_arguments(parser)
     parser.add_argument("--strip-metadata", action="store_true",
                         help="Remove _quality_scores and _avg_quality from output (safe for training input)")
-    args = parser.parse_args()
-
-    client, method = get_clients(
-        base_url=args.base_url, azure_endpoint=args.endpoint,
-        project_endpoint=args.project_endpoint, api_key=args.api_key
-    )
+    parser.add_argument("--cache", default=None, metavar="PATH",
+                        help="SQLite file caching judge responses (temperature=0), so re-runs skip paid calls")
+    parser.add_argument("--cache-max-mb", type=float, default=512,
+                        help="Evict least-recently-used cached responses beyond this size (default: 512)")
+    add_metrics_argument(parser)
+    args = parser.parse_args(argv)
+    write_metrics_on_exit(args.metrics_out)
 
     # Parse dimensions
     if args.dimensions:
@@ -130,84 +378,69 @@ def main():
     else:
         dimensions = DEFAULT_DIMENSIONS
 
-    # Load data
-    examples = []
-    with open(args.input, encoding="utf-8") as f:
-        for i, line in enumerate(f):
-            if not line.strip():
-                continue
-            try:
-                ex = json.loads(line)
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Skipping malformed JSON on line {i+1}: {e}")
-                continue
-            msgs = ex.get("messages", [])
-            user = next((m["content"] for m in msgs if m["role"] == "user"), "")
-            asst = next((m["content"] for m in msgs if m["role"] == "assistant"), "")
-            examples.append({"data": ex, "user": user, "assistant": asst})
-
-    print(f"Loaded {len(examples)} examples. Scoring with {args.model}...")
-
-    # Score in parallel
-    def score_one(idx):
-        ex = examples[idx]
-        scores = score_example(client, args.model, ex["user"], ex["assistant"], dimensions)
-        return idx, scores
-
-    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
-        futures = {pool.submit(score_one, i): i for i in range(len(examples))}
-        done = 0
-        for future in as_completed(futures):
-            idx, scores = future.result()
-            examples[idx]["scores"] = scores
-            done += 1
-            if done % 25 == 0:
-                print(f"  Scored {done}/{len(examples)}")
-
-    # Calculate stats
-    all_avgs = []
-    for ex in examples:
-        scores = ex.get("scores", {})
-        if scores and any(v > 0 for v in scores.values()):
-            avg = sum(scores.values()) / len(scores)
-            ex["avg_score"] = avg
-            all_avgs.append(avg)
-
-    if all_avgs:
-        print(f"\nQuality Distribution:")
-        print(f"  Mean:   {sum(all_avgs)/len(all_avgs):.1f}")
-        print(f"  Min:    {min(all_avgs):.1f}")
-        print(f"  Max:    {max(all_avgs):.1f}")
-        sorted_avgs = sorted(all_avgs)
-        n_avgs = len(sorted_avgs)
-        if n_avgs % 2 == 1:
-            median = sorted_avgs[n_avgs // 2]
+    settings = {"input": os.path.abspath(args.input), "model": args.model, "dimensions": list(dimensions),
+                "min_score": args.min_score, "strip_metadata": args.strip_metadata}
+    resume = None
+    ckpt = checkpoint_path(args.output)
+    if args.resume and os.path.exists(ckpt) and os.path.exists(args.output):
+        try:
+            resume = load_checkpoint(ckpt, settings)
+        except ValueError as e:
+            parser.error(str(e))
+        if os.path.getsize(args.output) < resume[1]:
+            parser.error(f"{args.output} is shorter than {ckpt} records; rerun without --resume to start over")
+    elif args.resume:
+        print(f"ℹ️ No checkpoint at {ckpt} — starting from the first row")
+    elif os.path.exists(ckpt):
+        print(f"ℹ️ Overwriting the previous run's output (pass --resume to continue it instead)")
+
+    client, method = get_clients(
+        base_url=args.base_url, azure_endpoint=args.endpoint,
+        project_endpoint=args.project_endpoint, api_key=args.api_key
+    )
+
+    cache = None
+    if args.cache:
+        from response_cache import ResponseCache
+        cache = ResponseCache(args.cache, max_mb=args.cache_max_mb)
+
+    done = resume[0] if resume else {}
+    total = max(0, count_lines(args.input) - len(done))
+    if done:
+        print(f"Resuming: {len(done)} rows already scored, ~{total} to go. Scoring with {args.model}...")
+    else:
+        print(f"Scoring ~{total} examples with {args.model}...")
+
+    output = ScoredOutput(args.output, settings, args.min_score, args.strip_metadata, resume)
+    examples = iter_examples(args.input, skip=done)
+    try:
+        if args.backend == "batch":
+            # One Batch API job holds every row it scores; the in-flight window is the job
+            pending = [{"line": line_no, "data": ex, "user": user, "assistant": asst}
+                       for line_no, ex, user, asst in examples]
+            for ex, scores in zip(pending, score_batch(client, args.model, pending, dimensions,
+                                                       args.batch_poll_interval, cache)):
+                output.add(ex["line"], ex["data"], scores)
         else:
-            median = (sorted_avgs[n_avgs // 2 - 1] + sorted_avgs[n_avgs // 2]) / 2
-        print(f"  Median: {median:.1f}")
-
-    # Filter and write
-    kept = 0
-    filtered = 0
-    with open(args.output, "w", encoding="utf-8") as f:
-        for ex in examples:
-            if not args.strip_metadata:
-                ex["data"]["_quality_scores"] = ex.get("scores", {})
-                ex["data"]["_avg_quality"] = ex.get("avg_score", 0)
-
-            if args.min_score and ex.get("avg_score", 0) < args.min_score:
-                filtered += 1
-                continue
-
-            f.write(json.dumps(ex["data"], ensure_ascii=False) + "\n")
-            kept += 1
-
-    print(f"\nKept: {kept}, Filtered: {filtered}")
+            score_streaming(client, args.model, examples, dimensions, output, args.concurrency, cache, total)
+    except KeyboardInterrupt:
+        print(f"\n⏸ Interrupted after {output.kept + output.filtered} rows — rerun with --resume to continue")
+        sys.exit(130)
+    finally:
+        output.close()
+
+    output.stats.print_summary()
+    print(f"\nKept: {output.kept}, Filtered: {output.filtered}")
+    if output.failed:
+        print(f"⚠️ {output.failed} rows not scored because the judge call failed "
+              f"(first: {output.first_error}) — rerun with --resume to retry them")
     if args.min_score:
         print(f"(min_score threshold: {args.min_score})")
     if args.strip_metadata:
         print("(metadata stripped — output is safe for training input)")
-    print(f"Output: {args.output}")
+    print(f"Output: {args.output} (checkpoint: {ckpt})")
+    if cache:
+        print(cache.summary())
 
 
 if __name__ == "__main__":
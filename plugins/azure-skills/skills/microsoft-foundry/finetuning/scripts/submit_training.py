@@ -37,9 +37,7 @@ try:
 except (AttributeError, OSError):
     pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from common import HelpOnErrorParser, get_clients, upload_file
-
-import requests
+from common import HelpOnErrorParser, add_metrics_argument, get_clients, upload_file, write_metrics_on_exit
 
 
 def submit_sft_sdk(client, model, train_id, val_id, epochs=2, lr=1.0, batch_size=None, suffix=None, training_type="globalStandard"):
@@ -67,6 +65,8 @@ def submit_sft_sdk(client, model, train_id, val_id, epochs=2, lr=1.0, batch_size
 
 def submit_sft_rest(endpoint, api_key, model, train_id, val_id, epochs=2, lr=1.0, batch_size=None, suffix=None, training_type="globalStandard"):
     """Submit SFT job via REST API (fallback for models like gpt-oss-20b)."""
+    import requests
+
     url = f"{endpoint}/openai/fine_tuning/jobs?api-version=2025-04-01-preview"
     body = {
         "model": model,
@@ -166,6 +166,8 @@ def main():
     parser.add_argument("--validation-file", help="Path to validation JSONL file (will upload)")
     parser.add_argument("--training-file-id", help="Already-uploaded training file ID")
     parser.add_argument("--validation-file-id", help="Already-uploaded validation file ID")
+    parser.add_argument("--force-upload", action="store_true",
+                        help="Upload even if identical content was uploaded before (skips the local hash manifest)")
 
     # Hyperparameters
     parser.add_argument("--epochs", type=int, default=2)
@@ -188,7 +190,9 @@ def main():
                              "globalStandard with lower quotas. OSS models (gpt-oss-20b, Ministral, "
                              "Llama, Qwen) only support globalStandard.")
 
+    add_metrics_argument(parser)
     args = parser.parse_args()
+    write_metrics_on_exit(args.metrics_out)
 
     client, method = get_clients(
         base_url=args.base_url, azure_endpoint=args.endpoint,
@@ -199,9 +203,9 @@ def main():
     train_id = args.training_file_id
     val_id = args.validation_file_id
     if args.training_file:
-        train_id = upload_file(client, args.training_file)
+        train_id = upload_file(client, args.training_file, dedup=not args.force_upload)
     if args.validation_file:
-        val_id = upload_file(client, args.validation_file)
+        val_id = upload_file(client, args.validation_file, dedup=not args.force_upload)
 
     if not train_id or not val_id:
         print("Error: Provide training and validation file paths or IDs")
@@ -0,0 +1,43 @@
+"""Shared fixtures for the finetuning script tests (run: python -m pytest scripts/tests)."""
+import json
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, "validate"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture(autouse=True)
+def local_cache_dir(tmp_path, monkeypatch):
+    """Keep ~/.cache/foundry-finetuning state (manifests, cache keys) inside the test's tmp dir."""
+    monkeypatch.setenv("FOUNDRY_FT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("FOUNDRY_FT_NO_CACHE", raising=False)
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def write_jsonl(tmp_path):
+    """write_jsonl(records, name="data.jsonl", mode="w") -> path; strings are written verbatim."""
+    def write(records, name="data.jsonl", mode="w", ensure_ascii=True):
+        path = tmp_path / name
+        with open(path, mode, encoding="utf-8") as f:
+            for record in records:
+                line = record if isinstance(record, str) else json.dumps(record, ensure_ascii=ensure_ascii)
+                f.write(line + "\n")
+        return str(path)
+    return write
+
+
+def sft_record(i, user=None, assistant=None, system="You are a helpful assistant."):
+    return {"messages": [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user or f"Question number {i} about topic {i % 37}?"},
+        {"role": "assistant", "content": assistant or f"Answer {i}: " + "detail " * (i % 11)},
+    ]}
+
+
+def rft_record(i, answer=None):
+    return {"messages": [{"role": "user", "content": f"Solve problem {i}"}], "answer": answer or str(i)}
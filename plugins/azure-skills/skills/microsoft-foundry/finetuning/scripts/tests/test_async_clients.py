@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+import common
+
+COMPLETION = {"id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "judge",
+              "choices": [{"index": 0, "finish_reason": "stop",
+                           "message": {"role": "assistant", "content": "ok"}}],
+              "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6}}
+
+
+@pytest.fixture
+def stub_transport(monkeypatch):
+    """Serve every pooled request locally and record pool closes."""
+    calls = {"requests": [], "closed": 0}
+
+    async def handle(self, request):
+        calls["requests"].append((id(self), request.headers.get("authorization")))
+        return httpx.Response(200, json=COMPLETION)
+
+    async def aclose(self):
+        calls["closed"] += 1
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", handle)
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "aclose", aclose)
+    monkeypatch.setattr(common, "_ASYNC_POOL", None)
+    return calls
+
+
+def test_http_clients_share_one_pool_until_closed(stub_transport):
+    async def run():
+        first, second = common._make_async_http_client(), common._make_async_http_client()
+        assert first._transport is second._transport is common._ASYNC_POOL
+        await first.get("https://example.test/a")
+        await first.aclose()  # closing one client leaves the pool to the others
+        assert stub_transport["closed"] == 0
+        await second.get("https://example.test/b")
+        await common.close_async_pool()
+
+    asyncio.run(run())
+    (pool_a, _), (pool_b, _) = stub_transport["requests"]
+    assert pool_a == pool_b
+    assert stub_transport["closed"] == 1
+    assert common._ASYNC_POOL is None
+
+
+def test_get_async_clients_share_pool(stub_transport):
+    pytest.importorskip("openai")
+    base = "https://example.test/api/projects/p/openai/v1/"
+
+    async def run():
+        a, method_a = common.get_async_clients(base_url=base, api_key="key-a")
+        b, method_b = common.get_async_clients(base_url=base, api_key="key-b")
+        assert (method_a, method_b) == ("project-v1", "project-v1")
+        assert a._client._transport is b._client._transport is common._ASYNC_POOL
+        replies = await asyncio.gather(*(client.chat.completions.create(
+            model="judge", messages=[{"role": "user", "content": "hi"}]) for client in (a, b)))
+        assert [r.choices[0].message.content for r in replies] == ["ok", "ok"]
+        await a.close()
+        assert stub_transport["closed"] == 0
+        await common.close_async_pool()
+
+    asyncio.run(run())
+    assert len({pool for pool, _ in stub_transport["requests"]}) == 1
+    assert sorted(auth for _, auth in stub_transport["requests"]) == ["Bearer key-a", "Bearer key-b"]
+    assert stub_transport["closed"] == 1 and common._ASYNC_POOL is None
@@ -0,0 +1,70 @@
+import json
+from types import SimpleNamespace
+
+import batch_backend
+from batch_backend import message_content, run_batch, write_batch_file
+from response_cache import ResponseCache
+
+
+def _body(text):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+def test_message_content():
+    assert message_content(_body("hi")) == "hi"
+    assert message_content({"choices": []}) is None
+    assert message_content(None) is None
+
+
+def test_write_batch_file(tmp_path):
+    path = str(tmp_path / "batch.jsonl")
+    assert write_batch_file([("0", {"model": "m"}), ("1", {"model": "n"})], path) == 2
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[1] == {"custom_id": "1", "method": "POST", "url": "/chat/completions", "body": {"model": "n"}}
+
+
+class FakeClient:
+    """Answers every batched request with its custom_id, except custom_id "bad"."""
+    base_url = "https://example.test/"
+
+    def __init__(self):
+        self.submitted = []
+        self.batches = SimpleNamespace(create=self._create, retrieve=self._retrieve)
+        self.files = SimpleNamespace(content=self._content)
+
+    def _create(self, input_file_id, endpoint, completion_window):
+        return SimpleNamespace(id="batch-1")
+
+    def _retrieve(self, batch_id):
+        return SimpleNamespace(id=batch_id, status="completed", request_counts=None, output_file_id="out-1")
+
+    def _content(self, file_id):
+        lines = [json.dumps({"custom_id": cid,
+                             "response": {"status_code": 500 if cid == "bad" else 200, "body": _body(cid)}})
+                 for cid in self.submitted]
+        return SimpleNamespace(content="\n".join(lines).encode())
+
+
+def test_run_batch_uses_cache_and_reports_failures(tmp_path, monkeypatch):
+    client = FakeClient()
+
+    def fake_upload(_client, path, purpose, dedup):
+        with open(path) as f:
+            client.submitted = [json.loads(line)["custom_id"] for line in f]
+        return "file-1"
+
+    monkeypatch.setattr(batch_backend, "upload_file", fake_upload)
+    cache = ResponseCache(str(tmp_path / "c.sqlite"))
+    requests = [(cid, {"model": "m", "messages": [{"role": "user", "content": cid}]})
+                for cid in ("a", "b", "bad")]
+
+    first = run_batch(client, requests, poll_interval=0, cache=cache)
+    assert {cid: message_content(body) if body else None for cid, body in first.items()} == \
+        {"a": "a", "b": "b", "bad": None}
+
+    client.submitted = []
+    second = run_batch(client, requests, poll_interval=0, cache=cache)
+    assert client.submitted == ["bad"]  # only the failed request is resubmitted
+    assert message_content(second["a"]) == "a"
+    cache.close()
@@ -0,0 +1,45 @@
+from dedup import NearDuplicateIndex, find_duplicates, optimal_bands, write_deduplicated
+from conftest import sft_record
+
+BASE = ("The quarterly report shows revenue growth across all regions with the strongest "
+        "gains in the northern division driven by new enterprise contracts and renewals")
+
+
+def test_optimal_bands_uses_all_permutations():
+    bands, rows = optimal_bands(0.8)
+    assert bands * rows <= 128 and bands > 1
+
+
+def test_exact_and_near_duplicates_cluster_to_first_line():
+    index = NearDuplicateIndex(on="response", threshold=0.7)
+    index.add(1, sft_record(1, assistant=BASE))
+    index.add(2, sft_record(2, assistant="Something completely unrelated about gardening tomatoes"))
+    index.add(3, sft_record(3, assistant=BASE.upper()))             # exact after normalization
+    index.add(4, sft_record(4, assistant=BASE + " this quarter"))    # near duplicate
+    assert index.exact_copies == 1
+    assert index.clusters() == [[1, 3, 4]]
+    assert index.duplicate_lines() == {3, 4}
+
+
+def test_merge_matches_single_index():
+    texts = [BASE, "unrelated text about the weather today in the city", BASE + " again", BASE]
+    whole = NearDuplicateIndex(on="response")
+    left, right = NearDuplicateIndex(on="response"), NearDuplicateIndex(on="response")
+    for line, text in enumerate(texts, 1):
+        record = sft_record(line, assistant=text)
+        whole.add(line, record)
+        (left if line <= 2 else right).add(line, record)
+    left.merge(right)
+    assert left.clusters() == whole.clusters()
+    assert left.exact_copies == whole.exact_copies
+
+
+def test_write_deduplicated_keeps_first_of_each_cluster(write_jsonl, tmp_path):
+    path = write_jsonl([sft_record(1, assistant=BASE), sft_record(2), sft_record(3, assistant=BASE)])
+    index = find_duplicates(path, on="response")
+    out = str(tmp_path / "dedup.jsonl")
+    assert write_deduplicated(path, out, index.duplicate_lines()) == 2
+    with open(path, "rb") as f:
+        original = f.read().splitlines()
+    with open(out, "rb") as f:
+        assert f.read().splitlines() == original[:2]
@@ -0,0 +1,175 @@
+import base64
+import functools
+import json
+import os
+import pickle
+
+import engine
+import jsonl_io
+from conftest import rft_record, sft_record
+from engine import validate_file
+
+PNG_RGB = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + (640).to_bytes(4, "big") + \
+    (480).to_bytes(4, "big") + b"\x08\x02\x00\x00\x00" + b"\x00" * 64
+
+
+def _sft_rows(n):
+    rows = [sft_record(i) for i in range(n)]
+    rows[5]["messages"][2]["content"] = ""                               # empty content
+    rows[17]["messages"][1]["role"] = "narrator"                         # invalid role
+    rows[40]["messages"][1]["content"] = "Let me think step by step"    # risk phrase
+    rows[41] = sft_record(41, system="A different system prompt.")
+    return rows
+
+
+def _comparable(result):
+    report = result.to_dict()
+    report.pop("cache", None)
+    return report
+
+
+def test_sft_report(write_jsonl):
+    path = write_jsonl(_sft_rows(60) + ["{broken"])
+    result = validate_file(path)
+    assert result.format == "SFT"
+    assert result.total == 61 and result.parse_errors == 1
+    assert not result.ok
+    messages = list(result.errors)
+    assert any(m.startswith("Line 18,") and "narrator" in m for m in messages)
+    report = result.to_dict()
+    json.dumps(report)
+    assert report["records"] == 61
+
+
+def test_workers_match_single_pass(write_jsonl, monkeypatch):
+    path = write_jsonl(_sft_rows(3000))
+    single = validate_file(path, dedup={"on": "record", "threshold": 0.8})
+    monkeypatch.setattr(engine, "MIN_SHARD_BYTES", 1)
+    sharded = validate_file(path, workers=3, dedup={"on": "record", "threshold": 0.8})
+    assert _comparable(sharded) == _comparable(single)
+
+
+def test_rft_workers_match_single_pass(write_jsonl, monkeypatch):
+    rows = [rft_record(i) for i in range(2000)]
+    rows[7].pop("answer")
+    path = write_jsonl(rows)
+    single = validate_file(path, fmt="RFT")
+    monkeypatch.setattr(engine, "MIN_SHARD_BYTES", 1)
+    sharded = validate_file(path, fmt="RFT", workers=4)
+    assert _comparable(sharded) == _comparable(single)
+
+
+def test_incremental_reuses_chunks_after_append(write_jsonl, tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "content_chunks",
+                        functools.partial(jsonl_io.content_chunks, min_bytes=16_000, max_bytes=64_000))
+    rows = _sft_rows(3000)
+    path = write_jsonl(rows)
+    cache = str(tmp_path / "data.ftcache")
+
+    first = validate_file(path, cache=cache)
+    assert first.cache["reused"] == 0 and first.cache["chunks"] > 4
+    again = validate_file(path, cache=cache)
+    assert again.cache["reused"] == again.cache["chunks"]
+    assert _comparable(again) == _comparable(first)
+
+    extra = [sft_record(i, system="Yet another system prompt.") for i in range(3000, 3200)]
+    write_jsonl(extra, mode="a")
+    appended = validate_file(path, cache=cache)
+    assert appended.cache["reused"] >= first.cache["chunks"] - 1
+    assert appended.cache["reused"] < appended.cache["chunks"]
+    assert _comparable(appended) == _comparable(validate_file(path))
+
+
+def test_incremental_cache_dropped_when_options_change(write_jsonl, tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "content_chunks",
+                        functools.partial(jsonl_io.content_chunks, min_bytes=16_000, max_bytes=64_000))
+    path = write_jsonl(_sft_rows(1000))
+    cache = str(tmp_path / "data.ftcache")
+    validate_file(path, cache=cache)
+    rerun = validate_file(path, cache=cache, dedup={"on": "prompt", "threshold": 0.8})
+    assert rerun.cache["reused"] == 0
+
+
+class _Planted:
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return os.makedirs, (self.marker,)
+
+
+def test_incremental_cache_never_unpickles_unsigned_files(write_jsonl, tmp_path, local_cache_dir):
+    path = write_jsonl(_sft_rows(200))
+    marker = str(tmp_path / "pwned")
+    payload = pickle.dumps({"key": None, "chunks": {}, "x": _Planted(marker)})
+    cache = engine.default_cache_path(path)
+    assert cache.startswith(str(local_cache_dir))
+    os.makedirs(os.path.dirname(cache))
+    for planted in (payload, engine._CACHE_MAGIC + b"\0" * 32 + payload):  # unsigned / forged signature
+        with open(cache, "wb") as f:
+            f.write(planted)
+        result = validate_file(path, cache=cache)
+        assert not os.path.exists(marker)
+        assert result.cache["reused"] == 0
+    assert validate_file(path, cache=cache).cache["reused"] == result.cache["chunks"]  # rewritten, signed
+    assert os.stat(local_cache_dir / engine.CACHE_KEY_FILE).st_mode & 0o077 == 0
+
+
+def test_incremental_without_local_cache_validates_everything(write_jsonl, tmp_path, monkeypatch):
+    monkeypatch.setenv("FOUNDRY_FT_NO_CACHE", "1")
+    path = write_jsonl(_sft_rows(100))
+    cache = str(tmp_path / "data.ftcache")
+    validate_file(path, cache=cache)
+    assert validate_file(path, cache=cache).cache["reused"] == 0
+    assert engine.default_cache_path(path) is None
+
+
+def _vision_record(image_url, role="user"):
+    return {"messages": [
+        {"role": "system", "content": "Describe images."},
+        {"role": role, "content": [{"type": "text", "text": "What is this?"},
+                                   {"type": "image_url", "image_url": image_url}]},
+        {"role": "assistant", "content": "A picture."},
+    ]}
+
+
+def test_vision_checks(write_jsonl):
+    png = "data:image/png;base64," + base64.b64encode(PNG_RGB).decode()
+    gif = "data:image/gif;base64," + base64.b64encode(b"GIF89a\x10\x00\x10\x00" + b"\x00" * 20).decode()
+    rows = [_vision_record({"url": png, "detail": "high"}) for _ in range(12)]
+    rows.append(_vision_record({"url": gif}))
+    rows.append(_vision_record({"url": png, "detail": "medium"}))
+    rows.append(_vision_record({"url": "ftp://example.com/a.png"}))
+    rows.append(_vision_record({"url": png}, role="assistant"))
+    result = validate_file(write_jsonl(rows), fmt="SFT", collect_stats=False)
+    errors = "\n".join(result.errors)
+    assert "Line 13, message 1, image 1: format GIF is not supported" in errors
+    assert "Line 14, message 1, image 1: invalid detail 'medium'" in errors
+    assert "Line 15, message 1, image 1: unsupported URL scheme 'ftp'" in errors
+    assert "images are only allowed in 'user' messages" in errors
+    assert result.rules.image_count == 16
+    assert result.rules.image_formats["PNG"] == 14
+
+
+def test_tool_call_errors_are_reported_per_line(write_jsonl):
+    tools = [{"type": "function", "function": {"name": "lookup", "parameters": {
+        "type": "object", "properties": {"q": {"type": "string"}}, "required": ["q"]}}}]
+    rows = []
+    for i, args in enumerate(['{"q": "a"}', '{"q": 1}', '{"q": "a"}']):
+        rows.append({"tools": tools, "messages": [
+            {"role": "user", "content": "find"},
+            {"role": "assistant", "tool_calls": [
+                {"id": f"c{i}", "type": "function", "function": {"name": "lookup", "arguments": args}}]},
+            {"role": "tool", "tool_call_id": "c0", "content": "found"},
+            {"role": "assistant", "content": "done"},
+        ]})
+    result = validate_file(write_jsonl(rows), fmt="SFT")
+    assert list(result.errors) == [
+        "Line 2, message 1, tool call 0: arguments do not match the 'lookup' schema — "
+        "arguments.q: expected string, got integer",
+        "Line 2, message 2: 'tool_call_id' 'c0' does not match a tool call issued earlier",
+        "Line 2, message 3: 1 tool call(s) without a tool reply before this message (c1)",
+        "Line 3, message 2: 'tool_call_id' 'c0' does not match a tool call issued earlier",
+        "Line 3, message 3: 1 tool call(s) without a tool reply before this message (c2)",
+    ]
+    assert result.to_dict()["rules"]["tools"]["calls"] == 3
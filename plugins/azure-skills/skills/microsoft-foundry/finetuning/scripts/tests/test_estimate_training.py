@@ -0,0 +1,94 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import estimate_training
+from conftest import sft_record
+from estimate_training import base_model, fit_throughput, format_duration, job_samples, load_pricing, predict
+
+
+def _job(tokens, seconds, model="gpt-4.1-mini-2025-04-14", status="succeeded", created=1_700_000_000):
+    return SimpleNamespace(id=f"ftjob-{tokens}-{seconds}", status=status, model=model, trained_tokens=tokens,
+                           created_at=created, finished_at=created + seconds if seconds is not None else None)
+
+
+class _FakeJobs:
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def list(self, limit, after=None):
+        start = 0 if after is None else [j.id for j in self.jobs].index(after) + 1
+        return self.jobs[start:start + limit]
+
+
+def test_base_model():
+    assert base_model("gpt-4.1-mini-2025-04-14") == "gpt-4.1-mini"
+    assert base_model("ft:gpt-4o-mini-2024-07-18:org::abc") == "gpt-4o-mini"
+    assert base_model("o4-mini") == "o4-mini"
+
+
+def test_job_samples_filters_by_status_model_and_timestamps():
+    jobs = [_job(1000, 100), _job(2000, 150, model="gpt-4.1-mini"), _job(3000, 200, status="failed"),
+            _job(4000, 100, model="gpt-4o"), _job(5000, None), _job(0, 100)]
+    assert job_samples(jobs, "gpt-4.1-mini") == [(1000, 100), (2000, 150)]
+
+
+def test_fit_recovers_overhead_and_throughput():
+    samples = [(tokens, 600 + tokens / 1500) for tokens in (300_000, 900_000, 2_400_000, 6_000_000)]
+    fit = fit_throughput(samples)
+    assert fit["overhead_s"] == pytest.approx(600, abs=1)
+    assert fit["tokens_per_s"] == pytest.approx(1500, rel=1e-3)
+    assert fit["spread"] == (1.0, 1.0)
+
+
+def test_fit_falls_back_to_median_rate():
+    fit = fit_throughput([(1000, 10), (3000, 10)])  # too few jobs for an overhead term
+    assert (fit["overhead_s"], fit["tokens_per_s"], fit["spread"]) == (0.0, 200.0, None)
+    assert fit_throughput([]) is None
+
+
+def test_predict_per_token_and_per_hour_prices(tmp_path):
+    prices = load_pricing()
+    estimate = predict(1_000_000, 3, "gpt-4.1-mini-2025-04-14", prices)
+    assert (estimate["trained_tokens"], estimate["cost_usd"], estimate["duration_s"]) == (3_000_000, 15.0, None)
+
+    throughput = {"overhead_s": 0.0, "tokens_per_s": 1000.0, "jobs": 0, "spread": (0.5, 2.0)}
+    estimate = predict(1_800_000, 2, "o4-mini", prices, throughput)
+    assert estimate["duration_s"] == 3600
+    assert estimate["duration_range_s"] == [1800, 7200]
+    assert estimate["cost_usd"] == 100.0
+
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps({"my-model": {"per_mtok": 2.0}}))
+    assert predict(500_000, 2, "my-model", load_pricing(str(path)))["cost_usd"] == 2.0
+    path.write_text(json.dumps({"my-model": 2.0}))
+    with pytest.raises(ValueError):
+        load_pricing(str(path))
+
+
+def test_format_duration():
+    assert [format_duration(s) for s in (40, 840, 7500)] == ["40s", "14m", "2h 05m"]
+
+
+def test_main_fits_history_through_paged_listing(write_jsonl, monkeypatch, capsys):
+    path = write_jsonl([sft_record(i) for i in range(50)])
+    jobs = [_job(tokens, 600 + tokens / 1500, created=1_700_000_000 + i)
+            for i, tokens in enumerate([300_000, 900_000, 2_400_000, 6_000_000] * 60)]
+    client = SimpleNamespace(fine_tuning=SimpleNamespace(jobs=_FakeJobs(jobs)))
+    monkeypatch.setattr(estimate_training, "get_clients", lambda **kwargs: (client, "fake"))
+
+    estimate_training.main([path, "--model", "gpt-4.1-mini", "--epochs", "3", "--history", "150", "--json"])
+    estimate = json.loads(capsys.readouterr().out)
+    assert estimate["trained_tokens"] == 3 * estimate["dataset_tokens"]
+    assert estimate["throughput"]["jobs"] == 150  # spans two pages of the listing
+    assert estimate["duration_s"] == round(600 + estimate["trained_tokens"] / 1500)
+    assert estimate["cost_usd"] == round(estimate["trained_tokens"] / 1_000_000 * 5.0, 2)
+
+
+def test_main_without_history(write_jsonl, capsys):
+    path = write_jsonl([sft_record(i) for i in range(20)])
+    estimate_training.main([path, "--model", "gpt-4o-mini", "--no-history"])
+    out = capsys.readouterr().out
+    assert "Trained tokens:" in out and "Cost:             $" in out
+    assert "Duration:         — (unknown: --no-history" in out
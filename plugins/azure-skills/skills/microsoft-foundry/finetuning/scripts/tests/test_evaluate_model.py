@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import evaluate_model
+
+
+def _replies(monkeypatch, *replies):
+    calls = []
+
+    def fake_completion(client, cache=None, cache_refresh=False, **request):
+        calls.append(cache_refresh)
+        reply = replies[len(calls) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    monkeypatch.setattr(evaluate_model, "chat_completion", fake_completion)
+    return calls
+
+
+def test_grade_response_reasks_only_unparseable_replies(monkeypatch):
+    calls = _replies(monkeypatch, "Looks right to me.", '{"correctness": 9, "conciseness": 7}')
+    assert evaluate_model.grade_response(None, "judge", "p", "r", "o") == {"correctness": 9, "conciseness": 7}
+    assert calls == [False, True]
+
+    calls = _replies(monkeypatch, "?", "?", "?")
+    assert evaluate_model.grade_response(None, "judge", "p", "r", "o") == \
+        {"correctness": 0, "conciseness": 0, "error": "unparseable judge reply"}
+    assert len(calls) == 3
+
+
+def test_grade_response_raises_api_errors(monkeypatch):
+    openai = pytest.importorskip("openai")
+    request = httpx.Request("POST", "https://example.test/chat/completions")
+    error = openai.BadRequestError("content filtered", response=httpx.Response(400, request=request), body=None)
+    calls = _replies(monkeypatch, error, '{"correctness": 9, "conciseness": 7}')
+    with pytest.raises(openai.BadRequestError):
+        evaluate_model.grade_response(None, "judge", "p", "r", "o")
+    assert len(calls) == 1
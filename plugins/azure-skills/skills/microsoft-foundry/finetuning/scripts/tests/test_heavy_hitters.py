@@ -0,0 +1,100 @@
+import pickle
+import random
+
+import engine
+from conftest import sft_record
+from engine import validate_file
+from heavy_hitters import RepeatedContent, SpaceSaving
+
+REFUSAL = "I'm sorry, but I can't help with that request."
+SIGN_OFF = "Please let me know if you have any other questions!"
+
+
+def test_space_saving_keeps_frequent_items_with_error_bounds():
+    rng = random.Random(7)
+    stream = ["hot"] * 500 + ["warm"] * 200 + [f"cold{i}" for i in range(3000)]
+    rng.shuffle(stream)
+    summary = SpaceSaving(50)
+    for item in stream:
+        summary.add(item, item)
+    (hot, hot_error, _), (warm, warm_error, _) = summary.top(2)
+    assert hot - hot_error <= 500 <= hot
+    assert warm - warm_error <= 200 <= warm
+    assert summary.total == len(stream)
+    assert len(summary.counters) == 50
+
+
+def test_space_saving_merge_matches_single_pass_when_exact():
+    items = [f"k{i % 30}" for i in range(900)]
+    whole, first, second = SpaceSaving(64), SpaceSaving(64), SpaceSaving(64)
+    for i, item in enumerate(items):
+        whole.add(item, item)
+        (first if i < 400 else second).add(item, item)
+    first.merge(pickle.loads(pickle.dumps(second)))
+    assert first.top(30) == whole.top(30)
+    assert first.total == 900
+
+
+def test_space_saving_merge_bounds_evicted_items():
+    first, second = SpaceSaving(4), SpaceSaving(4)
+    for item in ["a"] * 10 + ["b", "c", "d", "e", "f"]:
+        first.add(item, item)
+    for item in ["a"] * 5 + ["x"] * 8 + ["y", "z", "w"]:
+        second.add(item, item)
+    first.merge(second)
+    counts = {sample: (count, error) for count, error, sample in first.top(4)}
+    assert counts["a"][0] - counts["a"][1] <= 15 <= counts["a"][0]
+    assert counts["x"][0] - counts["x"][1] <= 8 <= counts["x"][0]
+
+
+def test_sft_repeats_report_coverage():
+    repeats = RepeatedContent()
+    for i in range(100):
+        if i % 4 == 0:
+            answer = REFUSAL
+        else:
+            answer = f"Answer {i} covers topic {i * 31} in some detail, then ends. {SIGN_OFF}"
+        repeats.add(sft_record(i, assistant=answer))
+    summary = repeats.summary(top=5)
+    assert summary["records_with_responses"] == 100
+    (refusal,) = summary["responses"]["top"]
+    assert (refusal["count"], refusal["coverage"], refusal["text"]) == (25, 0.25, REFUSAL)
+    assert summary["system_prompts"]["top"][0]["coverage"] == 1.0
+    sentences = {item["text"]: item["count"] for item in summary["sentences"]["top"]}
+    assert sentences == {SIGN_OFF: 75, REFUSAL: 25}
+    closings = {item["text"]: item["count"] for item in summary["closings"]["top"]}
+    assert closings["me know if you have any other questions"] == 75
+    assert summary["openings"]["top"][0]["text"] == "i m sorry but i can t help"
+
+
+def test_unique_content_reports_nothing():
+    repeats = RepeatedContent()
+    for i in range(50):
+        repeats.add(sft_record(i, assistant=f"Completely distinct answer number {i} here.", system=f"Persona {i}"))
+    summary = repeats.summary()
+    assert all(not summary[name]["top"] for name in ("responses", "system_prompts", "sentences", "openings"))
+
+
+def test_dpo_outputs_are_counted():
+    record = {"input": {"messages": [{"role": "system", "content": "Be terse."},
+                                     {"role": "user", "content": "Hi"}]},
+              "preferred_output": [{"role": "assistant", "content": "Hello there, how can I help you today?"}],
+              "non_preferred_output": [{"role": "assistant", "content": REFUSAL}]}
+    repeats = RepeatedContent()
+    for _ in range(3):
+        repeats.add(record)
+    summary = repeats.summary()
+    assert repeats.responses.total == 6
+    assert {item["text"] for item in summary["responses"]["top"]} == {REFUSAL, "Hello there, how can I help you today?"}
+    assert summary["system_prompts"]["top"][0]["count"] == 3
+
+
+def test_data_stats_repeats_identical_across_workers(write_jsonl, monkeypatch):
+    rows = [sft_record(i, assistant=REFUSAL if i % 10 == 0 else None) for i in range(2000)]
+    path = write_jsonl(rows)
+    single = validate_file(path, collect_stats=("profile", "repeats"))
+    assert single.stats.profile is not None
+    monkeypatch.setattr(engine, "MIN_SHARD_BYTES", 1)
+    sharded = validate_file(path, collect_stats="repeats", workers=3)
+    assert sharded.stats.repeats.summary() == single.stats.repeats.summary()
+    assert single.to_dict()["stats"]["repeats"]["responses"]["top"][0]["count"] == 200
@@ -0,0 +1,159 @@
+import base64
+import binascii
+from types import SimpleNamespace
+
+import pytest
+
+import image_check
+from engine import validate_file
+from image_check import MAX_IMAGE_BYTES, MAX_IMAGES_PER_EXAMPLE, check_image, data_uri_info, sniff_image
+
+
+def png(color_type=2, width=640, height=480):
+    return (b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + width.to_bytes(4, "big") +
+            height.to_bytes(4, "big") + bytes([8, color_type, 0, 0, 0]) + b"\x00" * 4)
+
+
+def jpeg(components=3, sof=0xC0, width=800, height=600, app_bytes=0):
+    segments = b"\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"  # APP0
+    if app_bytes:  # e.g. an Exif APP1 carrying a thumbnail
+        segments += b"\xff\xe1" + (app_bytes + 2).to_bytes(2, "big") + b"\x00" * app_bytes
+    segments += b"\xff\xdb\x00\x43" + b"\x01" * 65  # DQT
+    frame = bytes([8]) + height.to_bytes(2, "big") + width.to_bytes(2, "big") + bytes([components])
+    frame += b"".join(bytes([i + 1, 0x11, 0]) for i in range(components))
+    sof_segment = bytes([0xFF, sof]) + (len(frame) + 2).to_bytes(2, "big") + frame
+    return b"\xff\xd8" + segments + sof_segment + b"\xff\xda\x00\x08" + b"\x00" * 16
+
+
+def webp_vp8x(alpha=True, width=300, height=200):
+    flags = 0x10 if alpha else 0
+    chunk = bytes([flags, 0, 0, 0]) + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    return b"RIFF\x00\x00\x00\x00WEBPVP8X\x0a\x00\x00\x00" + chunk + b"\x00" * 8
+
+
+def webp_vp8l(width=300, height=200):
+    bits = (width - 1) | (height - 1) << 14 | 1 << 28
+    return b"RIFF\x00\x00\x00\x00WEBPVP8L\x00\x00\x00\x00\x2f" + bits.to_bytes(4, "little") + b"\x00" * 8
+
+
+def data_uri(data, media_type="image/png"):
+    return f"data:{media_type};base64," + base64.b64encode(data).decode()
+
+
+def part(url, **image_url):
+    return {"type": "image_url", "image_url": {"url": url, **image_url}}
+
+
+def errors(issues):
+    return [message for level, message in issues if level == "error"]
+
+
+@pytest.mark.parametrize("data,expected", [
+    (png(), ("PNG", "RGB", 640, 480)),
+    (png(6, 1, 2), ("PNG", "RGBA", 1, 2)),
+    (jpeg(), ("JPEG", "RGB", 800, 600)),
+    (jpeg(sof=0xC2, width=1024, height=768), ("JPEG", "RGB", 1024, 768)),  # progressive
+    (jpeg(app_bytes=5000), ("JPEG", "RGB", 800, 600)),  # APP1 before the frame header
+    (webp_vp8x(), ("WEBP", "RGBA", 300, 200)),
+    (webp_vp8x(alpha=False), ("WEBP", "RGB", 300, 200)),
+    (webp_vp8l(), ("WEBP", "RGBA", 300, 200)),
+    (b"GIF89a\x10\x00\x20\x00" + b"\x00" * 20, ("GIF", "P", 16, 32)),
+    (b"not an image at all, just text", (None, None, None, None)),
+])
+def test_sniff_headers(data, expected):
+    assert sniff_image(lambda offset, n: data[offset:offset + n]) == expected
+
+
+def test_jpeg_without_frame_header_before_scan():
+    data = b"\xff\xd8\xff\xe0\x00\x04\x00\x00\xff\xda\x00\x08" + b"\x00" * 16
+    assert sniff_image(lambda offset, n: data[offset:offset + n]) == ("JPEG", None, None, None)
+
+
+@pytest.mark.parametrize("extra", [0, 1, 2])
+def test_size_follows_length_and_padding(extra):
+    data = png() + b"\x00" * (30 + extra)
+    url = data_uri(data)
+    assert url.endswith("=" * ((3 - len(data) % 3) % 3))
+    info, media_type, issues = data_uri_info(url)
+    assert (info.size, media_type, issues) == (len(data), "image/png", [])
+
+
+def test_unpadded_payload_is_flagged():
+    url = data_uri(png() + b"\x00")
+    info, _, issues = data_uri_info(url.rstrip("="))
+    assert info.format == "PNG"
+    assert ("warning", "base64 payload length is not a multiple of 4 (truncated?)") in issues
+
+
+@pytest.mark.parametrize("offset,n", [(0, 1), (1, 2), (2, 7), (3, 3), (100, 50), (4093, 10), (4094, 100)])
+def test_base64_window_reads_any_range(offset, n):
+    data = bytes(range(256)) * 16
+    url = data_uri(data)
+    window = image_check._Base64Window(url, url.index(",") + 1)
+    assert window.read(offset, n) == data[offset:offset + n]
+
+
+def test_large_image_decodes_only_headers(monkeypatch):
+    data = jpeg(app_bytes=60000) + b"\x00" * (MAX_IMAGE_BYTES + 1)
+    decoded = []
+
+    def a2b_base64(chunk):
+        decoded.append(len(chunk))
+        return binascii.a2b_base64(chunk)
+
+    monkeypatch.setattr(image_check, "binascii", SimpleNamespace(a2b_base64=a2b_base64, Error=binascii.Error))
+    info, issues = check_image(part(data_uri(data, "image/jpeg")))
+    assert info[:4] == ("JPEG", "RGB", 800, 600) and info.size == len(data)
+    assert errors(issues) == [f"image is {len(data) / 1024 / 1024:.1f} MB (max 10 MB)"]
+    assert sum(decoded) < 1024
+
+
+@pytest.mark.parametrize("data,media_type,mode", [
+    (png(0), "image/png", "L"),
+    (png(4), "image/png", "LA"),
+    (jpeg(1), "image/jpeg", "L"),
+    (jpeg(4), "image/jpeg", "CMYK"),
+])
+def test_unsupported_color_modes(data, media_type, mode):
+    _, issues = check_image(part(data_uri(data, media_type)))
+    assert errors(issues) == [f"color mode {mode} is not supported (convert to RGB or RGBA)"]
+
+
+def test_declared_type_mismatch_and_bad_base64():
+    _, issues = check_image(part(data_uri(png(), "image/jpeg")))
+    assert issues == [("warning", "data URI says image/jpeg but the bytes are PNG")]
+    _, issues = check_image(part("data:image/png;base64,iVBORw0KG"))  # 9 chars: not decodable
+    assert errors(issues) == ["invalid base64 data", "not a recognizable image"]
+
+
+def test_urls_are_checked_by_scheme_and_extension_without_fetching():
+    assert check_image(part("https://example.com/cat.png")) == (None, [])
+    _, issues = check_image(part("https://example.com/cat.GIF?size=large"))
+    assert issues == [("warning", "URL looks like a GIF image (JPEG, PNG, WEBP only)")]
+    _, issues = check_image(part("file:///tmp/cat.png"))
+    assert errors(issues) == ["unsupported URL scheme 'file' (use https or a base64 data URI)"]
+
+
+def _vision_record(n_images, role="user"):
+    image = part(data_uri(png()), detail="low")
+    return {"messages": [
+        {"role": "user", "content": "Describe the next message."},
+        {"role": role, "content": [{"type": "text", "text": "What is this?"}] + [image] * n_images},
+        {"role": "assistant", "content": "A picture."},
+    ]}
+
+
+def test_image_count_and_role_limits(write_jsonl):
+    rows = [_vision_record(1) for _ in range(10)]
+    rows.append(_vision_record(MAX_IMAGES_PER_EXAMPLE))
+    rows.append(_vision_record(MAX_IMAGES_PER_EXAMPLE + 1))
+    rows.append(_vision_record(1, role="system"))
+    rows.append(_vision_record(1, role="assistant"))
+    result = validate_file(write_jsonl(rows), fmt="SFT", collect_stats=False)
+    assert [e for e in result.errors if "per example" in e] == [
+        f"Line 12: {MAX_IMAGES_PER_EXAMPLE + 1} images (max {MAX_IMAGES_PER_EXAMPLE} per example)"]
+    assert [e for e in result.errors if "only allowed in 'user'" in e] == [
+        "Line 13, message 1, part 1: Image in a 'system' message — images are only allowed in 'user' messages",
+        "Line 14, message 1, part 1: Image in a 'assistant' message — images are only allowed in 'user' messages",
+    ]
+    assert result.rules.image_count == 10 + 2 * MAX_IMAGES_PER_EXAMPLE + 1 + 2
@@ -0,0 +1,40 @@
+from jsonl_io import ParseError, content_chunks, count_lines, iter_lines, read_jsonl, shard_ranges, write_jsonl
+
+
+def test_iter_lines_strips_bom_and_crlf(tmp_path):
+    path = tmp_path / "bom.jsonl"
+    path.write_bytes(b'\xef\xbb\xbf{"a": 1}\r\n{"a": 2}\r\n{"a": 3}')
+    assert [line for _, line in iter_lines(str(path))] == [b'{"a": 1}', b'{"a": 2}', b'{"a": 3}']
+
+
+def test_read_jsonl_reports_bad_lines_and_keeps_numbering(write_jsonl):
+    path = write_jsonl([{"a": 1}, "{not json", "", {"a": 2}])
+    rows = list(read_jsonl(path))
+    assert [n for n, _ in rows] == [1, 2, 4]
+    assert isinstance(rows[1][1], ParseError)
+    assert rows[2][1] == {"a": 2}
+
+
+def test_shard_ranges_cover_file_on_line_boundaries(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    write_jsonl(path, ({"i": i, "pad": "x" * (i % 50)} for i in range(2000)))
+    ranges = shard_ranges(path, 7)
+    assert ranges[0][0] == 0
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    lines = []
+    offset = 0
+    for start, end in ranges:
+        lines += [line for _, line in iter_lines(path, start=start, end=end, line_no=offset)]
+        offset += count_lines(path, start, end)
+    assert lines == [line for _, line in iter_lines(path)]
+
+
+def test_content_chunks_survive_appends(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    write_jsonl(path, ({"i": i, "text": "word " * (i % 40)} for i in range(5000)))
+    before = list(content_chunks(path, min_bytes=20_000, max_bytes=200_000))
+    write_jsonl(path, ({"i": i} for i in range(5000, 5100)), mode="a")
+    after = list(content_chunks(path, min_bytes=20_000, max_bytes=200_000))
+    assert len(before) > 3
+    assert after[:len(before) - 1] == before[:-1]  # chunks before the old tail are unchanged
+    assert sum(lines for _, _, lines, _ in after) == 5100
@@ -0,0 +1,41 @@
+import leakage
+from conftest import sft_record
+from leakage import check_leakage
+
+
+def test_reports_exact_and_normalized_overlaps(write_jsonl):
+    train = write_jsonl([sft_record(i, user=f"Prompt {i}: what is the capital of country {i}?")
+                         for i in range(200)], name="train.jsonl")
+    check = write_jsonl([
+        sft_record(0, user="Prompt 5: what is the capital of country 5?"),     # exact
+        sft_record(1, user="prompt 7 -- What is the capital of country 7"),    # normalized
+        sft_record(2, user="A prompt that never appeared in training"),
+    ], name="validation.jsonl")
+    (report,) = check_leakage([train], [check])
+    assert report.records == 3
+    assert report.exact == [(1, (train, 6))]
+    assert report.normalized == [(2, (train, 8))]
+
+
+def test_bloom_hits_are_confirmed_against_training(write_jsonl, monkeypatch):
+    class AlwaysHit(leakage.BloomFilter):
+        def __contains__(self, fp):
+            return True
+
+    monkeypatch.setattr(leakage, "BloomFilter", AlwaysHit)
+    train = write_jsonl([sft_record(i, user=f"train prompt {i}") for i in range(50)], name="train.jsonl")
+    check = write_jsonl([sft_record(0, user="train prompt 3"), sft_record(1, user="fresh prompt")],
+                        name="test.jsonl")
+    (report,) = check_leakage([train], [check])
+    assert report.leaked == 1
+    assert report.exact == [(1, (train, 4))]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = leakage.BloomFilter(1000)
+    fps = [leakage._fingerprint(f"text {i}") for i in range(1000)]
+    for fp in fps:
+        bloom.add(fp)
+    assert all(fp in bloom for fp in fps)
+    misses = sum(leakage._fingerprint(f"other {i}") in bloom for i in range(10000))
+    assert misses < 300  # ~1% expected
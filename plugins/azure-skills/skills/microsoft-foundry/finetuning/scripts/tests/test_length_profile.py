@@ -0,0 +1,64 @@
+from array import array
+
+import pytest
+
+import engine
+import length_profile
+from conftest import sft_record
+from engine import validate_file
+from length_profile import count_over, describe, parse_token_limits
+
+
+def test_describe_percentiles_and_log2_bins():
+    values = array("I", [0, 1, 2, 3, 4, 7, 8, 100, 1000, 1000])
+    d = describe(values)
+    assert (d["count"], d["total"], d["min"], d["max"]) == (10, 2125, 0, 1000)
+    assert (d["p50"], d["p90"], d["p99"]) == (4, 1000, 1000)
+    assert d["histogram"] == {"0": 1, "1": 1, "2-3": 2, "4-7": 2, "8-15": 1, "16-31": 0, "32-63": 0,
+                              "64-127": 1, "128-255": 0, "256-511": 0, "512-1023": 2}
+    assert describe(array("I")) is None
+    assert count_over(values, 7) == 4
+
+
+def test_numpy_and_pure_python_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    values = array("I", [(i * 7919) % 70000 for i in range(10000)])
+    vectorized = describe(values)
+    monkeypatch.setattr(length_profile, "np", None)
+    assert describe(values) == vectorized
+
+
+def test_sft_profile_roles_and_limits(write_jsonl):
+    rows = [sft_record(i) for i in range(200)]
+    rows[3]["messages"][2]["content"] = "word " * 4000  # ~5000 estimated tokens
+    result = validate_file(write_jsonl(rows), collect_stats="profile")
+    profile = result.stats.profile.summary({"tiny": 4096})
+    assert profile["record"]["count"] == 200
+    assert sorted(profile["roles"]) == ["assistant", "system", "user"]
+    assert profile["roles"]["assistant"]["max"] > 4096
+    assert profile["over_limit"]["tiny"] == {"limit": 4096, "records": 1, "fraction": 0.005}
+    assert profile["over_limit"]["gpt-4.1"]["records"] == 0
+    assert result.to_dict()["stats"]["profile"]["record"] == profile["record"]
+
+
+def test_dpo_parts(write_jsonl):
+    rows = [{"input": {"messages": [{"role": "user", "content": "q" * 40}]},
+             "preferred_output": [{"role": "assistant", "content": "p" * 400}],
+             "non_preferred_output": [{"role": "assistant", "content": "n" * 80}]} for _ in range(20)]
+    profile = validate_file(write_jsonl(rows), collect_stats="profile").stats.profile.summary()
+    assert sorted(profile["parts"]) == ["non_preferred", "preferred", "prompt"]
+    assert profile["parts"]["preferred"]["p50"] > profile["parts"]["non_preferred"]["p50"]
+
+
+def test_profile_identical_across_workers(write_jsonl, monkeypatch):
+    path = write_jsonl([sft_record(i) for i in range(3000)])
+    single = validate_file(path, collect_stats="profile").stats.profile.summary()
+    monkeypatch.setattr(engine, "MIN_SHARD_BYTES", 1)
+    sharded = validate_file(path, collect_stats="profile", workers=3).stats.profile.summary()
+    assert sharded == single
+
+
+def test_parse_token_limits():
+    assert parse_token_limits(["my-model=8192", " x = 10"]) == {"my-model": 8192, "x": 10}
+    with pytest.raises(ValueError):
+        parse_token_limits(["gpt-4.1"])
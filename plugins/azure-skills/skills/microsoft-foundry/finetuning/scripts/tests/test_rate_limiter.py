@@ -0,0 +1,46 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from common import RateLimiter, _retry_after_seconds
+
+
+def test_retry_after_forms():
+    assert _retry_after_seconds({"retry-after-ms": "1500"}) == 1.5
+    assert _retry_after_seconds({"retry-after": "7"}) == 7.0
+    date = formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= _retry_after_seconds({"retry-after": date}) <= 31
+    assert _retry_after_seconds({"retry-after": formatdate(time.time() - 60, usegmt=True)}) == 0.0
+    assert _retry_after_seconds({"retry-after": "soon"}) is None
+    assert _retry_after_seconds({}) is None
+
+
+def test_unpaced_until_headers_arrive():
+    limiter = RateLimiter()
+    assert all(limiter._reserve(10_000) == 0.0 for _ in range(100))
+
+
+def test_throttle_blocks_every_caller_for_retry_after():
+    limiter = RateLimiter()
+    limiter.on_throttled({"retry-after-ms": "2000"}, attempt=0)
+    assert limiter.throttled == 1
+    assert 1.5 < limiter._reserve(0) <= 2.0
+    # a shorter hint never shortens an existing block
+    limiter.on_throttled({"retry-after": "1"}, attempt=0)
+    assert limiter._reserve(0) > 1.5
+
+
+def test_throttle_without_hint_backs_off():
+    limiter = RateLimiter()
+    limiter.on_throttled({}, attempt=3)
+    assert 3.5 < limiter._reserve(0) <= 8.0
+
+
+def test_observe_paces_to_remaining_tokens():
+    limiter = RateLimiter()
+    limiter.observe({"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "1000",
+                     "x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "60"})
+    assert limiter._reserve(900) == 0.0
+    # 100 tokens left of a 6000/min bucket: 500 more take ~5 s to refill
+    assert limiter._reserve(600) == pytest.approx(5.0, abs=0.1)
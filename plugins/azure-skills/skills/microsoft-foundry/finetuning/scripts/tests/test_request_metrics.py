@@ -0,0 +1,34 @@
+import pytest
+
+from common import RequestMetrics, _percentile
+
+
+@pytest.mark.parametrize("values,pct,expected", [
+    ([1, 2], 50, 1),
+    (list(range(1, 7)), 50, 3),
+    (list(range(1, 11)), 50, 5),
+    (list(range(1, 21)), 95, 19),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 101)), 7, 7),
+    ([4], 99, 4),
+    (list(range(1, 11)), 0, 1),
+    (list(range(1, 11)), 100, 10),
+])
+def test_percentile_nearest_rank(values, pct, expected):
+    assert _percentile(values, pct) == expected
+
+
+def test_percentile_empty():
+    assert _percentile([], 50) is None
+
+
+def test_summary_latency_percentiles():
+    metrics = RequestMetrics()
+    for ms in range(1, 11):
+        metrics.record_response("judge", ms / 1000, 200)
+    metrics.record_response("judge", 0.5, 429)
+    metrics.record_usage("judge", {"prompt_tokens": 7, "completion_tokens": 3})
+    summary = metrics.summary()["models"]["judge"]
+    assert summary["latency_ms"]["p50"] == 6.0  # 11 samples: rank 6
+    assert summary["latency_ms"]["max"] == 500.0
+    assert (summary["ok"], summary["throttled"], summary["tokens_in"], summary["tokens_out"]) == (10, 1, 7, 3)
@@ -0,0 +1,39 @@
+import time
+
+from response_cache import ResponseCache
+
+
+def test_get_put_roundtrip_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"))
+    key = ResponseCache.make_key(None, {"model": "m", "messages": [{"role": "user", "content": "hi"}]})
+    assert cache.get(key) is None
+    cache.put(key, '{"ok": true}')
+    assert cache.get(key) == '{"ok": true}'
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_key_depends_on_request_not_dict_order():
+    a = ResponseCache.make_key(None, {"model": "m", "temperature": 0})
+    b = ResponseCache.make_key(None, {"temperature": 0, "model": "m"})
+    assert a == b != ResponseCache.make_key(None, {"model": "m", "temperature": 1})
+
+
+def test_lru_eviction_drops_least_recently_used(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    value = "x" * 1000
+    cache = ResponseCache(path, max_mb=4500 / 1024 / 1024)  # room for four values
+    for key in "abcd":
+        cache.put(key, value)
+        time.sleep(0.01)
+    assert cache.get("a") == value  # "a" is now the most recently used
+    time.sleep(0.01)
+    cache.put("e", value)
+    assert cache.evictions == 1
+    assert cache.get("b") is None
+    assert all(cache.get(key) == value for key in "acde")
+    cache.close()
+
+    reopened = ResponseCache(path, max_mb=4500 / 1024 / 1024)
+    assert reopened._size == 4000
+    reopened.close()
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from risk_scan import RiskScanner
+
+
+def _scan(scanner, record, ensure_ascii):
+    raw = json.dumps(record, ensure_ascii=ensure_ascii).encode("utf-8")
+    return scanner.scan_line(raw, record)
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_default_phrases_match_across_whitespace_and_case(ensure_ascii):
+    record = {"messages": [{"role": "user", "content": "Please LET ME\n think about it"}]}
+    assert _scan(RiskScanner(), record, ensure_ascii) == [
+        ("let me think", "reasoning-elicitation", "messages[0].content")]
+
+
+def test_clean_line_has_no_hits():
+    record = {"messages": [{"role": "user", "content": "What is 2 + 2?"}]}
+    assert _scan(RiskScanner(), record, True) == []
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_non_ascii_phrase_found_in_escaped_and_raw_lines(ensure_ascii):
+    scanner = RiskScanner({"phrases": {"food": ["café au lait"]}})
+    record = {"messages": [{"role": "user", "content": "Un CAFÉ au lait, s'il vous plaît"}]}
+    assert _scan(scanner, record, ensure_ascii) == [("café au lait", "food", "messages[0].content")]
+
+
+def test_escaped_ascii_phrase_is_not_skipped_by_prefilter():
+    # "think" spelled with a \\u escape never appears in the raw bytes
+    scanner = RiskScanner()
+    record = {"messages": [{"role": "user", "content": "let me think"}]}
+    raw = b'{"messages": [{"role": "user", "content": "let me \\u0074hink"}]}'
+    assert scanner.scan_line(raw, record) == [("let me think", "reasoning-elicitation", "messages[0].content")]
+
+
+def test_custom_regex_and_key_paths():
+    scanner = RiskScanner({"regex": {"credentials": [r"api[_-]?key\s*[:=]"]}})
+    record = {"metadata": {"note": "API_KEY = abc"}}
+    hits = _scan(scanner, record, True)
+    assert [(category, path) for _, category, path in hits] == [("credentials", "metadata.note")]
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("pattern, content", [
+    (r"^secret", "secret sauce inside"),
+    ("line1\nline2", "line1\nline2"),
+    (r'say "hi"', 'then say "hi" back'),
+])
+def test_custom_regex_runs_on_decoded_text(pattern, content, ensure_ascii):
+    # anchors, newlines and quotes look different in the raw JSON line
+    scanner = RiskScanner({"phrases": {"reasoning-elicitation": ["let me think"]}, "regex": {"custom": [pattern]}})
+    record = {"messages": [{"role": "user", "content": content}]}
+    assert _scan(scanner, record, ensure_ascii) == [(pattern, "custom", "messages[0].content")]
@@ -0,0 +1,177 @@
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import score_dataset
+from conftest import sft_record
+from score_dataset import QualityDistribution, load_checkpoint
+
+
+def _score(user):
+    # deterministic judge: 1-10 from the question number
+    n = int(user.split()[2]) % 10 + 1
+    return {"correctness": n, "relevance": n, "quality": 10}
+
+
+@pytest.fixture
+def judge(monkeypatch):
+    calls = []
+
+    def fake_score(client, model, user, assistant, dimensions, cache=None):
+        calls.append(user)
+        return _score(user)
+
+    monkeypatch.setattr(score_dataset, "get_clients", lambda **kwargs: (None, "fake"))
+    monkeypatch.setattr(score_dataset, "score_example", fake_score)
+    return calls
+
+
+def _rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_quality_distribution_median():
+    stats = QualityDistribution()
+    for avg in (3.0, 9.0, 5.0, 7.0):
+        stats.add(avg)
+    assert stats.median() == 6.0
+    stats.add(8.0)
+    assert stats.median() == 7.0
+
+
+def test_streams_rows_and_checkpoints(write_jsonl, tmp_path, judge, capsys):
+    rows = [sft_record(i) for i in range(120)]
+    rows.insert(7, "{not json")
+    path = write_jsonl(rows)
+    out = str(tmp_path / "scored.jsonl")
+    score_dataset.main(["--input", path, "--output", out, "--min-score", "6", "--concurrency", "3"])
+
+    scored = _rows(out)
+    assert all(row["_avg_quality"] >= 6 for row in scored)
+    assert len(scored) == sum(1 for i in range(120) if (2 * (i % 10 + 1) + 10) / 3 >= 6)
+    done, output_bytes = load_checkpoint(out + ".ckpt", json.loads(open(out + ".ckpt").readline())["settings"])
+    assert len(done) == 120 and 8 not in done  # the malformed line is not a scored row
+    assert output_bytes == len(open(out, "rb").read())
+    report = capsys.readouterr().out
+    assert "Median: 7.0" in report and f"Kept: {len(scored)}, Filtered: {120 - len(scored)}" in report
+
+
+def test_resume_after_crash_matches_full_run(write_jsonl, tmp_path, judge, monkeypatch, capsys):
+    path = write_jsonl([sft_record(i) for i in range(200)])
+    full = str(tmp_path / "full.jsonl")
+    score_dataset.main(["--input", path, "--output", full, "--concurrency", "2"])
+    full_report = capsys.readouterr().out.split("Quality Distribution:")[1]
+    judge.clear()
+
+    real = score_dataset.score_example
+
+    def crashing(client, model, user, *args, **kwargs):
+        if len(judge) >= 90:
+            raise KeyboardInterrupt
+        return real(client, model, user, *args, **kwargs)
+
+    out = str(tmp_path / "scored.jsonl")
+    monkeypatch.setattr(score_dataset, "score_example", crashing)
+    with pytest.raises(SystemExit) as exit_info:
+        score_dataset.main(["--input", path, "--output", out, "--concurrency", "2"])
+    assert exit_info.value.code == 130
+    with open(out, "a", encoding="utf-8") as f:
+        f.write('{"torn": ')  # a row written after the last commit
+
+    monkeypatch.setattr(score_dataset, "score_example", real)
+    judge.clear()
+    score_dataset.main(["--input", path, "--output", out, "--concurrency", "2", "--resume"])
+    assert 0 < len(judge) < 200 - 75  # only rows past the last commit are scored again
+    resumed_report = capsys.readouterr().out.split("Quality Distribution:")[1]
+    key = lambda row: row["messages"][1]["content"]
+    assert sorted(_rows(out), key=key) == sorted(_rows(full), key=key)
+    assert resumed_report.replace(out, full) == full_report
+
+
+def test_resume_refuses_changed_settings(write_jsonl, tmp_path, judge):
+    path = write_jsonl([sft_record(i) for i in range(10)])
+    out = str(tmp_path / "scored.jsonl")
+    score_dataset.main(["--input", path, "--output", out])
+    with pytest.raises(SystemExit):
+        score_dataset.main(["--input", path, "--output", out, "--resume", "--min-score", "5"])
+
+
+def _api_error(status=400):
+    import openai
+    request = httpx.Request("POST", "https://example.test/chat/completions")
+    error = {400: openai.BadRequestError, 401: openai.AuthenticationError}[status]
+    return error("judge call failed", response=httpx.Response(status, request=request), body=None)
+
+
+def _replies(monkeypatch, *replies):
+    calls = []
+
+    def fake_completion(client, cache=None, cache_refresh=False, **request):
+        calls.append(cache_refresh)
+        reply = replies[len(calls) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    monkeypatch.setattr(score_dataset, "chat_completion", fake_completion)
+    return calls
+
+
+def test_score_example_reasks_only_unparseable_replies(monkeypatch):
+    dims = {"correctness": "", "quality": ""}
+    calls = _replies(monkeypatch, "I think it's fine", '{"correctness": 8, "quality": 6}')
+    assert score_dataset.score_example(None, "judge", "q", "a", dims) == {"correctness": 8, "quality": 6}
+    assert calls == [False, True]  # the re-ask bypasses the cached unparseable reply
+
+    calls = _replies(monkeypatch, "no", "still no", "nope")
+    assert score_dataset.score_example(None, "judge", "q", "a", dims) == {"correctness": 0, "quality": 0}
+    assert len(calls) == score_dataset.PARSE_ATTEMPTS
+
+
+def test_score_example_raises_api_errors(monkeypatch):
+    pytest.importorskip("openai")
+    calls = _replies(monkeypatch, _api_error(), '{"correctness": 8, "quality": 6}')
+    with pytest.raises(Exception, match="judge call failed"):
+        score_dataset.score_example(None, "judge", "q", "a", {"correctness": ""})
+    assert len(calls) == 1  # chat_completion already retried; no second request
+
+
+def test_failed_judge_calls_are_counted_and_resumed(write_jsonl, tmp_path, judge, monkeypatch, capsys):
+    pytest.importorskip("openai")
+    path = write_jsonl([sft_record(i) for i in range(60)])
+    out = str(tmp_path / "scored.jsonl")
+    real = score_dataset.score_example
+
+    def flaky(client, model, user, *args, **kwargs):
+        if int(user.split()[2]) % 20 == 3:
+            raise _api_error()
+        return real(client, model, user, *args, **kwargs)
+
+    monkeypatch.setattr(score_dataset, "score_example", flaky)
+    score_dataset.main(["--input", path, "--output", out])
+    report = capsys.readouterr().out
+    assert "Kept: 57, Filtered: 0" in report
+    assert "⚠️ 3 rows not scored because the judge call failed (first: line " in report
+    assert "BadRequestError: judge call failed" in report
+
+    monkeypatch.setattr(score_dataset, "score_example", real)
+    judge.clear()
+    score_dataset.main(["--input", path, "--output", out, "--resume"])
+    assert sorted(judge) == sorted(sft_record(i)["messages"][1]["content"] for i in (3, 23, 43))
+    assert len(_rows(out)) == 60
+    assert "not scored" not in capsys.readouterr().out
+
+
+def test_fatal_judge_errors_stop_the_run(write_jsonl, tmp_path, judge, monkeypatch):
+    pytest.importorskip("openai")
+    path = write_jsonl([sft_record(i) for i in range(10)])
+
+    def unauthorized(*args, **kwargs):
+        raise _api_error(401)
+
+    monkeypatch.setattr(score_dataset, "score_example", unauthorized)
+    with pytest.raises(Exception, match="judge call failed"):
+        score_dataset.main(["--input", path, "--output", str(tmp_path / "scored.jsonl")])
@@ -0,0 +1,67 @@
+import random
+
+from streaming_stats import DistinctSample, IssueLog, QuantileSketch, RunningStats
+
+
+def test_quantile_sketch_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(5, 1.5) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(sketch.quantile(q) - exact) / exact < 0.02
+
+
+def test_quantile_sketch_merge_matches_single_pass():
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for v in range(1, 5001):
+        whole.add(v)
+        (left if v <= 2500 else right).add(v)
+    left.merge(right)
+    assert (left.count, left.min, left.max, left.total) == (whole.count, whole.min, whole.max, whole.total)
+    assert left.quantile(0.9) == whole.quantile(0.9)
+
+
+def test_running_stats_merge_empty():
+    a, b = RunningStats(), RunningStats()
+    b.add(3)
+    a.merge(b)
+    a.merge(RunningStats())
+    assert (a.count, a.min, a.max, a.mean) == (1, 3, 3, 3)
+
+
+def test_distinct_sample_exact_below_k_and_estimates_above():
+    small = DistinctSample(k=64)
+    for i in range(50):
+        small.add(f"v{i % 40}")
+    assert small.exact and small.count() == 40
+
+    big = DistinctSample(k=256)
+    for i in range(20000):
+        big.add(f"value-{i}")
+    assert not big.exact
+    assert abs(big.count() - 20000) / 20000 < 0.2
+
+
+def test_distinct_sample_merge_is_order_independent():
+    a, b, whole = DistinctSample(k=32), DistinctSample(k=32), DistinctSample(k=32)
+    for i in range(500):
+        whole.add(str(i))
+        (a if i % 2 else b).add(str(i))
+    a.merge(b)
+    assert a.sample() == whole.sample()
+
+
+def test_issue_log_bounds_samples_but_counts_everything():
+    log = IssueLog(max_samples=3)
+    for i in range(10):
+        log.append(f"Line {i}: Missing 'messages' field")
+    other = IssueLog(max_samples=3)
+    other.append("Line 99: Record must be a JSON object")
+    log.merge(other)
+    assert len(log) == 11
+    assert log[:] == [f"Line {i}: Missing 'messages' field" for i in range(3)]
+    assert log.categories.most_common(1)[0][1] == 10
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from token_count import (IMAGE_TOKENS, IMAGE_TOKENS_LOW, REPLY_PRIMING_TOKENS, TOKENS_PER_MESSAGE,
+                         TokenCounter, estimate_tokens)
+
+
+def _estimating_counter():
+    counter = TokenCounter()
+    counter.exact = False
+    counter.count_text = estimate_tokens
+    return counter
+
+
+def test_count_messages_adds_chat_overhead():
+    counter = _estimating_counter()
+    messages = [{"role": "user", "content": "x" * 40}, {"role": "assistant", "content": "y" * 8}]
+    expected = REPLY_PRIMING_TOKENS + 2 * TOKENS_PER_MESSAGE + \
+        sum(estimate_tokens(m["role"]) + estimate_tokens(m["content"]) for m in messages)
+    assert counter.count_messages(messages) == expected
+
+
+def test_images_are_charged_flat_per_detail():
+    counter = _estimating_counter()
+    parts = [{"type": "text", "text": "abcdefgh"},
+             {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 100000, "detail": "low"}},
+             {"type": "image_url", "image_url": {"url": "https://example.com/a.png"}}]
+    assert counter.count_content_parts(parts) == 2 + IMAGE_TOKENS_LOW + IMAGE_TOKENS
+
+
+def test_dpo_outputs_counted_without_priming():
+    counter = _estimating_counter()
+    record = {
+        "input": {"messages": [{"role": "user", "content": "hi"}]},
+        "preferred_output": [{"role": "assistant", "content": "a" * 40}],
+        "non_preferred_output": [{"role": "assistant", "content": "b" * 20}],
+    }
+    tokens = counter.count_record(record)
+    assert tokens.preferred == TOKENS_PER_MESSAGE + estimate_tokens("assistant") + 10
+    assert tokens.non_preferred == TOKENS_PER_MESSAGE + estimate_tokens("assistant") + 5
+    assert tokens.total > tokens.preferred + tokens.non_preferred
+
+
+def test_count_records_keeps_order_and_skips_non_dicts():
+    counter = _estimating_counter()
+    records = [{"messages": [{"role": "user", "content": "z" * (4 * i)}]} for i in range(1, 50)]
+    counts = counter.count_records(records + ["not a record"])
+    assert counts[-1] is None
+    assert [c.total for c in counts[:-1]] == sorted(c.total for c in counts[:-1])
+
+
+TOOL_CALLS = [{"id": "c1", "type": "function",
+               "function": {"name": "lookup", "arguments": "{\"city\": \"Zürich\"}"}}]
+
+
+def _compact(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def test_non_string_fields_counted_as_compact_json():
+    counter = _estimating_counter()
+    message = {"role": "assistant", "tool_calls": TOOL_CALLS}
+    assert counter.count_messages([message], priming=False) == \
+        TOKENS_PER_MESSAGE + estimate_tokens("assistant") + estimate_tokens(_compact(TOOL_CALLS))
+    assert counter.count_record({"flag": True}).total == estimate_tokens("true")
+
+
+def test_exact_counts_with_tiktoken():
+    tiktoken = pytest.importorskip("tiktoken")
+    counter = TokenCounter("gpt-4o")
+    if not counter.exact:
+        pytest.skip("tiktoken encoding files are not available offline")
+    encode = tiktoken.get_encoding(counter.encoding_name).encode_ordinary
+    messages = [{"role": "user", "content": "Weather in Zürich?"},
+                {"role": "assistant", "tool_calls": TOOL_CALLS}]
+    expected = REPLY_PRIMING_TOKENS + 2 * TOKENS_PER_MESSAGE + len(encode("user")) + \
+        len(encode("Weather in Zürich?")) + len(encode("assistant")) + len(encode(_compact(TOOL_CALLS)))
+    assert counter.count_messages(messages) == expected
+    assert counter.count_record({"messages": messages, "score": 0.5}).total == expected + len(encode("0.5"))
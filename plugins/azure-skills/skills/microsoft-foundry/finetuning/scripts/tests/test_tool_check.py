@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from tool_check import SchemaError, ToolChecker, compile_schema
+
+WEATHER = {"type": "function", "function": {"name": "get_weather", "parameters": {
+    "type": "object",
+    "properties": {"city": {"type": "string"}, "unit": {"type": "string", "enum": ["c", "f"]},
+                   "days": {"type": "integer", "minimum": 1, "maximum": 7}},
+    "required": ["city"],
+    "additionalProperties": False,
+}}}
+
+
+def _conversation(arguments, call_id="call_1", reply_id="call_1", name="get_weather"):
+    if not isinstance(arguments, str):
+        arguments = json.dumps(arguments)
+    return [
+        {"role": "user", "content": "Weather in Paris?"},
+        {"role": "assistant", "content": None,
+         "tool_calls": [{"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}]},
+        {"role": "tool", "tool_call_id": reply_id, "content": "20C"},
+        {"role": "assistant", "content": "It is 20C."},
+    ]
+
+
+def _messages(issues):
+    return [f"{where}: {message}" for where, _, message in issues]
+
+
+def test_valid_call_has_no_issues():
+    checker = ToolChecker()
+    assert checker.check(_conversation({"city": "Paris", "days": 3}), [WEATHER]) == []
+    assert (checker.records, checker.tool_calls, checker.tool_replies) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("arguments, expected", [
+    ({"unit": "c"}, "missing required property 'city'"),
+    ({"city": "Paris", "unit": "k"}, 'arguments.unit: "k" is not one of'),
+    ({"city": 3}, "arguments.city: expected string, got integer"),
+    ({"city": "Paris", "days": 9}, "arguments.days: 9 violates maximum 7"),
+    ({"city": "Paris", "zip": "75001"}, "unexpected property 'zip'"),
+    ("{not json", "'function.arguments' is not valid JSON"),
+    ("[1, 2]", "must be a JSON object, got array"),
+])
+def test_argument_errors(arguments, expected):
+    (issue,) = _messages(ToolChecker().check(_conversation(arguments), [WEATHER]))
+    assert issue.startswith(", message 1, tool call 0: ")
+    assert expected in issue
+
+
+def test_reply_pairing():
+    checker = ToolChecker()
+    issues = _messages(checker.check(_conversation({"city": "Paris"}, reply_id="call_9"), [WEATHER]))
+    assert issues == [", message 2: 'tool_call_id' 'call_9' does not match a tool call issued earlier",
+                      ", message 3: 1 tool call(s) without a tool reply before this message (call_1)"]
+
+    twice = _conversation({"city": "Paris"})
+    twice.insert(3, dict(twice[2]))
+    assert _messages(checker.check(twice, [WEATHER])) == [", message 3: second reply to tool call 'call_1'"]
+
+
+def test_final_tool_call_needs_no_reply():
+    messages = _conversation({"city": "Paris"})[:2]
+    assert ToolChecker().check(messages, [WEATHER]) == []
+
+
+def test_undeclared_function_and_missing_tools():
+    checker = ToolChecker()
+    assert "not declared in 'tools'" in _messages(checker.check(_conversation({}, name="nope"), [WEATHER]))[0]
+    (issue,) = checker.check(_conversation({"city": "Paris"}), None)
+    assert issue[1] == "warning"
+
+
+def test_bad_declarations():
+    bad = [WEATHER, WEATHER, {"type": "function", "function": {"name": "has space"}},
+           {"type": "function", "function": {"name": "f", "parameters": {"type": "objekt"}}}]
+    issues = _messages(ToolChecker().check([{"role": "user", "content": "hi"}], bad))
+    assert issues[0] == ", tool 1: function 'get_weather' is declared twice"
+    assert "invalid function name" in issues[1]
+    assert "'f' parameters are not a valid JSON schema" in issues[2]
+
+
+def test_schema_compiled_once_per_tool():
+    checker = ToolChecker()
+    for i in range(500):
+        tools = json.loads(json.dumps([WEATHER]))  # equal, not identical, per record
+        assert checker.check(_conversation({"city": f"c{i}"}, call_id=f"id{i}", reply_id=f"id{i}"), tools) == []
+    assert checker.compiled == 1
+    assert checker.functions["get_weather"] == 500
+
+
+def test_builtin_compiler_refs_and_combinators():
+    validate = compile_schema({
+        "$defs": {"node": {"type": "object", "properties": {
+            "value": {"anyOf": [{"type": "integer"}, {"type": "null"}]},
+            "children": {"type": "array", "items": {"$ref": "#/$defs/node"}, "maxItems": 2}}}},
+        "$ref": "#/$defs/node",
+    })
+    assert validate({"value": 1, "children": [{"value": None}, {"children": []}]}) == []
+    errors = validate({"value": "x", "children": [{"children": [{}, {}, {}]}]})
+    assert errors == ["arguments.value: matches none of the anyOf alternatives",
+                      "arguments.children[0].children: 3 items (max 2)"]
+    with pytest.raises(SchemaError):
+        compile_schema({"$ref": "#/missing"})
+
+
+def test_counts_survive_pickling_and_merge():
+    import pickle
+
+    a, b = ToolChecker(), ToolChecker()
+    a.check(_conversation({"city": "Paris"}), [WEATHER])
+    b.check(_conversation({"city": "Rome"}), [WEATHER])
+    a.merge(pickle.loads(pickle.dumps(b)))
+    assert a.summary() == {"records": 2, "calls": 2, "replies": 2, "functions": {"get_weather": 2}}
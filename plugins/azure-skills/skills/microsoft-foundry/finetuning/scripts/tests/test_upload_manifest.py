@@ -0,0 +1,150 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import common
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("FOUNDRY_FT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("FOUNDRY_FT_NO_CACHE", raising=False)
+
+
+class FakeClient:
+    base_url = "https://example.test/"
+
+    def __init__(self):
+        self.created = 0
+        self._lock = threading.Lock()
+        self.files = SimpleNamespace(create=self._create, retrieve=self._retrieve,
+                                     wait_for_processing=lambda file_id: None)
+
+    def _create(self, file, purpose):
+        while file.read(4096):
+            pass
+        with self._lock:
+            self.created += 1
+            return SimpleNamespace(id=f"file-{self.created}")
+
+    def _retrieve(self, file_id):
+        return SimpleNamespace(id=file_id, status="processed")
+
+
+def test_identical_content_is_uploaded_once(tmp_path, monkeypatch):
+    a, b = tmp_path / "a.jsonl", tmp_path / "b.jsonl"
+    a.write_text('{"x": 1}\n')
+    b.write_text('{"x": 1}\n')
+    client = FakeClient()
+    hashed = []
+    real_sha = common._file_sha256
+    monkeypatch.setattr(common, "_file_sha256", lambda path, *args: hashed.append(path) or real_sha(path, *args))
+
+    first = common.upload_file(client, str(a))
+    assert hashed == []  # new content: hashed while streaming, not up front
+    assert common.upload_file(client, str(b)) == first
+    assert client.created == 1
+
+
+def test_concurrent_uploads_keep_every_manifest_entry(tmp_path):
+    client = FakeClient()
+    paths = []
+    for i in range(8):
+        path = tmp_path / f"f{i}.jsonl"
+        path.write_text(f'{{"x": {i}}}\n')
+        paths.append(str(path))
+    threads = [threading.Thread(target=common.upload_file, args=(client, p)) for p in paths]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    manifest = common._load_cache(common._UPLOAD_MANIFEST)
+    assert len(manifest["files"]) == 8
+    assert len(manifest["hashes"]) == 8
+
+
+def test_hashing_reader_digest_only_after_full_read(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"abc" * 1000)
+    with open(path, "rb") as f:
+        reader = common._HashingReader(f)
+        reader.read(10)
+        assert reader.digest() is None
+        reader.seek(0)
+        while reader.read(100):
+            pass
+        assert reader.digest() == common._file_sha256(str(path))
+
+
+class FakeUploads:
+    """Uploads API double: `fail` maps (upload_id, call) to an HTTP status."""
+
+    def __init__(self, base_url="https://a.example.test/", fail=None):
+        self.base_url = base_url
+        self.fail = fail or {}
+        self.opened, self.sent = [], []
+        self.uploads = SimpleNamespace(create=self._create, complete=self._complete,
+                                       parts=SimpleNamespace(create=self._part))
+
+    def _check(self, upload_id, call):
+        status = self.fail.get((upload_id, call))
+        if status == "crash":
+            raise KeyboardInterrupt
+        if status:
+            import openai
+            request = httpx.Request("POST", f"{self.base_url}uploads/{upload_id}")
+            error = openai.NotFoundError if status == 404 else openai.BadRequestError
+            raise error("rejected", response=httpx.Response(status, request=request), body=None)
+
+    def _create(self, filename, purpose, bytes, mime_type):
+        self.opened.append(f"upload-{len(self.opened) + 1}")
+        return SimpleNamespace(id=self.opened[-1], expires_at=None)
+
+    def _part(self, upload_id, data):
+        self._check(upload_id, len([u for u, _ in self.sent if u == upload_id]))
+        self.sent.append((upload_id, data))
+        return SimpleNamespace(id=f"{upload_id}-part-{len(self.sent)}")
+
+    def _complete(self, upload_id, part_ids):
+        self._check(upload_id, "complete")
+        return SimpleNamespace(file=SimpleNamespace(id=f"file-{upload_id}"))
+
+
+def _interrupted_upload(path, client):
+    pytest.importorskip("openai")
+    client.fail[("upload-1", 2)] = "crash"
+    with pytest.raises(KeyboardInterrupt):
+        common._chunked_upload(client, str(path), "fine-tune", workers=1, part_size=4)
+    assert len(client.sent) == 2
+
+
+def test_upload_state_is_scoped_to_the_endpoint(tmp_path):
+    path = tmp_path / "big.jsonl"
+    path.write_bytes(b"0123456789abcdef")
+    first = FakeUploads()
+    _interrupted_upload(path, first)
+
+    other = FakeUploads(base_url="https://b.example.test/")
+    assert common._chunked_upload(other, str(path), "fine-tune", workers=1, part_size=4) == "file-upload-1"
+    assert other.opened == ["upload-1"] and len(other.sent) == 4  # nothing reused across endpoints
+
+    first.fail.clear()
+    assert common._chunked_upload(first, str(path), "fine-tune", workers=1, part_size=4) == "file-upload-1"
+    assert first.opened == ["upload-1"] and len(first.sent) == 4  # same endpoint resumes
+
+
+@pytest.mark.parametrize("call,status", [(2, 404), (2, 400), ("complete", 404), ("complete", 400)])
+def test_rejected_resume_starts_a_fresh_upload(tmp_path, capsys, call, status):
+    path = tmp_path / "big.jsonl"
+    path.write_bytes(b"0123456789abcdef")
+    client = FakeUploads()
+    _interrupted_upload(path, client)
+
+    client.fail = {("upload-1", call): status}
+    assert common._chunked_upload(client, str(path), "fine-tune", workers=1, part_size=4) == "file-upload-2"
+    assert client.opened == ["upload-1", "upload-2"]
+    assert b"".join(d for u, d in client.sent if u == "upload-2") == path.read_bytes()
+    assert f"was rejected ({status})" in capsys.readouterr().out
+    assert not list((tmp_path / "cache" / "uploads").glob("*.json"))
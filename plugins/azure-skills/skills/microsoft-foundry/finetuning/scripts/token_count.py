@@ -0,0 +1,171 @@
+"""
+token_count.py — Exact chat-format token counting shared by the validators.
+
+Counts tokens with tiktoken when it is installed, using the encoding of the
+target model (one cached encoder per encoding), and adds the chat-format
+overhead the service bills for every message. Records are counted in
+batches spread over a thread pool — tiktoken encodes outside the GIL, so
+threads scale across cores. Without tiktoken, counts fall back to the
+~4 characters per token estimate.
+
+Usage:
+    from token_count import get_counter
+
+    counter = get_counter("gpt-4.1-mini")
+    counts = counter.count_records(records)   # [RecordTokens, ...] in order
+    counter.exact                             # False when estimating
+"""
+import json
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_ENCODING = "o200k_base"  # gpt-4o / gpt-4.1 / o-series families
+TOKENS_PER_MESSAGE = 3           # <|start|>{role}\n ... <|end|>
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3         # every reply is primed with <|start|>assistant<|message|>
+IMAGE_TOKENS_LOW = 85            # detail "low": one 512x512 tile
+IMAGE_TOKENS = 765               # "high"/"auto": base + 4 tiles, a typical 1024x1024 image
+BATCH_SIZE = 4096                # records per count_records() thread fan-out
+
+MESSAGE_LISTS = ("messages", "preferred_output", "non_preferred_output")
+
+# total: every message list in the record (chat format) plus scalar extra
+# fields; preferred / non_preferred: the DPO outputs on their own.
+RecordTokens = namedtuple("RecordTokens", ["total", "preferred", "non_preferred"])
+
+
+def _as_text(value):
+    """Text of a non-string field as it reaches the model: compact JSON."""
+    return value if isinstance(value, str) else json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate: ~4 chars per token for English text."""
+    return max(1, len(text) // 4)
+
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    return tiktoken.get_encoding(name)
+
+
+def encoding_name_for(model=None):
+    """tiktoken encoding for `model`, defaulting to DEFAULT_ENCODING.
+
+    Fine-tuned ids ("ft:gpt-4.1-mini:org::abc") are reduced to the base
+    model; tiktoken matches by prefix, so dated versions resolve too.
+    """
+    if not model or tiktoken is None:
+        return DEFAULT_ENCODING
+    base = model.split(":")[1] if model.startswith("ft:") else model
+    try:
+        return tiktoken.encoding_name_for_model(base)
+    except KeyError:
+        return DEFAULT_ENCODING
+
+
+class TokenCounter:
+    """Counts text and chat-message tokens for one encoding."""
+
+    def __init__(self, model=None, threads=None):
+        self.threads = threads or os.cpu_count() or 1
+        self._pool = None
+        self.exact = False
+        self.encoding_name = "estimate"
+        self.count_text = estimate_tokens
+        if tiktoken is None:
+            return
+        name = encoding_name_for(model)
+        try:
+            encode = _encoding(name).encode_ordinary
+        except (OSError, ValueError) as e:
+            # The BPE file is downloaded on first use; offline machines estimate
+            print(f"⚠️  tiktoken encoding '{name}' unavailable ({type(e).__name__}); "
+                  "estimating tokens at ~4 chars/token", file=sys.stderr)
+            return
+        self.exact = True
+        self.encoding_name = name
+        self.count_text = lambda text: len(encode(text))
+
+    def count_messages(self, messages, priming=True):
+        """Tokens for a chat message list, including per-message overhead."""
+        if not isinstance(messages, list):
+            return 0
+        count_text = self.count_text
+        total = REPLY_PRIMING_TOKENS if priming else 0
+        for msg in messages:
+            if not isinstance(msg, dict):
+                continue
+            total += TOKENS_PER_MESSAGE
+            for key, value in msg.items():
+                if value is None:
+                    continue
+                if key == "name":
+                    total += TOKENS_PER_NAME
+                if key == "content" and isinstance(value, list):
+                    total += self.count_content_parts(value)
+                    continue
+                value = _as_text(value)  # tool_calls, function_call
+                if value:
+                    total += count_text(value)
+        return total
+
+    def count_content_parts(self, parts):
+        """Tokens for a multi-part content array: text parts plus a flat
+        per-image charge (the base64 of image_url blocks is not text)."""
+        total = 0
+        for part in parts:
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "image_url":
+                image_url = part.get("image_url")
+                detail = image_url.get("detail") if isinstance(image_url, dict) else None
+                total += IMAGE_TOKENS_LOW if detail == "low" else IMAGE_TOKENS
+            elif isinstance(part.get("text"), str):
+                total += self.count_text(part["text"])
+        return total
+
+    def count_record(self, record):
+        """RecordTokens for one SFT/DPO/RFT record (a dict)."""
+        total = preferred = non_preferred = 0
+        for field, value in record.items():
+            if field == "input" and isinstance(value, dict):
+                total += self.count_messages(value.get("messages"))
+            elif field in MESSAGE_LISTS:
+                # DPO outputs are completions: no reply priming of their own
+                n = self.count_messages(value, priming=field == "messages")
+                total += n
+                if field == "preferred_output":
+                    preferred = n
+                elif field == "non_preferred_output":
+                    non_preferred = n
+            elif isinstance(value, (str, int, float)):
+                total += self.count_text(_as_text(value))
+        return RecordTokens(total, preferred, non_preferred)
+
+    def count_records(self, records):
+        """RecordTokens for each record, in order (None for non-dicts)."""
+        def count_chunk(chunk):
+            return [self.count_record(r) if isinstance(r, dict) else None for r in chunk]
+
+        if not self.exact or self.threads == 1 or len(records) < 2 * self.threads:
+            return count_chunk(records)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads)
+        size = -(-len(records) // self.threads)
+        chunks = [records[i:i + size] for i in range(0, len(records), size)]
+        return [counts for part in self._pool.map(count_chunk, chunks) for counts in part]
+
+
+@lru_cache(maxsize=None)
+def get_counter(model=None, threads=None):
+    """Shared TokenCounter per (model, threads) — encoders load once per process."""
+    return TokenCounter(model, threads)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Near-duplicate detection for fine-tuning JSONL files.
+
+Each record's text is normalized, split into word 3-gram shingles and
+summarized by a 128-slot MinHash signature (one-permutation hashing with
+densification: one hash per shingle, so cost is linear in text length).
+Signatures are cut into LSH bands sized for the similarity threshold; two
+records that share any band bucket land in the same duplicate cluster
+(union-find). Exact copies are caught by a full-text digest before LSH.
+Nothing is compared pairwise, so time is linear in the file size.
+
+Memory is not constant: every distinct record keeps one bucket entry per
+band plus its digest, O(records x bands). At the default threshold (9
+bands) that is about 1 KB per record, ~1 GB per million records, more at
+lower thresholds (more bands). Dedup very large files on a prompt or
+response subset (--on), or in pieces, when that does not fit.
+
+Used by engine.py (--dedup, also on validate_sft/dpo/rft.py and
+data_stats.py) or standalone:
+
+Usage:
+  python dedup.py train.jsonl                            # report clusters
+  python dedup.py train.jsonl --on prompt --threshold 0.9
+  python dedup.py train.jsonl --output train.dedup.jsonl # keep first of each cluster
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+from zlib import crc32
+from functools import lru_cache
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from jsonl_io import iter_lines, read_jsonl
+
+NUM_PERM = 128
+SHINGLE_WORDS = 3
+DEFAULT_THRESHOLD = 0.8
+DEDUP_ON = ("record", "prompt", "response")
+
+_MASK64 = (1 << 64) - 1
+_WORD = re.compile(r"\w+")
+_EMPTY = 1 << 64  # bin sentinel, larger than any 64-bit hash
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def _mix64(x):
+    """splitmix64 finalizer: spreads a 64-bit value over all bits."""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & _MASK64
+    return x ^ (x >> 31)
+
+
+def _message_text(messages, roles=None):
+    if not isinstance(messages, list):
+        return []
+    return [str(m["content"]) for m in messages
+            if isinstance(m, dict) and m.get("content") and (roles is None or m.get("role") in roles)]
+
+
+def dedup_text(record, on="record"):
+    """The text compared for `on`: the whole record, the prompt side
+    (everything the model is given) or the response side."""
+    if on == "prompt":
+        if isinstance(record.get("input"), dict):
+            return " ".join(_message_text(record["input"].get("messages")))
+        msgs = record.get("messages")
+        if isinstance(msgs, list) and msgs and isinstance(msgs[-1], dict) and msgs[-1].get("role") == "assistant":
+            msgs = msgs[:-1]
+        return " ".join(_message_text(msgs))
+    if on == "response":
+        if "preferred_output" in record:
+            return " ".join(_message_text(record["preferred_output"]))
+        msgs = record.get("messages")
+        texts = _message_text(msgs, roles={"assistant"})
+        if not texts and isinstance(msgs, list):
+            # RFT: no assistant turn; the grader reference is the "response"
+            texts = [str(v) for k, v in sorted(record.items()) if k != "messages"]
+        return " ".join(texts)
+    texts = []
+    for field, value in record.items():
+        if field == "input" and isinstance(value, dict):
+            texts += _message_text(value.get("messages"))
+        elif isinstance(value, list):
+            texts += _message_text(value)
+        elif isinstance(value, (str, int, float)):
+            texts.append(str(value))
+    return " ".join(texts)
+
+
+def shingle_hashes(words):
+    """Hashes of the word SHINGLE_WORDS-grams (the whole text if shorter):
+    crc32 of the shingle spread to 64 bits by a Fibonacci multiply."""
+    if len(words) < SHINGLE_WORDS:
+        shingles = [" ".join(words)]
+    else:
+        shingles = map(" ".join, zip(words, words[1:], words[2:]))
+    return {crc32(s.encode("utf-8")) * _GOLDEN & _MASK64 for s in shingles}
+
+
+@lru_cache(maxsize=None)
+def _probe_orders(num_perm):
+    """For each bin, the other bins in a fixed pseudo-random order."""
+    return [sorted(range(num_perm), key=lambda j: _mix64(i * num_perm + j)) for i in range(num_perm)]
+
+
+def minhash(hashes, num_perm=NUM_PERM):
+    """One-permutation MinHash: the minimum per hash bin; an empty bin
+    borrows from the first non-empty bin in its own random probe order
+    ("optimal" densification — unlike rotation, neighbouring empty bins do
+    not all copy the same value, which keeps short texts from colliding)."""
+    bins = [_EMPTY] * num_perm
+    for h in hashes:
+        i = h % num_perm
+        v = h // num_perm
+        if v < bins[i]:
+            bins[i] = v
+    if _EMPTY not in bins or not hashes:
+        return tuple(bins)
+    probes = _probe_orders(num_perm)
+    return tuple(v if v != _EMPTY else next(bins[j] for j in probes[i] if bins[j] != _EMPTY)
+                 for i, v in enumerate(bins))
+
+
+@lru_cache(maxsize=None)
+def optimal_bands(threshold, num_perm=NUM_PERM, steps=40):
+    """(bands, rows) minimizing false positive + false negative area around
+    `threshold` for b*r <= num_perm."""
+    def prob(s, b, r):
+        return 1 - (1 - s ** r) ** b
+
+    def area(lo, hi, f):
+        width = (hi - lo) / steps
+        return sum(f(lo + (k + 0.5) * width) for k in range(steps)) * width
+
+    best, best_err = (1, num_perm), None
+    for b in range(1, num_perm + 1):
+        for r in range(1, num_perm // b + 1):
+            fp = area(0.0, threshold, lambda s: prob(s, b, r))
+            fn = area(threshold, 1.0, lambda s: 1 - prob(s, b, r))
+            if best_err is None or fp + fn < best_err:
+                best, best_err = (b, r), fp + fn
+    return best
+
+
+class NearDuplicateIndex:
+    """Streaming duplicate clustering keyed by line number."""
+
+    def __init__(self, on="record", threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM):
+        self.on = on
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        # O(records x bands) memory: see the module docstring
+        self.buckets = [{} for _ in range(self.bands)]  # band hash -> first line
+        self.digests = {}   # exact normalized-text digest -> first line
+        self.parent = {}    # union-find over lines that matched something
+        self.records = 0
+        self.exact_copies = 0
+
+    def _find(self, x):
+        parent = self.parent
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def _union(self, a, b):
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            # the earliest line stays the root: it is the one dedup keeps
+            lo, hi = min(ra, rb), max(ra, rb)
+            self.parent[hi] = lo
+            self.parent.setdefault(lo, lo)
+
+    def add(self, line_num, record):
+        words = _WORD.findall(dedup_text(record, self.on).lower())
+        if not words:
+            return
+        self.records += 1
+        digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+        first = self.digests.setdefault(digest, line_num)
+        if first != line_num:
+            self.exact_copies += 1
+            self._union(first, line_num)
+            return
+        sig = minhash(shingle_hashes(words), self.num_perm)
+        rows = self.rows
+        for band, buckets in enumerate(self.buckets):
+            key = hash(sig[band * rows:(band + 1) * rows])
+            first = buckets.setdefault(key, line_num)
+            if first != line_num:
+                self._union(first, line_num)
+
+    def merge(self, other):
+        """Absorb the index of a later shard of the same file."""
+        self.records += other.records
+        self.exact_copies += other.exact_copies
+        for digest, line in other.digests.items():
+            first = self.digests.setdefault(digest, line)
+            if first != line:
+                self.exact_copies += 1
+                self._union(first, line)
+        for mine, theirs in zip(self.buckets, other.buckets):
+            for key, line in theirs.items():
+                first = mine.setdefault(key, line)
+                if first != line:
+                    self._union(first, line)
+        for line in other.parent:
+            self._union(other._find(line), line)
+
+    def clusters(self):
+        """Duplicate clusters as sorted line lists, largest first."""
+        groups = {}
+        for line in list(self.parent):
+            groups.setdefault(self._find(line), []).append(line)
+        return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
+
+    def duplicate_lines(self):
+        """Every clustered line except the first of its cluster."""
+        return {line for line in self.parent if self._find(line) != line}
+
+    def summary(self):
+        """One-line warning text, or None when there are no duplicates."""
+        clusters = self.clusters()
+        if not clusters:
+            return None
+        extra = sum(len(c) - 1 for c in clusters)
+        return (f"{extra} record(s) duplicate an earlier record ({self.on} text, "
+                f"≥{self.threshold:.0%} similar) across {len(clusters)} cluster(s) — "
+                f"e.g. lines {', '.join(map(str, clusters[0][:5]))}")
+
+
+def print_duplicate_report(index, top=10):
+    clusters = index.clusters()
+    extra = sum(len(c) - 1 for c in clusters)
+    print(f"\n{'='*60}")
+    print(f"Duplicate Report ({index.on} text, threshold {index.threshold}, "
+          f"{index.bands} bands × {index.rows} rows)")
+    print(f"{'='*60}")
+    print(f"Records compared:   {index.records}")
+    print(f"Exact copies:       {index.exact_copies}")
+    print(f"Duplicate clusters: {len(clusters)}")
+    print(f"Removable records:  {extra}")
+    if clusters:
+        print(f"\nLargest clusters (line numbers):")
+        for cluster in clusters[:top]:
+            more = f" ... (+{len(cluster) - 8})" if len(cluster) > 8 else ""
+            print(f"  • {len(cluster)} records: {', '.join(map(str, cluster[:8]))}{more}")
+        if len(clusters) > top:
+            print(f"  ... and {len(clusters) - top} more clusters")
+    else:
+        print(f"\n✅ No duplicates found.")
+
+
+def write_deduplicated(filepath, output, drop_lines):
+    """Copy `filepath` to `output` byte-for-byte, minus `drop_lines` and
+    blank lines. Returns the number of lines written."""
+    written = 0
+    with open(output, "wb") as out:
+        for line_num, raw in iter_lines(filepath):
+            if raw.strip() and line_num not in drop_lines:
+                out.write(raw + b"\n")
+                written += 1
+    return written
+
+
+def find_duplicates(filepath, on="record", threshold=DEFAULT_THRESHOLD):
+    """Build a NearDuplicateIndex over every valid record of `filepath`."""
+    index = NearDuplicateIndex(on=on, threshold=threshold)
+    for line_num, record in read_jsonl(filepath):
+        if isinstance(record, dict):
+            index.add(line_num, record)
+    return index
+
+
+def add_dedup_arguments(parser):
+    parser.add_argument("--dedup", nargs="?", const="record", choices=DEDUP_ON, default=None,
+                        help="Detect near-duplicate records by their record (default), prompt or "
+                             "response text")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Jaccard similarity counted as duplicate (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--dedup-output", default=None,
+                        help="Write a copy without duplicates (first of each cluster kept); implies --dedup")
+
+
+def dedup_options(args):
+    """NearDuplicateIndex kwargs from add_dedup_arguments() args, or None."""
+    if not (args.dedup or args.dedup_output):
+        return None
+    return {"on": args.dedup or "record", "threshold": args.dedup_threshold}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find near-duplicate records in a fine-tuning JSONL file.")
+    parser.add_argument("filepath", help="Path to the JSONL file")
+    parser.add_argument("--on", choices=DEDUP_ON, default="record",
+                        help="Text to compare: whole record (default), prompt or response")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Jaccard similarity counted as duplicate (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--output", default=None, help="Write a deduplicated copy here")
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.filepath):
+        print(f"❌ File not found: {args.filepath}")
+        sys.exit(1)
+    index = find_duplicates(args.filepath, on=args.on, threshold=args.threshold)
+    print_duplicate_report(index)
+    if args.output:
+        written = write_deduplicated(args.filepath, args.output, index.duplicate_lines())
+        print(f"\n💾 Wrote {written} records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1231 @@
+#!/usr/bin/env python3
+"""Single-pass validation engine for SFT, DPO and RFT JSONL files.
+
+Reads a file once. Every record goes through the rule set for the file's
+format (SFTRules, DPORules, RFTRules) and through DatasetStats, so the
+validation report and the data_stats report come from the same pass. The
+format is detected per file by majority vote over the first records, not
+from line 1 alone. All per-file state is constant-memory (streaming_stats.py):
+running min/max/mean, a percentile sketch, bottom-k distinct samples and
+bounded issue logs, so multi-million-row files profile in flat memory.
+
+validate_sft.py, validate_dpo.py, validate_rft.py and data_stats.py are thin
+wrappers over this module.
+
+Usage:
+  python engine.py train.jsonl                       # auto-detect, validate + stats
+  python engine.py train.jsonl --format rft --expected-field answer
+  python engine.py train.jsonl --no-stats
+  python engine.py big.jsonl --workers 8             # shard across 8 processes
+  python engine.py train.jsonl --risk-terms terms.json  # custom content-risk dictionary
+  python engine.py train.jsonl --incremental --json  # re-check changed chunks, JSON report
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import pickle
+import sys
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import _cache_dir
+from jsonl_io import ParseError, content_chunks, count_lines, iter_lines, parse_line, shard_ranges
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from token_count import BATCH_SIZE, get_counter
+from streaming_stats import DistinctSample, IssueLog, QuantileSketch, RunningStats
+from risk_scan import DEFAULT_TERMS, RiskScanner, add_risk_arguments, format_hits, scanner_from_args
+from image_check import ImageChecker, MAX_IMAGE_EXAMPLES, MAX_IMAGES_PER_EXAMPLE, MIN_VISION_EXAMPLES
+from tool_check import ToolChecker
+from length_profile import LengthProfile
+from heavy_hitters import RepeatedContent
+from dedup import (NearDuplicateIndex, add_dedup_arguments, dedup_options, print_duplicate_report,
+                   write_deduplicated)
+
+
+FORMATS = ("SFT", "DPO", "RFT")
+DETECT_SAMPLE = 100  # records buffered to vote on the format
+MIN_SHARD_BYTES = 16 * 1024 * 1024  # below this, a worker costs more than it saves
+CACHE_SUFFIX = ".ftcache"  # --incremental caches, in <local cache dir>/validation/ by default
+CACHE_KEY_FILE = "validation-cache.key"  # per-user secret signing every incremental cache
+_CACHE_MAGIC = b"FTCACHE1"
+# A code change in any of these invalidates every incremental cache
+_CACHED_MODULES = ("engine.py", "streaming_stats.py", "risk_scan.py", "dedup.py", "image_check.py",
+                   "tool_check.py", "length_profile.py",
+                   "heavy_hitters.py", "../token_count.py", "../jsonl_io.py")
+
+VALID_ROLES = {"system", "user", "assistant", "tool"}
+
+RISKY_PHRASES = DEFAULT_TERMS["phrases"]["reasoning-elicitation"]
+
+
+def extract_text(record: dict) -> str:
+    """Extract all text content from a record regardless of format."""
+    texts = []
+    if "messages" in record:
+        for msg in record["messages"]:
+            if "content" in msg and msg["content"]:
+                texts.append(str(msg["content"]))
+    if "input" in record and "messages" in record["input"]:
+        for msg in record["input"]["messages"]:
+            if "content" in msg and msg["content"]:
+                texts.append(str(msg["content"]))
+    for field in ["preferred_output", "non_preferred_output"]:
+        if field in record:
+            for msg in record[field]:
+                if "content" in msg and msg["content"]:
+                    texts.append(str(msg["content"]))
+    # Include any extra fields beyond messages/input/preferred_output/non_preferred_output
+    known_structural = {"messages", "input", "preferred_output", "non_preferred_output"}
+    for field in record:
+        if field not in known_structural and isinstance(record[field], (str, int, float)):
+            texts.append(str(record[field]))
+    return " ".join(texts)
+
+
+def detect_record_format(record):
+    """Classify one record as "SFT", "DPO", "RFT", or None."""
+    if not isinstance(record, dict):
+        return None
+    if "input" in record and "preferred_output" in record:
+        return "DPO"
+    if "messages" in record:
+        msgs = record["messages"]
+        extra_fields = set(record.keys()) - {"messages"}
+        last = msgs[-1] if isinstance(msgs, list) and msgs else None
+        last_role = last.get("role") if isinstance(last, dict) else None
+        return "RFT" if extra_fields and last_role == "user" else "SFT"
+    return None
+
+
+def detect_format(records):
+    """Majority format over `records`, or None if none is recognizable."""
+    votes = Counter(f for f in map(detect_record_format, records) if f)
+    return votes.most_common(1)[0][0] if votes else None
+
+
+def _sketch_summary(sketch):
+    if not sketch:
+        return None
+    summary = {"total": sketch.total, "mean": round(sketch.mean, 1), "min": sketch.min, "max": sketch.max}
+    if isinstance(sketch, QuantileSketch):
+        for q in (50, 90, 99):
+            summary[f"p{q}"] = round(sketch.quantile(q / 100))
+    return summary
+
+
+def _issues_summary(issues):
+    return {"total": issues.total, "by_type": dict(issues.categories.most_common()), "samples": list(issues)}
+
+
+class ValidationResult:
+    """Everything one pass over a file produced: issues, counts, stats."""
+
+    def __init__(self, filepath, fmt=None, counter=None):
+        self.filepath = filepath
+        self.format = fmt
+        self.tokens_exact = counter.exact if counter else False
+        self.token_encoding = counter.encoding_name if counter else "estimate"
+        self.rules = None
+        self.stats = None
+        self.duplicates = None  # dedup.NearDuplicateIndex when dedup is on
+        self.total = 0         # non-blank lines
+        self.parse_errors = 0
+        self.errors = IssueLog()
+        self.warnings = IssueLog()
+        self.cache = None  # {"path", "chunks", "reused"} after an incremental run
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        """The reports as JSON-serializable data (engine.py --json)."""
+        report = {
+            "file": self.filepath,
+            "format": self.format,
+            "ok": self.ok,
+            "records": self.total,
+            "parse_errors": self.parse_errors,
+            "tokens": {"exact": self.tokens_exact, "encoding": self.token_encoding},
+            "errors": _issues_summary(self.errors),
+            "warnings": _issues_summary(self.warnings),
+        }
+        if self.rules is not None:
+            report["rules"] = self.rules.summary()
+        if self.stats is not None:
+            report["stats"] = self.stats.summary()
+        if self.duplicates is not None:
+            clusters = self.duplicates.clusters()
+            report["duplicates"] = {
+                "on": self.duplicates.on,
+                "threshold": self.duplicates.threshold,
+                "exact_copies": self.duplicates.exact_copies,
+                "clusters": len(clusters),
+                "removable": sum(len(c) - 1 for c in clusters),
+                "largest": clusters[:10],
+            }
+        if self.cache is not None:
+            report["cache"] = self.cache
+        return report
+
+
+# ── Rule sets ────────────────────────────────────────────────────────────────
+
+class RuleSet:
+    """Checks for one dataset format.
+
+    check() sees every parsed record (plus its raw line bytes and its
+    token_count.RecordTokens); finish() runs
+    cross-record checks once the file is done. With --workers each shard gets
+    its own instance and merge() folds them together, in file order, before
+    finish(). print_summary()/print_tips() add the format's sections to the
+    validation report. A rule set given a risk_scan.RiskScanner also warns
+    about content-moderation trigger phrases via scan().
+    """
+
+    name = ""
+    scanner = None
+
+    def check(self, line_num, record, raw, result, tokens):
+        raise NotImplementedError
+
+    def scan(self, line_num, record, raw, result):
+        if self.scanner is None:
+            return
+        hits = self.scanner.scan_line(raw, record)
+        if hits:
+            result.warnings.append(
+                f"Line {line_num}: Contains {format_hits(hits)} — may trigger Azure content moderation filter.")
+
+    def flush(self, result):
+        """End of a pass over a file or shard: report checks still running in the background."""
+
+    def merge(self, other):
+        """Absorb the cross-record state of `other`, the rules of the next shard."""
+
+    def finish(self, result):
+        pass
+
+    def summary(self):
+        """The print_summary() figures as a dict, for the JSON report."""
+        return {}
+
+    def print_summary(self, result):
+        pass
+
+    def print_tips(self, result):
+        pass
+
+
+class SFTRules(RuleSet):
+    """Message structure, token length and system prompt consistency.
+
+    Multi-part content arrays are checked block by block; image_url blocks
+    go through image_check.py (vision fine-tuning limits). fetch_images
+    also probes public image URLs, url_threads at a time. Records with
+    tools, tool_calls or tool messages go through tool_check.py: arguments
+    are validated against the declared schemas and every tool reply must
+    answer an issued call.
+    """
+
+    name = "SFT"
+
+    def __init__(self, scanner=None, fetch_images=False, url_threads=16):
+        self.scanner = scanner
+        self.token_counts = QuantileSketch()
+        self.system_prompts = DistinctSample()
+        self.image_checker = ImageChecker(fetch_images, url_threads)
+        self.image_examples = 0
+        self.image_count = 0
+        self.image_formats = Counter()
+        self.tool_checker = ToolChecker()
+
+    def check(self, line_num, record, raw, result, tokens):
+        self.scan(line_num, record, raw, result)
+        if "messages" not in record:
+            result.errors.append(f"Line {line_num}: Missing 'messages' field")
+            return
+
+        messages = record["messages"]
+        if not isinstance(messages, list) or len(messages) == 0:
+            result.errors.append(f"Line {line_num}: 'messages' must be a non-empty array")
+            return
+
+        roles_found = set()
+        images = 0
+        tools = False
+        for i, msg in enumerate(messages):
+            if "role" not in msg:
+                result.errors.append(f"Line {line_num}, message {i}: Missing 'role'")
+            elif msg["role"] not in VALID_ROLES:
+                result.errors.append(
+                    f"Line {line_num}, message {i}: Invalid role '{msg['role']}' (expected: {VALID_ROLES})")
+            else:
+                roles_found.add(msg["role"])
+            tools = tools or "tool_calls" in msg or msg.get("role") == "tool"
+
+            if "content" not in msg and "tool_calls" not in msg:
+                result.errors.append(f"Line {line_num}, message {i}: Missing 'content' (and no 'tool_calls')")
+            elif isinstance(msg.get("content"), list):
+                images += self.check_parts(f"Line {line_num}, message {i}", msg, result)
+            elif "content" in msg and msg["content"] is not None:
+                content = str(msg["content"])
+                if not content.strip():
+                    result.warnings.append(f"Line {line_num}, message {i}: Empty content string")
+
+                if msg.get("role") == "system":
+                    self.system_prompts.add(content.strip()[:100])
+
+        if tools or "tools" in record:
+            for where, level, message in self.tool_checker.check(messages, record.get("tools")):
+                issues = result.errors if level == "error" else result.warnings
+                issues.append(f"Line {line_num}{where}: {message}")
+        if "user" not in roles_found:
+            result.errors.append(f"Line {line_num}: No 'user' message found")
+        if "assistant" not in roles_found:
+            result.errors.append(f"Line {line_num}: No 'assistant' message found")
+        if images:
+            self.image_examples += 1
+            self.image_count += images
+            if images > MAX_IMAGES_PER_EXAMPLE:
+                result.errors.append(
+                    f"Line {line_num}: {images} images (max {MAX_IMAGES_PER_EXAMPLE} per example)")
+        self.report_images(result, self.image_checker.results())
+
+        self.token_counts.add(tokens.total)
+        if tokens.total > 4096:
+            approx = "" if result.tokens_exact else "~"
+            result.warnings.append(
+                f"Line {line_num}: {approx}{tokens.total} tokens (exceeds 4096 limit for most models)")
+
+    def check_parts(self, where, msg, result):
+        """Check a content array; returns its number of image blocks."""
+        parts = msg["content"]
+        if not parts:
+            result.warnings.append(f"{where}: Empty content array")
+        images = 0
+        for j, part in enumerate(parts):
+            kind = part.get("type") if isinstance(part, dict) else None
+            if kind == "text":
+                if not isinstance(part.get("text"), str):
+                    result.errors.append(f"{where}, part {j}: 'text' block without a string 'text'")
+            elif kind == "image_url":
+                images += 1
+                if msg.get("role") != "user":
+                    result.errors.append(
+                        f"{where}, part {j}: Image in a '{msg.get('role')}' message — images are only "
+                        "allowed in 'user' messages")
+                label = f"{where}, image {images}"
+                self.report_images(result, [(label,) + self.image_checker.check(label, part)])
+            else:
+                result.errors.append(
+                    f"{where}, part {j}: Unsupported content block type '{kind}' (expected: text, image_url)")
+        return images
+
+    def report_images(self, result, checked):
+        for label, info, issues in checked:
+            if info is not None and info.format:
+                self.image_formats[info.format] += 1
+            for level, message in issues:
+                (result.errors if level == "error" else result.warnings).append(f"{label}: {message}")
+
+    def flush(self, result):
+        self.report_images(result, self.image_checker.results(wait=True))
+
+    def merge(self, other):
+        self.token_counts.merge(other.token_counts)
+        self.system_prompts.merge(other.system_prompts)
+        self.image_examples += other.image_examples
+        self.image_count += other.image_count
+        self.image_formats.update(other.image_formats)
+        self.tool_checker.merge(other.tool_checker)
+
+    def finish(self, result):
+        if len(self.system_prompts) > 1:
+            result.warnings.append(
+                f"Found {len(self.system_prompts)} different system prompts — ensure this is intentional")
+        if self.image_examples > MAX_IMAGE_EXAMPLES:
+            result.errors.append(
+                f"{self.image_examples:,} examples with images (max {MAX_IMAGE_EXAMPLES:,} per training file)")
+        if self.image_examples and result.total < MIN_VISION_EXAMPLES:
+            result.warnings.append(
+                f"Only {result.total} examples — vision fine-tuning needs at least {MIN_VISION_EXAMPLES}")
+
+    def summary(self):
+        return {"tokens": _sketch_summary(self.token_counts), "system_prompts": len(self.system_prompts),
+                "images": {"count": self.image_count, "examples": self.image_examples,
+                           "formats": dict(self.image_formats.most_common())},
+                "tools": self.tool_checker.summary()}
+
+    def print_summary(self, result):
+        tokens = self.token_counts
+        if tokens:
+            print(f"\nToken stats ({_token_basis(result)}):")
+            print(f"  Avg: {tokens.mean:.0f}  Min: {tokens.min}  Max: {tokens.max}")
+            print(f"  P50: {tokens.quantile(0.5):.0f}  P90: {tokens.quantile(0.9):.0f}  "
+                  f"P99: {tokens.quantile(0.99):.0f}")
+            print(f"  Total: {tokens.total:,}")
+        if self.system_prompts:
+            print(f"\nSystem prompts: {len(self.system_prompts)} unique")
+        if self.image_count:
+            formats = ", ".join(f"{fmt} {n}" for fmt, n in self.image_formats.most_common())
+            print(f"\nImages: {self.image_count} in {self.image_examples} examples"
+                  + (f" ({formats})" if formats else ""))
+        tools = self.tool_checker
+        if tools.records:
+            functions = ", ".join(f"{name} {n}" for name, n in tools.functions.most_common(5))
+            print(f"\nTool calls: {tools.tool_calls} ({tools.tool_replies} replies) in {tools.records} examples"
+                  + (f" — {functions}" if functions else ""))
+
+
+class DPORules(RuleSet):
+    """input / preferred_output / non_preferred_output structure."""
+
+    name = "DPO"
+
+    def __init__(self, scanner=None):
+        self.scanner = scanner
+
+    def check(self, line_num, record, raw, result, tokens):
+        self.scan(line_num, record, raw, result)
+        for field in ["input", "preferred_output", "non_preferred_output"]:
+            if field not in record:
+                result.errors.append(f"Line {line_num}: Missing '{field}' field")
+
+        if "input" not in record:
+            return
+
+        inp = record["input"]
+        if "messages" not in inp:
+            result.errors.append(f"Line {line_num}: 'input' missing 'messages' field")
+        else:
+            msgs = inp["messages"]
+            if not any(m.get("role") == "user" for m in msgs):
+                result.errors.append(f"Line {line_num}: 'input.messages' has no 'user' message")
+
+        for output_field in ["preferred_output", "non_preferred_output"]:
+            if output_field in record:
+                out = record[output_field]
+                if not isinstance(out, list) or len(out) == 0:
+                    result.errors.append(f"Line {line_num}: '{output_field}' must be a non-empty array")
+                elif not any(m.get("role") == "assistant" for m in out):
+                    result.errors.append(f"Line {line_num}: '{output_field}' has no 'assistant' message")
+
+        if "preferred_output" in record and "non_preferred_output" in record:
+            if record["preferred_output"] == record["non_preferred_output"]:
+                result.warnings.append(f"Line {line_num}: preferred and non_preferred outputs are identical")
+
+    def print_summary(self, result):
+        # DPO-specific guidance from our experiments
+        total = result.total
+        if total < 500 and total > 0:
+            print(f"\n⚠️  DPO tip: With {total} pairs, use n_epochs=1-2 max (Azure defaults to 3, "
+                  "which causes overtraining on small datasets).")
+        if total > 0:
+            print(f"\n💡 DPO tip: If your base model already scores >9/10 on this task, DPO may hurt more than help.")
+
+
+class RFTRules(RuleSet):
+    """Last-user-message, grader fields, escaping, moderation risk, diversity."""
+
+    name = "RFT"
+
+    def __init__(self, expected_field=None, scanner=None):
+        self.expected_field = expected_field
+        self.scanner = scanner or RiskScanner()  # always on for RFT
+        self.schemas = {}  # frozenset of grader fields -> [first line, count]
+        self.field_counts = Counter()
+        self.grader_values = DistinctSample()
+        self.grader_value_lengths = RunningStats()
+
+    def check(self, line_num, record, raw, result, tokens):
+        errors, warnings = result.errors, result.warnings
+        if "messages" not in record:
+            errors.append(f"Line {line_num}: Missing 'messages' field")
+        else:
+            msgs = record["messages"]
+            if not isinstance(msgs, list) or len(msgs) == 0:
+                errors.append(f"Line {line_num}: 'messages' must be a non-empty array")
+            elif not any(m.get("role") == "user" for m in msgs):
+                errors.append(f"Line {line_num}: 'messages' has no 'user' message")
+            elif msgs[-1].get("role") != "user":
+                errors.append(
+                    f"Line {line_num}: Last message must be 'user' role for RFT "
+                    f"(found '{msgs[-1].get('role')}') — unlike SFT, the model generates its own response"
+                )
+
+        # Detect extra fields (grader fields) beyond 'messages'
+        extra_fields = set(record.keys()) - {"messages"}
+        if extra_fields:
+            schema = self.schemas.setdefault(frozenset(extra_fields), [line_num, 0])
+            schema[1] += 1
+        self.field_counts.update(extra_fields)
+
+        expected_field = self.expected_field
+        if expected_field:
+            if expected_field not in record:
+                errors.append(f"Line {line_num}: Missing expected field '{expected_field}'")
+            else:
+                val = str(record[expected_field]).strip()
+                if not val:
+                    errors.append(f"Line {line_num}: '{expected_field}' is empty")
+                else:
+                    self.add_grader_value(val)
+        elif not extra_fields:
+            errors.append(
+                f"Line {line_num}: No grader fields found — RFT requires at least "
+                "one field beyond 'messages' (e.g. 'answer', 'reference_code')"
+            )
+        else:
+            # Collect values from extra fields for diversity check
+            for field in sorted(extra_fields):
+                val = str(record[field]).strip()
+                if val:
+                    self.add_grader_value(val)
+
+            # Check for unescaped newlines in extra fields (CRITICAL platform gotcha)
+            # Instead of regex-parsing the raw JSON line (which risks catastrophic
+            # backtracking), we compare the parsed value against the raw line to
+            # detect single-escaped \n that should be double-escaped \\n.
+            raw_line = None
+            for field in extra_fields:
+                parsed_val = str(record.get(field, ""))
+                if "\n" in parsed_val:
+                    # The parsed value contains actual newlines — check if the raw
+                    # JSON has them properly double-escaped
+                    if raw_line is None:
+                        raw_line = raw.decode("utf-8", errors="replace")
+                    field_needle = f'"{field}"'
+                    if field_needle in raw_line:
+                        field_start = raw_line.index(field_needle)
+                        field_region = raw_line[field_start:field_start + 500]
+                        # Single-escaped \n in raw JSON (not \\n) means the source
+                        # code newlines aren't properly escaped for the platform
+                        if "\\n" in field_region and "\\\\n" not in field_region:
+                            warnings.append(
+                                f"Line {line_num}: '{field}' contains \\n sequences — "
+                                "if this is grader source code embedded in JSON, "
+                                "ensure newlines are escaped as \\\\n."
+                            )
+
+        # Content moderation risk
+        self.scan(line_num, record, raw, result)
+
+    def add_grader_value(self, val):
+        self.grader_values.add(val)
+        self.grader_value_lengths.add(len(val))
+
+    def merge(self, other):
+        for schema, (first_line, count) in other.schemas.items():
+            mine = self.schemas.setdefault(schema, [first_line, 0])
+            mine[1] += count
+        self.field_counts.update(other.field_counts)
+        self.grader_values.merge(other.grader_values)
+        self.grader_value_lengths.merge(other.grader_value_lengths)
+
+    def finish(self, result):
+        # Check for inconsistent extra-field schemas across examples
+        if len(self.schemas) > 1:
+            (first_line, _), first_schema = min((v, k) for k, v in self.schemas.items())
+            others = [v for k, v in self.schemas.items() if k != first_schema]
+            inconsistent = sum(count for _, count in others)
+            result.warnings.append(
+                f"Inconsistent grader fields across examples — "
+                f"line {first_line} has {sorted(first_schema)}, but {inconsistent} "
+                f"line(s) differ (e.g. line {min(ln for ln, _ in others)}). "
+                "Ensure your grader handles all field variants."
+            )
+
+        # Diversity check
+        if self.grader_values:
+            if self.grader_values.count() == 1:
+                result.warnings.append(
+                    f"All grader field values are identical ('{self.grader_values.sample(1)[0][:50]}...') — "
+                    "grader may not learn effectively"
+                )
+            avg_len = self.grader_value_lengths.mean
+            if avg_len > 500:
+                result.warnings.append(
+                    f"Average grader field value length is {avg_len:.0f} chars — "
+                    "consider using a model_grader instead of string_check"
+                )
+
+    def summary(self):
+        return {"grader_fields": dict(self.field_counts.most_common())}
+
+    def print_summary(self, result):
+        if self.field_counts:
+            print(f"\nGrader fields found:")
+            for field, count in self.field_counts.most_common():
+                print(f"  • '{field}' — in {count}/{result.total} records")
+
+    def print_tips(self, result):
+        if result.total > 0:
+            print(f"\n💡 RFT tips:")
+            print(f"  • Ensure your training grader matches your eval grader (alignment gotcha)")
+            print(f"  • Start with reasoning_effort='medium', pass_threshold=0.5")
+            print(f"  • RFT is primarily for o-series models (o4-mini). "
+                  "Check Azure docs for the latest supported model list.")
+
+
+def make_rules(fmt, expected_field=None, scanner=None):
+    """Build the rule set for "SFT", "DPO" or "RFT".
+
+    scanner: RiskScanner for the content-risk scan (RFT uses the built-in
+    dictionary when None; SFT/DPO only scan when given one).
+    """
+    fmt = fmt.upper()
+    if fmt == "SFT":
+        return SFTRules(scanner)
+    if fmt == "DPO":
+        return DPORules(scanner)
+    if fmt == "RFT":
+        return RFTRules(expected_field=expected_field, scanner=scanner)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+# ── Stats ────────────────────────────────────────────────────────────────────
+
+class DatasetStats:
+    """The data_stats report, accumulated record by record in constant memory.
+
+    Optional sections, named in `extras`: "profile" also keeps every
+    length for the length_profile.py report (4 bytes per value);
+    "repeats" counts the most repeated responses, system prompts and
+    phrases (heavy_hitters.py, fixed memory).
+    """
+
+    def __init__(self, fmt, extras=(), model=None):
+        self.format = fmt
+        self.profile = LengthProfile(fmt, model) if "profile" in extras else None
+        self.repeats = RepeatedContent() if "repeats" in extras else None
+        self.records = 0
+        self.token_counts = QuantileSketch()
+        self.role_counts = Counter()
+        self.has_system = 0
+        self.pref_tokens = RunningStats()
+        self.non_pref_tokens = RunningStats()
+        self.grader_field_counts = Counter()
+        self.grader_values = DistinctSample()
+        self.grader_value_lengths = RunningStats()
+
+    def add(self, record, tokens):
+        self.records += 1
+        self.token_counts.add(tokens.total)
+        if self.profile is not None:
+            self.profile.add(record, tokens)
+        if self.repeats is not None:
+            self.repeats.add(record)
+        if self.format == "SFT":
+            msgs = record.get("messages", [])
+            for msg in msgs:
+                self.role_counts[msg.get("role", "unknown")] += 1
+            if any(m.get("role") == "system" for m in msgs):
+                self.has_system += 1
+        elif self.format == "DPO":
+            self.pref_tokens.add(tokens.preferred)
+            self.non_pref_tokens.add(tokens.non_preferred)
+        elif self.format == "RFT":
+            extra = set(record.keys()) - {"messages"}
+            self.grader_field_counts.update(extra)
+            for field in sorted(extra):
+                value = str(record[field])
+                self.grader_values.add(value)
+                self.grader_value_lengths.add(len(value))
+
+    def merge(self, other):
+        self.records += other.records
+        self.token_counts.merge(other.token_counts)
+        self.role_counts.update(other.role_counts)
+        self.has_system += other.has_system
+        self.pref_tokens.merge(other.pref_tokens)
+        self.non_pref_tokens.merge(other.non_pref_tokens)
+        self.grader_field_counts.update(other.grader_field_counts)
+        self.grader_values.merge(other.grader_values)
+        self.grader_value_lengths.merge(other.grader_value_lengths)
+        if self.profile is not None:
+            self.profile.merge(other.profile)
+        if self.repeats is not None:
+            self.repeats.merge(other.repeats)
+
+    def summary(self):
+        """The print_stats_report() figures as a dict, for the JSON report."""
+        summary = {"format": self.format, "records": self.records, "tokens": _sketch_summary(self.token_counts)}
+        if self.format == "SFT":
+            summary["roles"] = dict(self.role_counts.most_common())
+            summary["with_system_message"] = self.has_system
+        elif self.format == "DPO":
+            summary["preferred_tokens"] = _sketch_summary(self.pref_tokens)
+            summary["non_preferred_tokens"] = _sketch_summary(self.non_pref_tokens)
+        elif self.format == "RFT":
+            summary["grader_fields"] = dict(self.grader_field_counts.most_common())
+            summary["grader_values"] = {"unique": self.grader_values.count(), "exact": self.grader_values.exact,
+                                        "length": _sketch_summary(self.grader_value_lengths)}
+        if self.profile is not None:
+            summary["profile"] = self.profile.summary()
+        if self.repeats is not None:
+            summary["repeats"] = self.repeats.summary()
+        return summary
+
+
+# ── Engine ───────────────────────────────────────────────────────────────────
+
+def _stats_extras(collect_stats):
+    """The optional DatasetStats sections requested by collect_stats."""
+    if isinstance(collect_stats, str):
+        return (collect_stats,)
+    return tuple(collect_stats) if isinstance(collect_stats, (tuple, list)) else ()
+
+
+def _detect_pending(pending):
+    return detect_format(item[1] for item in pending if not isinstance(item[1], ParseError))
+
+
+def _read_records(filepath, counter, start=0, end=None, line_offset=0):
+    """Yield (line_num, record, raw, tokens) for non-blank lines.
+
+    Lines are parsed and token-counted BATCH_SIZE at a time so the counter
+    can spread encoding over its threads; tokens is None for unparseable
+    lines and non-object records.
+    """
+    batch = []
+    for line_num, raw in iter_lines(filepath, start=start, end=end, line_no=line_offset):
+        if not raw.strip():
+            continue
+        batch.append((line_num, parse_line(line_num, raw), raw))
+        if len(batch) >= BATCH_SIZE:
+            yield from _count_batch(batch, counter)
+            batch = []
+    if batch:
+        yield from _count_batch(batch, counter)
+
+
+def _count_batch(batch, counter):
+    counts = counter.count_records([record for _, record, _ in batch])
+    for (line_num, record, raw), tokens in zip(batch, counts):
+        yield line_num, record, raw, tokens
+
+
+def _check_record(result, line_num, record, raw, tokens):
+    if isinstance(record, ParseError):
+        result.errors.append(f"Line {line_num}: Invalid JSON — {record}")
+        return
+    if not isinstance(record, dict):
+        result.errors.append(f"Line {line_num}: Record must be a JSON object")
+        return
+    if result.rules is not None:
+        result.rules.check(line_num, record, raw, result, tokens)
+    if result.stats is not None:
+        result.stats.add(record, tokens)
+    if result.duplicates is not None:
+        result.duplicates.add(line_num, record)
+
+
+def _new_duplicate_index(dedup):
+    return NearDuplicateIndex(**dedup) if dedup is not None else None
+
+
+def _flush(result):
+    """End of one pass (a whole file or one shard)."""
+    if result.rules is not None:
+        result.rules.flush(result)
+
+
+def _finish(result):
+    """Cross-record checks, once the whole file has been seen."""
+    if result.rules is not None:
+        result.rules.finish(result)
+    if result.duplicates is not None:
+        summary = result.duplicates.summary()
+        if summary:
+            result.warnings.append(summary)
+
+
+def sniff_format(filepath):
+    """Detect the format from the first DETECT_SAMPLE records, or None."""
+    pending = []
+    for line_num, raw in iter_lines(filepath):
+        if raw.strip():
+            pending.append((line_num, parse_line(line_num, raw), raw))
+            if len(pending) >= DETECT_SAMPLE:
+                break
+    return _detect_pending(pending)
+
+
+def validate_file(filepath, fmt=None, expected_field=None, collect_stats=True, rules=None, workers=1,
+                  model=None, token_threads=None, dedup=None, scanner=None, cache=None):
+    """Validate (and profile) `filepath` in one streaming pass.
+
+    fmt: "SFT"/"DPO"/"RFT" or None to auto-detect from the first
+    DETECT_SAMPLE records. `rules` overrides the rule set entirely.
+    collect_stats may also name optional stats sections: "profile",
+    "repeats" or a tuple of both (see DatasetStats).
+    workers > 1 splits files of at least MIN_SHARD_BYTES per worker into
+    line-aligned byte ranges and validates them in a process pool; the
+    report is identical to a single-process run.
+    model picks the tokenizer encoding (token_count.py); token_threads caps
+    the encoding threads per process. dedup is a dict of
+    dedup.NearDuplicateIndex options ({"on": "prompt", "threshold": 0.8})
+    to also cluster near-duplicate records into result.duplicates.
+    scanner is a risk_scan.RiskScanner for the content-risk scan (see
+    make_rules()). cache is a cache file path for incremental validation
+    (see _validate_incremental(); ignored with a custom `rules`).
+    Returns a ValidationResult; result.format is None (and only the generic
+    stats are collected) if the format could not be detected.
+    """
+    if cache and rules is None:
+        result = _validate_incremental(filepath, cache, fmt, expected_field, collect_stats, workers,
+                                       model, token_threads, dedup, scanner)
+        if result is not None:
+            return result
+    if workers > 1:
+        n = min(workers, os.path.getsize(filepath) // MIN_SHARD_BYTES)
+        if n > 1:
+            threads = token_threads or max(1, (os.cpu_count() or 1) // n)
+            return _validate_sharded(filepath, fmt, expected_field, collect_stats, rules, n,
+                                     model, threads, dedup, scanner)
+
+    counter = get_counter(model, token_threads)
+    result = ValidationResult(filepath, fmt.upper() if fmt else None, counter)
+    result.duplicates = _new_duplicate_index(dedup)
+    pending = []  # (line_num, record, raw, tokens) buffered until the format is known
+
+    def start(detected):
+        result.format = detected
+        if detected:
+            result.rules = rules or make_rules(detected, expected_field, scanner)
+        if collect_stats:
+            result.stats = DatasetStats(detected or "unknown", _stats_extras(collect_stats), model)
+        for item in pending:
+            _check_record(result, *item)
+        pending.clear()
+
+    detecting = not (result.format or rules)
+    if not detecting:
+        start(result.format or rules.name)
+    for line_num, record, raw, tokens in _read_records(filepath, counter):
+        result.total += 1
+        if isinstance(record, ParseError):
+            result.parse_errors += 1
+        if detecting:
+            pending.append((line_num, record, raw, tokens))
+            if len(pending) >= DETECT_SAMPLE:
+                start(_detect_pending(pending))
+                detecting = False
+            continue
+        _check_record(result, line_num, record, raw, tokens)
+
+    if detecting:
+        start(_detect_pending(pending))
+    _flush(result)
+    _finish(result)
+    return result
+
+
+def validate_shard(filepath, start, end, line_offset, fmt, expected_field=None, collect_stats=True,
+                   rules=None, model=None, token_threads=None, dedup=None, scanner=None):
+    """Validate bytes [start, end) of `filepath` with the format already known.
+
+    Line numbers in messages are file-global (line_offset lines precede
+    `start`). Cross-record checks are left to the caller: merge the shard
+    results in order, then call rules.finish() once.
+    """
+    counter = get_counter(model, token_threads)
+    result = ValidationResult(filepath, fmt, counter)
+    if fmt:
+        result.rules = rules or make_rules(fmt, expected_field, scanner)
+    if collect_stats:
+        result.stats = DatasetStats(fmt or "unknown", _stats_extras(collect_stats), model)
+    result.duplicates = _new_duplicate_index(dedup)
+    for line_num, record, raw, tokens in _read_records(filepath, counter, start, end, line_offset):
+        result.total += 1
+        if isinstance(record, ParseError):
+            result.parse_errors += 1
+        _check_record(result, line_num, record, raw, tokens)
+    _flush(result)
+    return result
+
+
+def _validate_sharded(filepath, fmt, expected_field, collect_stats, rules, workers, model, token_threads,
+                      dedup, scanner):
+    fmt = fmt.upper() if fmt else (rules.name if rules else sniff_format(filepath))
+    ranges = shard_ranges(filepath, workers)
+    # Imported by name so workers can unpickle the functions when this file
+    # runs as __main__ (python engine.py, ft validate) under spawn.
+    import engine
+
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        starts, ends = zip(*ranges)
+        line_counts = list(pool.map(count_lines, [filepath] * len(ranges), starts, ends))
+        offsets = [sum(line_counts[:i]) for i in range(len(ranges))]
+        futures = [
+            pool.submit(engine.validate_shard, filepath, s, e, offset, fmt, expected_field,
+                        collect_stats, rules, model, token_threads, dedup, scanner)
+            for (s, e), offset in zip(ranges, offsets)
+        ]
+        shards = [f.result() for f in futures]
+    return _merge_shards(shards)
+
+
+def _merge_shards(shards):
+    """Fold consecutive shard results into the first, then run _finish()."""
+    result = shards[0]
+    for shard in shards[1:]:
+        result.total += shard.total
+        result.parse_errors += shard.parse_errors
+        result.errors.merge(shard.errors)
+        result.warnings.merge(shard.warnings)
+        if result.rules is not None:
+            result.rules.merge(shard.rules)
+        if result.stats is not None:
+            result.stats.merge(shard.stats)
+        if result.duplicates is not None:
+            result.duplicates.merge(shard.duplicates)
+    _finish(result)
+    return result
+
+
+def _cache_key(fmt, expected_field, collect_stats, model, dedup, scanner):
+    """Everything a cached chunk result depends on besides its bytes."""
+    code = hashlib.blake2b(digest_size=16)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in _CACHED_MODULES:
+        with open(os.path.join(here, name), "rb") as f:
+            code.update(f.read())
+    return (code.hexdigest(), fmt, expected_field, collect_stats, get_counter(model).encoding_name,
+            tuple(sorted((dedup or {}).items())), scanner.key if scanner else None)
+
+
+def default_cache_path(filepath):
+    """The --incremental cache of `filepath` in the local cache directory
+    (common._cache_dir), or None when local caching is disabled."""
+    cache_dir = _cache_dir()
+    if not cache_dir:
+        return None
+    name = hashlib.blake2b(os.path.abspath(filepath).encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, "validation", name + CACHE_SUFFIX)
+
+
+def _signing_key():
+    """This user's cache signing key (created on first use, mode 0600), or
+    None when local caching is disabled or the key cannot be stored."""
+    cache_dir = _cache_dir()
+    if not cache_dir:
+        return None
+    path = os.path.join(cache_dir, CACHE_KEY_FILE)
+    try:
+        with open(path, "rb") as f:
+            key = f.read()
+        if len(key) == 32:
+            return key
+    except OSError:
+        pass
+    key = os.urandom(32)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        os.replace(tmp, path)
+    except OSError:
+        return None
+    return key
+
+
+def _load_cache(path, key):
+    """Cached chunk results, or {} unless the file carries this user's
+    signature: it is a pickle, so nothing unsigned is ever unpickled."""
+    secret = _signing_key()
+    if secret is None:
+        return {}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return {}
+    header = len(_CACHE_MAGIC) + 32
+    payload = data[header:]
+    tag = hmac.new(secret, payload, hashlib.sha256).digest()
+    if not data.startswith(_CACHE_MAGIC) or not hmac.compare_digest(data[len(_CACHE_MAGIC):header], tag):
+        return {}
+    try:
+        cached = pickle.loads(payload)
+    except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return {}
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return {}
+    return cached["chunks"]
+
+
+def _save_cache(path, key, chunks):
+    secret = _signing_key()
+    if secret is None:
+        print(f"⚠️  Validation cache not written: no signing key in the local cache directory", file=sys.stderr)
+        return
+    payload = pickle.dumps({"key": key, "chunks": chunks}, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(_CACHE_MAGIC + hmac.new(secret, payload, hashlib.sha256).digest() + payload)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️  Could not write validation cache {path}: {e}", file=sys.stderr)
+
+
+def _validate_incremental(filepath, cache_path, fmt, expected_field, collect_stats, workers, model,
+                          token_threads, dedup, scanner):
+    """Validate `filepath` reusing cached per-chunk results.
+
+    The file is cut into content-defined chunks (jsonl_io.content_chunks).
+    Each chunk's shard result is cached under (digest, first line number),
+    so after rows are appended or a region is edited only the chunks whose
+    bytes (or starting line) changed are re-validated; every cached result
+    is merged back in file order and the cross-record checks (_finish())
+    run over the whole file as usual. The cache holds the results of the
+    current chunks only and is dropped when the options or the validator
+    code change. The cache is a pickle signed with a per-user key kept in
+    the local cache directory (HMAC-SHA256): a cache written by anyone
+    else, including one shipped next to a dataset, fails the check and is
+    rebuilt rather than unpickled. Returns None when the format cannot be
+    detected.
+    """
+    fmt = fmt.upper() if fmt else sniff_format(filepath)
+    if not fmt:
+        return None
+    key = _cache_key(fmt, expected_field, collect_stats, model, dedup, scanner)
+    cached = _load_cache(cache_path, key)
+
+    chunks, todo, line_offset = [], [], 0
+    for start, end, lines, digest in content_chunks(filepath):
+        chunk_key = (digest, line_offset)
+        chunks.append(chunk_key)
+        if chunk_key not in cached:
+            todo.append((chunk_key, start, end, line_offset))
+        line_offset += lines
+
+    fresh = {}
+    if workers > 1 and len(todo) > 1:
+        import engine  # see _validate_sharded
+
+        n = min(workers, len(todo))
+        threads = token_threads or max(1, (os.cpu_count() or 1) // n)
+        with ProcessPoolExecutor(max_workers=n) as pool:
+            futures = [pool.submit(engine.validate_shard, filepath, start, end, offset, fmt, expected_field,
+                                   collect_stats, None, model, threads, dedup, scanner)
+                       for _, start, end, offset in todo]
+            for (chunk_key, *_), future in zip(todo, futures):
+                fresh[chunk_key] = pickle.dumps(future.result(), protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        for chunk_key, start, end, offset in todo:
+            shard = validate_shard(filepath, start, end, offset, fmt, expected_field, collect_stats,
+                                   None, model, token_threads, dedup, scanner)
+            fresh[chunk_key] = pickle.dumps(shard, protocol=pickle.HIGHEST_PROTOCOL)
+
+    blobs = {chunk_key: fresh.get(chunk_key) or cached[chunk_key] for chunk_key in chunks}
+    if todo or len(blobs) != len(cached):
+        _save_cache(cache_path, key, blobs)
+    if not chunks:  # empty file
+        result = validate_shard(filepath, 0, 0, 0, fmt, expected_field, collect_stats,
+                                None, model, token_threads, dedup, scanner)
+        _finish(result)
+    else:
+        result = _merge_shards([pickle.loads(blobs[chunk_key]) for chunk_key in chunks])
+    result.cache = {"path": cache_path, "chunks": len(chunks), "reused": len(chunks) - len(todo)}
+    return result
+
+
+# ── Reports ──────────────────────────────────────────────────────────────────
+
+def _print_categories(issues, top=5):
+    print(f"  By type:")
+    for category, count in issues.categories.most_common(top):
+        print(f"    {count:>8,} × {category}")
+
+
+def print_validation_report(result):
+    """Print the validation report in the validate_<format>.py layout."""
+    print(f"\n{'='*60}")
+    print(f"{result.format} Validation Report: {result.filepath}")
+    print(f"{'='*60}")
+    print(f"Total records: {result.total}")
+    print(f"Errors: {len(result.errors)}")
+    print(f"Warnings: {len(result.warnings)}")
+
+    if result.rules is not None:
+        result.rules.print_summary(result)
+
+    if result.errors:
+        print(f"\n❌ ERRORS (must fix):")
+        for e in result.errors[:20]:
+            print(f"  • {e}")
+        if len(result.errors) > 20:
+            print(f"  ... and {len(result.errors) - 20} more errors")
+            _print_categories(result.errors)
+
+    if result.warnings:
+        print(f"\n⚠️  WARNINGS:")
+        for w in result.warnings[:10]:
+            print(f"  • {w}")
+        if len(result.warnings) > 10:
+            print(f"  ... and {len(result.warnings) - 10} more warnings")
+            _print_categories(result.warnings)
+
+    if result.rules is not None:
+        result.rules.print_tips(result)
+
+    if not result.errors:
+        print(f"\n✅ Data is valid for {result.format} fine-tuning!")
+    else:
+        print(f"\n❌ Fix {len(result.errors)} error(s) before submitting.")
+
+
+def _token_basis(result):
+    return f"exact, {result.token_encoding}" if result.tokens_exact else "approx"
+
+
+def print_stats_report(result):
+    """Print the data_stats.py report from the stats gathered during the pass."""
+    stats = result.stats
+    n = stats.records
+    tokens = stats.token_counts
+
+    print(f"\n{'='*60}")
+    print(f"Dataset Statistics: {result.filepath}")
+    print(f"{'='*60}")
+    print(f"Format:           {stats.format}")
+    print(f"Total records:    {n}")
+    print(f"Parse errors:     {result.parse_errors}")
+    print(f"")
+    print(f"Token {'Counts' if result.tokens_exact else 'Estimates'} ({_token_basis(result)}):")
+    print(f"  Total:          {tokens.total:,}")
+    print(f"  Average/record: {tokens.mean:,.0f}")
+    print(f"  Min:            {tokens.min:,}")
+    print(f"  Max:            {tokens.max:,}")
+    print(f"  P50/P90/P99:    {tokens.quantile(0.5):,.0f} / {tokens.quantile(0.9):,.0f} / "
+          f"{tokens.quantile(0.99):,.0f}")
+
+    if stats.format == "SFT":
+        print(f"\nRole Distribution:")
+        for role, count in stats.role_counts.most_common():
+            print(f"  {role}: {count}")
+        print(f"\nRecords with system message: {stats.has_system}/{n}")
+
+    elif stats.format == "DPO":
+        print(f"\nPreferred output avg tokens:     {stats.pref_tokens.mean:,.0f}")
+        print(f"Non-preferred output avg tokens: {stats.non_pref_tokens.mean:,.0f}")
+
+    elif stats.format == "RFT":
+        values = stats.grader_values
+        unique = f"{values.count()}" if values.exact else f"~{values.count():,}"
+        print(f"\nGrader fields found:")
+        for field, count in stats.grader_field_counts.most_common():
+            print(f"  • '{field}' — in {count}/{n} records")
+        print(f"Unique grader values: {unique}/{stats.grader_value_lengths.count}")
+        print(f"Avg grader value length: {stats.grader_value_lengths.mean:.0f} chars")
+
+    # Dataset size guidance
+    print(f"\n📊 Dataset size guidance:")
+    if n < 50:
+        print(f"  ⚠️ Very small dataset ({n} records). May only learn format, not domain knowledge.")
+    elif n < 200:
+        print(f"  ⚠️ Small dataset. Good for initial experiments — evaluate results and add more data if needed.")
+    elif n <= 500:
+        print(f"  ✅ Sweet spot for getting started (200-500). Evaluate results to decide if you need more.")
+    elif n <= 2000:
+        print(f"  ✅ Good dataset size. Watch for diminishing returns — check if quality beats quantity.")
+    else:
+        print(f"  ⚠️ Large dataset ({n:,}). Larger isn't always better — especially for OSS models "
+              "where 335-500 examples outperformed 4K.")
+
+
+def report_duplicates(result, output=None, full_report=True):
+    """Print the duplicate report and/or write the deduplicated copy."""
+    if result.duplicates is None:
+        return
+    if full_report:
+        print_duplicate_report(result.duplicates)
+    if output:
+        written = write_deduplicated(result.filepath, output, result.duplicates.duplicate_lines())
+        print(f"\n💾 Wrote {written} deduplicated records to {output}")
+
+
+def add_workers_argument(parser):
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Validate in N processes, one byte-range shard each (default: 1; "
+                             f"files under {MIN_SHARD_BYTES // (1024 * 1024)}MB per worker stay single-process)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Validate a fine-tuning JSONL file and report dataset statistics in one pass.")
+    parser.add_argument("filepath", help="Path to the JSONL file")
+    parser.add_argument("--format", choices=["auto", "sft", "dpo", "rft"], default="auto",
+                        help="Dataset format (default: auto-detect)")
+    parser.add_argument("--expected-field", default=None,
+                        help="RFT only: grader field name to require (e.g. 'answer')")
+    parser.add_argument("--no-stats", action="store_true", help="Skip the dataset statistics report")
+    add_workers_argument(parser)
+    parser.add_argument("--model", default=None,
+                        help="Target model for exact token counts (default encoding: o200k_base; "
+                             "needs tiktoken, otherwise counts are ~4 chars/token estimates)")
+    parser.add_argument("--token-threads", type=int, default=None,
+                        help="Threads per process for token counting (default: all cores)")
+    add_dedup_arguments(parser)
+    add_risk_arguments(parser)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Cache per-chunk results and only re-check chunks that changed since the last "
+                             "run (cache: ~/.cache/foundry-finetuning/validation/, signed per user)")
+    parser.add_argument("--cache-file", default=None,
+                        help="Cache file for --incremental (implies --incremental); only caches signed "
+                             "by your own key are read")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the reports as one JSON document instead of text")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.isfile(args.filepath):
+        print(f"❌ File not found: {args.filepath}")
+        sys.exit(1)
+    fmt = None if args.format == "auto" else args.format
+    cache = args.cache_file or (default_cache_path(args.filepath) if args.incremental else None)
+    if args.incremental and not cache:
+        print("⚠️  Local caching is disabled (FOUNDRY_FT_NO_CACHE); validating the whole file", file=sys.stderr)
+    result = validate_file(args.filepath, fmt=fmt, expected_field=args.expected_field,
+                           collect_stats=not args.no_stats, workers=args.workers,
+                           model=args.model, token_threads=args.token_threads,
+                           dedup=dedup_options(args), scanner=scanner_from_args(args), cache=cache)
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2, ensure_ascii=False))
+        if args.dedup_output and result.duplicates is not None:
+            write_deduplicated(result.filepath, args.dedup_output, result.duplicates.duplicate_lines())
+        sys.exit(0 if result.ok and result.format else 1)
+    if result.format is None:
+        print(f"❌ Could not detect the format of {args.filepath}; pass --format sft|dpo|rft")
+        sys.exit(1)
+    if not fmt:
+        print(f"Detected format: {result.format}")
+    if result.cache is not None:
+        checked = result.cache["chunks"] - result.cache["reused"]
+        print(f"♻️  Incremental: re-checked {checked} of {result.cache['chunks']} chunk(s), "
+              f"{result.cache['reused']} from {result.cache['path']}")
+    print_validation_report(result)
+    if result.stats is not None and result.stats.records:
+        print_stats_report(result)
+    report_duplicates(result, args.dedup_output)
+    if not result.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Repeated content in bounded memory: the most frequent assistant
+responses, system prompts, sentences, openings and closings of a dataset.
+
+Each stream goes through a space-saving summary (Metwally et al.): k
+counters, and an item not being counted takes over the counter with the
+lowest count, inheriting that count as its error bound. Every item that
+occurs more than N/k times in a stream of N is guaranteed to be in the
+summary, with a count overestimated by at most its error, so templated
+answers and boilerplate sentences surface with exact-enough counts in
+O(k) memory however many rows the file has. Summaries of consecutive
+shards merge (the counts of both sides are added, plus the other side's
+minimum for items it could have evicted), so --workers and --incremental
+runs report the same heavy hitters within the same error bounds.
+
+Text is normalized before counting (lowercase words, punctuation and
+whitespace dropped). Responses and system prompts are keyed by a digest
+of the normalized text, with the first 120 characters kept for the
+report. Phrases are counted at two grains, each at most once per record
+so that their coverage is the fraction of records containing them: the
+sentences of every response (MIN_SENTENCE_WORDS words or more) and the
+n-grams opening and closing it (its first and last NGRAM_SIZE words).
+N-grams at every word offset would send one mostly-unique item per word
+through the summary, each evicting a counter; sentences and the edge
+n-grams catch boilerplate, templated starts and sign-offs at about one
+item per sentence.
+"""
+import hashlib
+import heapq
+import re
+
+NGRAM_SIZE = 8
+MIN_SENTENCE_WORDS = 4
+RESPONSE_CAPACITY = 1024
+SYSTEM_CAPACITY = 256
+PHRASE_CAPACITY = 4096
+SAMPLE_CHARS = 120
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class SpaceSaving:
+    """Top-k frequent items of a stream in k counters."""
+
+    def __init__(self, k):
+        self.k = k
+        self.total = 0
+        self.counters = {}  # key -> [count, error, sample]
+        self._heap = []     # one (count, key) per counter; counts may lag (fixed when popped)
+
+    def add(self, key, sample):
+        self.total += 1
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += 1
+            return
+        if len(self.counters) < self.k:
+            self.counters[key] = [1, 0, sample]
+            heapq.heappush(self._heap, (1, key))
+            return
+        heap, counters = self._heap, self.counters
+        while True:
+            count, victim = heap[0]
+            actual = counters[victim][0]
+            if actual == count:
+                break
+            heapq.heapreplace(heap, (actual, victim))
+        heapq.heapreplace(heap, (count + 1, key))
+        del counters[victim]
+        counters[key] = [count + 1, count, sample]
+
+    def minimum(self):
+        """The count an unmonitored item may have had (0 while not full)."""
+        if len(self.counters) < self.k:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other):
+        """Absorb the summary of another part of the stream."""
+        mine, theirs = self.minimum(), other.minimum()
+        merged = {}
+        for key, (count, error, sample) in self.counters.items():
+            extra = other.counters.get(key)
+            if extra is None:
+                merged[key] = [count + theirs, error + theirs, sample]
+            else:
+                merged[key] = [count + extra[0], error + extra[1], sample]
+        for key, (count, error, sample) in other.counters.items():
+            if key not in merged:
+                merged[key] = [count + mine, error + mine, sample]
+        if len(merged) > self.k:
+            # ties broken by key so the result does not depend on dict order
+            kept = heapq.nlargest(self.k, merged.items(), key=lambda item: (item[1][0], item[0]))
+            merged = dict(kept)
+        self.counters = merged
+        self.total += other.total
+        self._heap = [(counter[0], key) for key, counter in merged.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n=10):
+        """[(count, error, sample)] of the n most frequent items, count descending."""
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        return [tuple(counter) for _, counter in ranked[:n]]
+
+
+def _normalize(text):
+    return _WORD.findall(text.lower())
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part["text"] for part in content
+                        if isinstance(part, dict) and isinstance(part.get("text"), str))
+    return ""
+
+
+def _digest(words):
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+
+
+class RepeatedContent:
+    """Heavy hitters among the responses, system prompts, sentences,
+    openings and closings of SFT/DPO/RFT records."""
+
+    def __init__(self):
+        self.records = 0  # records with at least one assistant response
+        self.responses = SpaceSaving(RESPONSE_CAPACITY)
+        self.system_prompts = SpaceSaving(SYSTEM_CAPACITY)
+        self.sentences = SpaceSaving(PHRASE_CAPACITY)
+        self.openings = SpaceSaving(PHRASE_CAPACITY)
+        self.closings = SpaceSaving(PHRASE_CAPACITY)
+
+    def add(self, record):
+        messages = []
+        for field in ("messages", "preferred_output", "non_preferred_output"):
+            if isinstance(record.get(field), list):
+                messages += record[field]
+        if isinstance(record.get("input"), dict) and isinstance(record["input"].get("messages"), list):
+            messages += record["input"]["messages"]
+
+        sentences, openings, closings = {}, set(), set()
+        responded = False
+        for msg in messages:
+            if not isinstance(msg, dict):
+                continue
+            role = msg.get("role")
+            if role not in ("assistant", "system"):
+                continue
+            text = _text(msg.get("content"))
+            if role == "system":
+                words = _normalize(text)
+                if words:
+                    self.system_prompts.add(_digest(words), text[:SAMPLE_CHARS])
+                continue
+            words = []
+            for sentence in _SENTENCE_END.split(text):
+                normalized = _normalize(sentence)
+                words += normalized
+                if len(normalized) >= MIN_SENTENCE_WORDS:
+                    sentences.setdefault(" ".join(normalized), sentence.strip()[:SAMPLE_CHARS])
+            if not words:
+                continue
+            responded = True
+            self.responses.add(_digest(words), text[:SAMPLE_CHARS])
+            if len(words) >= NGRAM_SIZE:
+                openings.add(" ".join(words[:NGRAM_SIZE]))
+                closings.add(" ".join(words[-NGRAM_SIZE:]))
+        if responded:
+            self.records += 1
+        for key, sample in sentences.items():
+            self.sentences.add(key, sample)
+        for gram in openings:
+            self.openings.add(gram, gram)
+        for gram in closings:
+            self.closings.add(gram, gram)
+
+    def merge(self, other):
+        self.records += other.records
+        self.responses.merge(other.responses)
+        self.system_prompts.merge(other.system_prompts)
+        self.sentences.merge(other.sentences)
+        self.openings.merge(other.openings)
+        self.closings.merge(other.closings)
+
+    def summary(self, top=10):
+        """The report as a JSON-serializable dict. Items listed are those
+        that certainly repeat (count - error > 1)."""
+        def section(summary, denominator):
+            return [{"count": count, "error": error, "coverage": round(count / denominator, 6) if denominator else 0.0,
+                     "text": sample} for count, error, sample in summary.top(top) if count - error > 1]
+
+        return {
+            "records_with_responses": self.records,
+            "responses": {"total": self.responses.total, "top": section(self.responses, self.responses.total)},
+            "system_prompts": {"total": self.system_prompts.total,
+                               "top": section(self.system_prompts, self.system_prompts.total)},
+            "sentences": {"min_words": MIN_SENTENCE_WORDS, "top": section(self.sentences, self.records)},
+            "openings": {"words": NGRAM_SIZE, "top": section(self.openings, self.records)},
+            "closings": {"words": NGRAM_SIZE, "top": section(self.closings, self.records)},
+        }
+
+
+def print_repeats(repeats, top=10):
+    """Print the heavy-hitter report."""
+    summary = repeats.summary(top)
+    print(f"\n{'='*60}")
+    print(f"Repeated Content (top {top}, space-saving estimates)")
+    print(f"{'='*60}")
+    sections = (
+        ("Assistant responses", summary["responses"]["top"], "of responses"),
+        ("System prompts", summary["system_prompts"]["top"], "of system prompts"),
+        ("Sentences in responses", summary["sentences"]["top"], "of records"),
+        (f"Response openings (first {NGRAM_SIZE} words)", summary["openings"]["top"], "of records"),
+        (f"Response closings (last {NGRAM_SIZE} words)", summary["closings"]["top"], "of records"),
+    )
+    for title, items, unit in sections:
+        print(f"\n{title}:")
+        if not items:
+            print(f"  ✅ Nothing repeats")
+            continue
+        for item in items:
+            bound = f" (±{item['error']:,})" if item["error"] else ""
+            text = " ".join(item["text"].split())
+            print(f"  • {item['count']:,}×{bound} — {item['coverage']:.1%} {unit}: \"{text[:80]}\"")
+    responses = summary["responses"]["top"]
+    if responses and responses[0]["coverage"] >= 0.05:
+        print(f"\n⚠️  One response covers {responses[0]['coverage']:.0%} of all responses — templated or "
+              "degenerate data teaches the model to repeat it.")
@@ -0,0 +1,285 @@
+"""Image checks for vision fine-tuning examples (image_url content blocks).
+
+Limits are those of references/vision-fine-tuning.md: JPEG, PNG or WEBP,
+RGB or RGBA, at most 10 MB per image and 64 images per example, images
+only in user messages.
+
+Base64 data URIs are never decoded whole. The decoded size follows from
+the payload length and padding, and the header bytes are read through a
+window onto the base64 text: byte n of the image sits in base64 characters
+4*(n//3) onwards, so a PNG's IHDR, a WEBP's VP8 header or a JPEG's SOF
+segment (found by hopping over the segments before it) costs a few
+hundred decoded bytes per image, however large the image is. Public URLs
+are only checked for their scheme unless fetching is requested; then a
+ranged GET reads the first 64 KB on a thread pool (ImageChecker).
+"""
+import binascii
+import re
+import urllib.error
+import urllib.request
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_IMAGES_PER_EXAMPLE = 64
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_EXAMPLES = 50_000  # examples with images per training file
+MIN_VISION_EXAMPLES = 10
+ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP")
+ALLOWED_MODES = ("RGB", "RGBA")
+DETAIL_VALUES = ("low", "high", "auto")
+FETCH_BYTES = 64 * 1024
+FETCH_TIMEOUT = 10
+
+# size: decoded bytes (None when unknown); format/mode/width/height None when not sniffed
+ImageInfo = namedtuple("ImageInfo", ["format", "mode", "width", "height", "size"])
+
+_DATA_URI = re.compile(r"data:([^;,]*)((?:;[^;,]*)*),", re.IGNORECASE)
+_PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_STANDALONE = {0x01} | set(range(0xD0, 0xD9))
+_MAX_JPEG_SEGMENTS = 256
+_URL_EXTENSIONS = {".gif": "GIF", ".bmp": "BMP", ".tif": "TIFF", ".tiff": "TIFF", ".svg": "SVG",
+                   ".heic": "HEIC", ".avif": "AVIF"}
+
+
+class _Base64Window:
+    """Random access to the bytes a base64 string decodes to."""
+
+    def __init__(self, text, start=0):
+        self.text = text
+        self.start = start  # payload offset in `text`
+
+    def read(self, offset, n):
+        first = offset // 3
+        chunk = self.text[self.start + 4 * first:self.start + 4 * -(-(offset + n) // 3)]
+        data = binascii.a2b_base64(chunk)
+        skip = offset - 3 * first
+        return data[skip:skip + n]
+
+
+def _u16(data, i):
+    return int.from_bytes(data[i:i + 2], "big")
+
+
+def _u16le(data, i):
+    return int.from_bytes(data[i:i + 2], "little")
+
+
+def _u24le(data, i):
+    return int.from_bytes(data[i:i + 3], "little")
+
+
+def sniff_image(read):
+    """(format, mode, width, height) from header bytes; read(offset, n) -> bytes.
+
+    format is None for unrecognized data; mode and dimensions are None when the
+    header that holds them could not be reached.
+    """
+    head = read(0, 32)
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and len(head) >= 26:
+        return "PNG", _PNG_MODES.get(head[25]), int.from_bytes(head[16:20], "big"), \
+            int.from_bytes(head[20:24], "big")
+    if head.startswith(b"\xff\xd8"):
+        return ("JPEG",) + _sniff_jpeg(read)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ("WEBP",) + _sniff_webp(head)
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF", "P", int.from_bytes(head[6:8], "little"), int.from_bytes(head[8:10], "little")
+    if head[:2] == b"BM":
+        return "BMP", None, None, None
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "TIFF", None, None, None
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        return ("AVIF" if brand.startswith(b"avi") else "HEIC"), None, None, None
+    return None, None, None, None
+
+
+def _sniff_jpeg(read):
+    pos = 2
+    for _ in range(_MAX_JPEG_SEGMENTS):
+        marker = read(pos, 4)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        kind = marker[1]
+        if kind == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if kind in _JPEG_STANDALONE:
+            pos += 2
+            continue
+        if kind in _JPEG_SOF:
+            sof = read(pos + 4, 6)
+            if len(sof) == 6:
+                return _JPEG_MODES.get(sof[5], f"{sof[5]}-channel"), _u16(sof, 3), _u16(sof, 1)
+            break
+        if kind == 0xDA or len(marker) < 4:  # scan data before any frame header
+            break
+        pos += 2 + _u16(marker, 2)
+    return None, None, None
+
+
+def _sniff_webp(head):
+    chunk = head[12:16]
+    if chunk == b"VP8X" and len(head) >= 30:
+        mode = "RGBA" if head[20] & 0x10 else "RGB"
+        return mode, _u24le(head, 24) + 1, _u24le(head, 27) + 1
+    if chunk == b"VP8L" and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], "little")
+        mode = "RGBA" if bits >> 28 & 1 else "RGB"
+        return mode, (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1
+    if chunk == b"VP8 " and len(head) >= 30:
+        return "RGB", _u16le(head, 26) & 0x3FFF, _u16le(head, 28) & 0x3FFF
+    return None, None, None
+
+
+def data_uri_info(url):
+    """(ImageInfo, media type, issues) for a data: URI, decoding only headers."""
+    match = _DATA_URI.match(url)
+    if not match:
+        return None, None, [("error", "malformed data URI (expected data:image/<type>;base64,...)")]
+    media_type = match.group(1).lower()
+    if ";base64" not in match.group(2).lower():
+        return None, media_type, [("error", "data URI is not base64-encoded")]
+    start = match.end()
+    length = len(url) - start
+    issues = []
+    if length % 4:
+        issues.append(("warning", "base64 payload length is not a multiple of 4 (truncated?)"))
+    padding = len(url) - len(url.rstrip("=")) if length else 0
+    size = length // 4 * 3 + (length % 4 * 3) // 4 - padding
+    try:
+        fmt, mode, width, height = sniff_image(_Base64Window(url, start).read)
+    except (binascii.Error, ValueError):
+        return ImageInfo(None, None, None, None, size), media_type, issues + [("error", "invalid base64 data")]
+    return ImageInfo(fmt, mode, width, height, size), media_type, issues
+
+
+def fetch_url_info(url, timeout=FETCH_TIMEOUT):
+    """(ImageInfo, issues) for a public URL from a ranged GET of its first bytes."""
+    request = urllib.request.Request(url, headers={"Range": f"bytes=0-{FETCH_BYTES - 1}"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read(FETCH_BYTES)
+            content_range = response.headers.get("Content-Range", "")
+            length = response.headers.get("Content-Length")
+            partial = response.status == 206
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        return None, [("error", f"URL not accessible ({getattr(e, 'reason', e)})")]
+    if partial and "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+        size = int(content_range.rsplit("/", 1)[1])
+    else:
+        size = int(length) if length and length.isdigit() and not partial else None
+    fmt, mode, width, height = sniff_image(lambda offset, n: data[offset:offset + n])
+    return ImageInfo(fmt, mode, width, height, size), []
+
+
+def info_issues(info):
+    """Limit violations of a sniffed image, as (level, message)."""
+    issues = []
+    if info.size is not None and info.size > MAX_IMAGE_BYTES:
+        issues.append(("error", f"image is {info.size / 1024 / 1024:.1f} MB "
+                                f"(max {MAX_IMAGE_BYTES // (1024 * 1024)} MB)"))
+    if info.format is None:
+        issues.append(("error", "not a recognizable image"))
+    elif info.format not in ALLOWED_FORMATS:
+        issues.append(("error", f"format {info.format} is not supported ({', '.join(ALLOWED_FORMATS)} only)"))
+    elif info.mode is not None and info.mode not in ALLOWED_MODES:
+        issues.append(("error", f"color mode {info.mode} is not supported (convert to RGB or RGBA)"))
+    return issues
+
+
+def check_image(part, fetch=False):
+    """(ImageInfo or None, [(level, message)]) for one image_url content block.
+
+    Data URIs are fully checked; http(s) URLs are fetched only with `fetch`
+    (a network round trip — use ImageChecker to run those concurrently).
+    """
+    image_url = part.get("image_url")
+    url = image_url.get("url") if isinstance(image_url, dict) else image_url
+    if not isinstance(url, str) or not url:
+        return None, [("error", "image_url block without a 'url'")]
+    issues = []
+    detail = image_url.get("detail") if isinstance(image_url, dict) else None
+    if detail is not None and detail not in DETAIL_VALUES:
+        issues.append(("error", f"invalid detail '{detail}' (expected: {', '.join(DETAIL_VALUES)})"))
+
+    if url[:5].lower() == "data:":
+        info, media_type, uri_issues = data_uri_info(url)
+        issues += uri_issues
+        if info is None:
+            return None, issues
+        issues += info_issues(info)
+        declared = media_type.split("/")[-1].upper().replace("JPG", "JPEG")
+        if info.format and declared and declared != info.format:
+            issues.append(("warning", f"data URI says {media_type} but the bytes are {info.format}"))
+        return info, issues
+
+    scheme = url.split(":", 1)[0].lower()
+    if scheme not in ("http", "https"):
+        return None, issues + [("error", f"unsupported URL scheme '{scheme}' (use https or a base64 data URI)")]
+    if not fetch:
+        path = url.split("?", 1)[0].split("#", 1)[0].lower()
+        for ext, fmt in _URL_EXTENSIONS.items():
+            if path.endswith(ext):
+                issues.append(("warning", f"URL looks like a {fmt} image ({', '.join(ALLOWED_FORMATS)} only)"))
+        return None, issues
+    info, fetch_issues = fetch_url_info(url)
+    issues += fetch_issues
+    if info is not None:
+        issues += info_issues(info)
+    return info, issues
+
+
+class ImageChecker:
+    """Runs check_image() over a record's image blocks.
+
+    Data URIs and unfetched URLs are checked inline. With fetch=True, URL
+    probes go to a thread pool of `threads` so network latency overlaps;
+    their results come back in submission order from results(). Pool and
+    pending probes are dropped by results(wait=True), so a checker pickles
+    cleanly between passes.
+    """
+
+    def __init__(self, fetch=False, threads=16):
+        self.fetch = fetch
+        self.threads = threads
+        self._pool = None
+        self._pending = deque()  # (label, future)
+
+    def check(self, label, part):
+        """(ImageInfo, issues) for one block now, or (None, []) once its URL probe is queued."""
+        if self.fetch and not _is_data_uri(part):
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads)
+            self._pending.append((label, self._pool.submit(check_image, part, True)))
+            return None, []
+        return check_image(part)
+
+    def results(self, wait=False):
+        """(label, ImageInfo, issues) of finished probes, oldest first.
+
+        Blocks on the oldest probe while more than 4 x threads are queued
+        (bounding memory), and on all of them with wait=True.
+        """
+        done = []
+        pending = self._pending
+        while pending and (wait or pending[0][1].done() or len(pending) > 4 * self.threads):
+            label, future = pending.popleft()
+            done.append((label,) + future.result())
+        if wait and self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        return done
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"], state["_pending"] = None, deque()
+        return state
+
+
+def _is_data_uri(part):
+    image_url = part.get("image_url")
+    url = image_url.get("url") if isinstance(image_url, dict) else image_url
+    return isinstance(url, str) and url[:5].lower() == "data:"
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Check validation/test files for prompts that also appear in training data.
+
+The user prompt of every training record is reduced to two 64-bit
+fingerprints — one of the exact text, one of the normalized text (lowercase
+words, punctuation and whitespace dropped) — and added to a Bloom filter
+sized from the training line count (~1.2 bytes per prompt each, at a 1% false
+positive rate). Each file checked is streamed against the filters; hits
+are then confirmed by a second streaming pass over training that only
+collects the fingerprints that hit, so every reported overlap is real and
+carries its training line. Memory stays flat for multi-million-row
+training sets.
+
+Usage:
+  python leakage.py --train train.jsonl --check validation.jsonl test.jsonl
+  python leakage.py --split-dir distill_output/     # train/validation/test.jsonl
+"""
+import argparse
+import hashlib
+import math
+import os
+import re
+import sys
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_io import count_lines, read_jsonl
+
+FALSE_POSITIVE_RATE = 0.01
+_WORD = re.compile(r"\w+")
+
+
+def user_prompt(record):
+    """The user turns of a SFT/DPO/RFT record, newline-joined ("" if none)."""
+    if isinstance(record.get("input"), dict):
+        messages = record["input"].get("messages")
+    else:
+        messages = record.get("messages")
+    if not isinstance(messages, list):
+        return ""
+    return "\n".join(str(m["content"]) for m in messages
+                     if isinstance(m, dict) and m.get("role") == "user" and m.get("content"))
+
+
+def _fingerprint(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def fingerprints(record):
+    """(exact, normalized) prompt fingerprints, or None without a user prompt."""
+    prompt = user_prompt(record)
+    if not prompt.strip():
+        return None
+    return _fingerprint(prompt), _fingerprint(" ".join(_WORD.findall(prompt.lower())))
+
+
+class BloomFilter:
+    """Bit-array set membership for 64-bit fingerprints (double hashing)."""
+
+    def __init__(self, capacity, fp_rate=FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fp):
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, fp):
+        bits = self.bits
+        for pos in self._positions(fp):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, fp):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fp))
+
+
+def _records(path):
+    for line_num, record in read_jsonl(path):
+        if isinstance(record, dict):
+            fps = fingerprints(record)
+            if fps:
+                yield line_num, fps
+
+
+class LeakageReport:
+    """Overlaps of one checked file with the training files."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self.candidates = []  # (line, exact fp, normalized fp) that hit a filter
+        self.exact = []       # (line, (train path, train line))
+        self.normalized = []  # same, matching only after normalization
+
+    @property
+    def leaked(self):
+        return len(self.exact) + len(self.normalized)
+
+
+def check_leakage(train_paths, check_paths):
+    """Probe every file in `check_paths` against the prompts of `train_paths`.
+
+    Returns one LeakageReport per checked file, in order.
+    """
+    capacity = sum(count_lines(p) + 1 for p in train_paths)
+    exact_filter, norm_filter = BloomFilter(capacity), BloomFilter(capacity)
+    for path in train_paths:
+        for _, (exact, norm) in _records(path):
+            exact_filter.add(exact)
+            norm_filter.add(norm)
+
+    reports = []
+    wanted = set()
+    for path in check_paths:
+        report = LeakageReport(path)
+        for line_num, (exact, norm) in _records(path):
+            report.records += 1
+            if exact in exact_filter or norm in norm_filter:
+                report.candidates.append((line_num, exact, norm))
+                wanted.update((exact, norm))
+        reports.append(report)
+
+    # Confirm: first training location of every fingerprint that hit
+    found = {}
+    if wanted:
+        for path in train_paths:
+            for line_num, (exact, norm) in _records(path):
+                for fp, kind in ((exact, "exact"), (norm, "normalized")):
+                    if fp in wanted:
+                        found.setdefault((kind, fp), (path, line_num))
+
+    for report in reports:
+        for line_num, exact, norm in report.candidates:
+            if ("exact", exact) in found:
+                report.exact.append((line_num, found["exact", exact]))
+            elif ("normalized", norm) in found:
+                report.normalized.append((line_num, found["normalized", norm]))
+        report.candidates = []
+    return reports
+
+
+def print_leakage_report(reports, train_paths, examples=10):
+    print(f"\n{'='*60}")
+    print(f"Split Leakage Report (training: {', '.join(train_paths)})")
+    print(f"{'='*60}")
+    for report in reports:
+        pct = report.leaked / report.records if report.records else 0
+        icon = "✅" if not report.leaked else "❌"
+        print(f"\n{icon} {report.path}: {report.leaked}/{report.records} prompts seen in training ({pct:.1%})")
+        print(f"  Exact:                 {len(report.exact)}")
+        print(f"  After normalization:   {len(report.normalized)}")
+        shown = (report.exact + report.normalized)[:examples]
+        for line_num, (train_path, train_line) in sorted(shown):
+            print(f"  • line {line_num} ↔ {os.path.basename(train_path)}:{train_line}")
+        if report.leaked > examples:
+            print(f"  ... and {report.leaked - examples} more")
+    if any(r.leaked for r in reports):
+        print(f"\n⚠️  Leaked prompts inflate evaluation scores — remove them from the held-out files "
+              "(or from training) before evaluating.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check validation/test JSONL files for user prompts that also appear in training.")
+    parser.add_argument("--train", nargs="+", default=[], help="Training JSONL file(s)")
+    parser.add_argument("--check", nargs="+", default=[], help="Validation/test JSONL file(s) to check")
+    parser.add_argument("--split-dir", default=None,
+                        help="Directory with train.jsonl, validation.jsonl and test.jsonl "
+                             "(generate_distillation_data.py output); test is also checked against validation")
+    args = parser.parse_args(argv)
+
+    runs = []
+    if args.split_dir:
+        train, val, test = (os.path.join(args.split_dir, f"{n}.jsonl") for n in ("train", "validation", "test"))
+        runs.append(([train], [p for p in (val, test) if os.path.isfile(p)]))
+        if os.path.isfile(val) and os.path.isfile(test):
+            runs.append(([val], [test]))
+    if args.train or args.check:
+        runs.append((args.train, args.check))
+    if not runs or not all(train and check for train, check in runs):
+        parser.error("pass --train and --check, or --split-dir")
+    missing = [p for train, check in runs for p in train + check if not os.path.isfile(p)]
+    if missing:
+        print(f"❌ File not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    leaked = False
+    for train, check in runs:
+        reports = check_leakage(train, check)
+        print_leakage_report(reports, train)
+        leaked = leaked or any(r.leaked for r in reports)
+    if leaked:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Token-length profile of a dataset: percentiles, log-scale histograms,
+per-role and per-format breakdowns, and over-limit counts per model.
+
+Lengths are kept as one compact unsigned 32-bit array per series (stdlib
+array: 4 bytes per value, so a 1M-record SFT file with 3 messages each
+holds ~16 MB) and the figures are computed once at the end, vectorized
+with NumPy when it is installed. Percentiles are exact (nearest rank
+below), unlike the streaming sketch of the main report. Histogram bins
+are powers of two: "0", "1", "2-3", "4-7", ... up to the bin of the
+longest value, so documents for two versions of a dataset diff line by
+line.
+
+Series: "record" (the whole example, as billed), "roles" (each message
+on its own, without reply priming), and per format: DPO "prompt",
+"preferred" and "non_preferred"; RFT "grader_value" (each non-message
+field). Per-message counts encode every message a second time, so
+profiling roughly doubles the token counting cost.
+"""
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from token_count import get_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Max tokens per training example (Azure OpenAI fine-tuning model table).
+# Override or extend with --token-limit MODEL=TOKENS.
+TRAINING_TOKEN_LIMITS = {
+    "gpt-4.1": 65_536,
+    "gpt-4.1-mini": 65_536,
+    "gpt-4.1-nano": 65_536,
+    "gpt-4o": 65_536,
+    "gpt-4o-mini": 65_536,
+    "o4-mini": 65_536,
+    "gpt-35-turbo": 16_385,
+}
+PERCENTILES = (0.5, 0.9, 0.99)
+_ROLES = ("system", "user", "assistant", "tool")
+
+
+def _series():
+    return array("I")
+
+
+def _bin_label(k):
+    if k < 2:
+        return str(k)
+    return f"{1 << (k - 1)}-{(1 << k) - 1}"
+
+
+def describe(values):
+    """count / total / mean / min / p50 / p90 / p99 / max and the log2
+    histogram of an array of lengths (None when empty)."""
+    n = len(values)
+    if not n:
+        return None
+    if np is not None:
+        data = np.frombuffer(values, dtype=np.uint32)
+        ordered = np.sort(data)
+        total = int(data.sum(dtype=np.uint64))
+        picks = [int(ordered[int(q * (n - 1))]) for q in PERCENTILES]
+        bins = np.bincount(np.frexp(data.astype(np.float64))[1]).tolist()  # exponent == bit_length
+        lo, hi = int(ordered[0]), int(ordered[-1])
+    else:
+        ordered = sorted(values)
+        total = sum(ordered)
+        picks = [ordered[int(q * (n - 1))] for q in PERCENTILES]
+        bins = [0] * (ordered[-1].bit_length() + 1)
+        for v in ordered:
+            bins[v.bit_length()] += 1
+        lo, hi = ordered[0], ordered[-1]
+    summary = {"count": n, "total": total, "mean": round(total / n, 1), "min": lo}
+    summary.update({f"p{round(q * 100)}": v for q, v in zip(PERCENTILES, picks)})
+    summary["max"] = hi
+    summary["histogram"] = {_bin_label(k): c for k, c in enumerate(bins)}
+    return summary
+
+
+def count_over(values, limit):
+    """How many of `values` exceed `limit`."""
+    if np is not None:
+        return int(np.count_nonzero(np.frombuffer(values, dtype=np.uint32) > limit))
+    return sum(1 for v in values if v > limit)
+
+
+class LengthProfile:
+    """Per-series token lengths of one file (or shard), in file order."""
+
+    def __init__(self, fmt, model=None):
+        self.format = fmt
+        self.model = model
+        self.record = _series()
+        self.roles = {}     # role -> series; roles outside _ROLES pool under "other"
+        self.parts = {}     # format-specific series (see module docstring)
+
+    def _add_messages(self, messages, count):
+        if not isinstance(messages, list):
+            return
+        for msg in messages:
+            if not isinstance(msg, dict):
+                continue
+            role = msg.get("role")
+            role = role if role in _ROLES else "other"
+            series = self.roles.get(role)
+            if series is None:
+                series = self.roles[role] = _series()
+            series.append(count([msg], priming=False))
+
+    def _part(self, name, value):
+        series = self.parts.get(name)
+        if series is None:
+            series = self.parts[name] = _series()
+        series.append(value)
+
+    def add(self, record, tokens):
+        count = get_counter(self.model).count_messages
+        self.record.append(tokens.total)
+        if self.format == "DPO":
+            inputs = record.get("input")
+            self._add_messages(inputs.get("messages") if isinstance(inputs, dict) else None, count)
+            self._add_messages(record.get("preferred_output"), count)
+            self._add_messages(record.get("non_preferred_output"), count)
+            self._part("prompt", tokens.total - tokens.preferred - tokens.non_preferred)
+            self._part("preferred", tokens.preferred)
+            self._part("non_preferred", tokens.non_preferred)
+            return
+        self._add_messages(record.get("messages"), count)
+        if self.format == "RFT":
+            count_text = get_counter(self.model).count_text
+            for field in sorted(record):
+                if field != "messages":
+                    self._part("grader_value", count_text(str(record[field])))
+
+    def merge(self, other):
+        """Append the lengths of the next shard."""
+        self.record.extend(other.record)
+        for target, source in ((self.roles, other.roles), (self.parts, other.parts)):
+            for name, series in source.items():
+                target.setdefault(name, _series()).extend(series)
+
+    def summary(self, limits=None):
+        """The profile as a JSON-serializable dict (stable key order)."""
+        limits = dict(TRAINING_TOKEN_LIMITS, **(limits or {}))
+        n = len(self.record)
+        over = {}
+        for model, limit in sorted(limits.items()):
+            count = count_over(self.record, limit)
+            over[model] = {"limit": limit, "records": count, "fraction": round(count / n, 6) if n else 0.0}
+        return {
+            "format": self.format,
+            "vectorized": np is not None,
+            "record": describe(self.record),
+            "roles": {role: describe(self.roles[role]) for role in sorted(self.roles)},
+            "parts": {name: describe(self.parts[name]) for name in sorted(self.parts)},
+            "over_limit": over,
+        }
+
+
+def _row(name, d):
+    return (f"  {name:<14} {d['count']:>9,} {d['mean']:>9,.0f} {d['p50']:>8,} {d['p90']:>8,} "
+            f"{d['p99']:>8,} {d['max']:>9,}")
+
+
+def print_profile(profile, limits=None, width=40):
+    """Print the profile tables and the record-length histogram."""
+    summary = profile.summary(limits)
+    record = summary["record"]
+    if record is None:
+        return
+    print(f"\nToken length profile ({'NumPy' if summary['vectorized'] else 'pure Python'}):")
+    print(f"  {'series':<14} {'count':>9} {'mean':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>9}")
+    print(_row("record", record))
+    for role, d in summary["roles"].items():
+        print(_row(f"role:{role}", d))
+    for name, d in summary["parts"].items():
+        print(_row(name, d))
+
+    print(f"\nRecord length histogram (tokens, log2 bins):")
+    peak = max(record["histogram"].values())
+    for label, count in record["histogram"].items():
+        if count:
+            print(f"  {label:>13} {count:>9,} {'█' * max(1, round(width * count / peak))}")
+
+    print(f"\nRecords over the per-example training limit:")
+    for model, d in summary["over_limit"].items():
+        mark = "⚠️ " if d["records"] else "✅"
+        print(f"  {mark} {model:<14} > {d['limit']:>7,} tokens: {d['records']:,} ({d['fraction']:.2%})")
+
+
+def parse_token_limits(values):
+    """{model: tokens} from --token-limit MODEL=TOKENS values."""
+    limits = {}
+    for value in values or ():
+        model, sep, tokens = value.partition("=")
+        if not sep or not tokens.strip().isdigit():
+            raise ValueError(f"--token-limit expects MODEL=TOKENS, got '{value}'")
+        limits[model.strip()] = int(tokens)
+    return limits
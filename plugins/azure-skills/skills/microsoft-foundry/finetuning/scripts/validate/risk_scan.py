@@ -0,0 +1,169 @@
+"""Content-risk scanner: phrases and regexes that trip the Azure RAI filter.
+
+The phrase list is folded into a trie and compiled once into a single
+regex (shared prefixes are factored out, so the engine walks each byte of
+the line once instead of once per phrase — Aho-Corasick style); custom
+regexes are alternated into a second compiled pattern. scan_line() runs
+the phrase trie over the raw JSONL line bytes first; only lines that hit
+are walked field by field to report which field each hit was in. Custom
+regexes always run on the decoded field text: the raw line holds JSON
+escapes (\\n, \\") and starts with '{', so anchors, quotes and newlines in
+a pattern would not match it.
+
+The dictionary is configurable with a JSON file:
+
+    {
+      "phrases": {"reasoning-elicitation": ["chain of thought", "let me think"]},
+      "regex":   {"credentials": ["api[_-]?key\\s*[:=]"]}
+    }
+
+Phrases match case-insensitively with any whitespace between words.
+"""
+import json
+import re
+
+DEFAULT_TERMS = {
+    "phrases": {
+        # Reasoning-elicitation wording trips the RAI filter on RFT jobs
+        "reasoning-elicitation": [
+            "chain of thought", "step by step reasoning", "let me think",
+            "think carefully", "reason through",
+        ],
+    },
+    "regex": {},
+}
+
+# Between phrase words: whitespace, or its JSON escape in the raw line
+_RAW_SPACE = r"(?:\s|\\[nrt])+"
+_TEXT_SPACE = r"\s+"
+
+
+def _trie_pattern(phrases, space):
+    """One regex matching any of `phrases`, prefixes shared (longest wins)."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end of a phrase
+
+    def build(node):
+        branches = [(space if ch == " " else re.escape(ch)) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # a phrase ends here but longer ones continue: greedy optional tail
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class RiskScanner:
+    """Compiled phrase/regex dictionary. Build once, scan every line."""
+
+    def __init__(self, terms=None):
+        terms = terms or DEFAULT_TERMS
+        self.categories = {}  # normalized phrase -> category
+        for category, phrases in terms.get("phrases", {}).items():
+            for phrase in phrases:
+                self.categories[" ".join(phrase.lower().split())] = category
+        self.regexes = [(category, pattern)
+                        for category, patterns in terms.get("regex", {}).items() for pattern in patterns]
+
+        # Raw-line prefilter for the literal phrases. The trie runs
+        # case-sensitively over the lowercased line: re.IGNORECASE costs
+        # several times more per byte.
+        phrases = sorted(self.categories)
+        # bytes.lower() only folds ASCII, so non-ASCII phrases skip the prefilter;
+        # custom regexes only mean something on decoded text, so they do too
+        self._raw_prefilter = bool(phrases) and not self.regexes and all(phrase.isascii() for phrase in phrases)
+        self._raw_phrases = re.compile(_trie_pattern(phrases, _RAW_SPACE).encode("utf-8")) if phrases else None
+
+        text_parts = [f"(?P<phrase>{_trie_pattern(phrases, _TEXT_SPACE)})"] if phrases else []
+        text_parts += [f"(?P<r{i}>{pattern})" for i, (_, pattern) in enumerate(self.regexes)]
+        self._text = re.compile("|".join(text_parts), re.IGNORECASE) if text_parts else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def key(self):
+        """Hashable identity of the dictionary (engine.py keys result caches on it)."""
+        return tuple(sorted(self.categories.items())), tuple(self.regexes)
+
+    def _label(self, match):
+        """(term, category) for a match of the text pattern."""
+        name = match.lastgroup
+        if name == "phrase":
+            term = " ".join(match.group(0).lower().split())
+            return term, self.categories[term]
+        category, pattern = self.regexes[int(name[1:])]
+        return pattern, category
+
+    def scan_line(self, raw, record):
+        """Every hit in a record as (term, category, field path).
+
+        `raw` (the line bytes) is checked first with the phrase prefilter;
+        a line without a hit costs that single pass. Lines with \\uXXXX
+        escapes (json.dumps' default ensure_ascii output), and every line
+        when a phrase is non-ASCII or custom regexes are configured, skip
+        the prefilter and are scanned as decoded text. Fields are JSON
+        paths like "messages[1].content"; keys are scanned too
+        (path + "<key>").
+        """
+        if self._text is None:
+            return []
+        if self._raw_prefilter and b"\\u" not in raw and not self._raw_phrases.search(raw.lower()):
+            return []
+        hits = []
+        for path, text in _strings(record, ""):
+            for match in self._text.finditer(text):
+                term, category = self._label(match)
+                hits.append((term, category, path))
+        return hits
+
+
+def _strings(value, path):
+    if isinstance(value, str):
+        yield path or "<value>", value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            child = f"{path}.{key}" if path else str(key)
+            yield child + "<key>", str(key)
+            yield from _strings(item, child)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _strings(item, f"{path}[{i}]")
+
+
+def format_hits(hits):
+    """"'chain of thought' (messages[1].content), ..." — one entry per term and field."""
+    seen = []
+    for term, _, path in hits:
+        if (term, path) not in seen:
+            seen.append((term, path))
+    return ", ".join(f"'{term}' ({path})" for term, path in seen)
+
+
+def add_risk_arguments(parser, default_on=False):
+    """--risk-scan (unless the scan is always on) and --risk-terms."""
+    terms_help = "JSON phrase/regex dictionary for the content-risk scan (default: built-in RAI trigger phrases)"
+    if not default_on:
+        parser.add_argument("--risk-scan", action="store_true",
+                            help="Scan for phrases that trigger the Azure content moderation filter")
+        terms_help += "; implies --risk-scan"
+    parser.add_argument("--risk-terms", default=None, help=terms_help)
+
+
+def scanner_from_args(args, default_on=False):
+    """RiskScanner for add_risk_arguments() args, or None when scanning is off."""
+    if args.risk_terms:
+        return RiskScanner.from_file(args.risk_terms)
+    if default_on or getattr(args, "risk_scan", False):
+        return RiskScanner()
+    return None
@@ -0,0 +1,204 @@
+"""Constant-memory accumulators for the validators and data_stats.
+
+Every accumulator sees values one at a time, keeps O(1) state (or state
+bounded by a fixed constant), and can merge() another accumulator of the
+same kind so --workers shards fold together exactly as a single pass would:
+
+  RunningStats   count / total / min / max / mean
+  QuantileSketch relative-error percentiles (DDSketch-style log buckets)
+  DistinctSample bottom-k hash sample: exact distinct count up to k, an
+                 estimate beyond, and a uniform sample of distinct values
+  IssueLog       first N messages plus total and per-category counts
+"""
+import hashlib
+import math
+import re
+from collections import Counter
+
+
+class RunningStats:
+    """Running count, total, min, max and mean of numeric values."""
+
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def __bool__(self):
+        return self.count > 0
+
+
+class QuantileSketch(RunningStats):
+    """Percentiles of positive values within `relative_accuracy`.
+
+    Values are counted in logarithmic buckets (gamma = (1+a)/(1-a)), so a
+    token-length distribution spanning 1..1M needs under 700 buckets no
+    matter how many records are added. Bucket counts add on merge.
+    """
+
+    __slots__ = ("_gamma", "_log_gamma", "_buckets", "_zeros")
+
+    def __init__(self, relative_accuracy=0.01):
+        super().__init__()
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets = Counter()
+        self._zeros = 0
+
+    def add(self, value):
+        super().add(value)
+        if value <= 0:
+            self._zeros += 1
+        else:
+            self._buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+
+    def merge(self, other):
+        super().merge(other)
+        self._buckets.update(other._buckets)
+        self._zeros += other._zeros
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0..1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class DistinctSample:
+    """Bottom-k sample of distinct string values.
+
+    Keeps the k values with the smallest 64-bit hashes. Below k distinct
+    values the count is exact; beyond it, count() is the KMV estimate
+    (k - 1) / (k-th smallest hash / 2**64). Because the hash is stable
+    across processes, merging shard samples gives the same result as one
+    pass, and sample() is a deterministic uniform sample of distinct values.
+    """
+
+    __slots__ = ("k", "_kept", "_max")
+
+    def __init__(self, k=1024):
+        self.k = k
+        self._kept = {}  # hash -> value
+        self._max = None  # largest kept hash once the sample is full
+
+    def add(self, value):
+        h = _hash64(value)
+        kept = self._kept
+        if h in kept:
+            return
+        if len(kept) < self.k:
+            kept[h] = value
+            if len(kept) == self.k:
+                self._max = max(kept)
+        elif h < self._max:
+            del kept[self._max]
+            kept[h] = value
+            self._max = max(kept)
+
+    def merge(self, other):
+        self._kept.update(other._kept)
+        if len(self._kept) > self.k:
+            self._kept = dict(sorted(self._kept.items())[:self.k])
+        self._max = max(self._kept) if len(self._kept) == self.k else None
+
+    @property
+    def exact(self):
+        return len(self._kept) < self.k
+
+    def count(self):
+        if self.exact:
+            return len(self._kept)
+        return round((self.k - 1) / (max(self._kept) / 2 ** 64))
+
+    def sample(self, n=None):
+        return [v for _, v in sorted(self._kept.items())[:n]]
+
+    def __len__(self):
+        return self.count()
+
+
+_LINE_PREFIX = re.compile(r"^Line \d+(?:, message \d+)?: ")
+_QUOTED = re.compile(r"'[^']*'")
+_NUMBER = re.compile(r"\d+")
+
+
+def issue_category(message):
+    """Collapse a message to its template: line prefix dropped, quoted
+    values and numbers masked ("Missing expected field '…'")."""
+    message = _LINE_PREFIX.sub("", message)
+    return _NUMBER.sub("N", _QUOTED.sub("'…'", message))[:120]
+
+
+class IssueLog:
+    """Bounded list of issue messages.
+
+    Keeps the first `max_samples` messages in order plus the total and a
+    per-category Counter, so len() and the report stay exact while memory
+    stays flat on files with millions of bad lines. Supports the list
+    operations the reports use: append, len, bool, iteration, slicing.
+    """
+
+    def __init__(self, max_samples=100):
+        self.max_samples = max_samples
+        self.samples = []
+        self.total = 0
+        self.categories = Counter()
+
+    def append(self, message):
+        self.total += 1
+        self.categories[issue_category(message)] += 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append(message)
+
+    def merge(self, other):
+        """Append `other`'s issues after this log's (shard order = file order)."""
+        self.total += other.total
+        self.categories.update(other.categories)
+        room = self.max_samples - len(self.samples)
+        if room > 0:
+            self.samples.extend(other.samples[:room])
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return iter(self.samples)
+
+    def __getitem__(self, index):
+        return self.samples[index]
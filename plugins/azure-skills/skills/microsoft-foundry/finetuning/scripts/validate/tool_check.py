@@ -0,0 +1,441 @@
+"""Tool-calling checks for SFT examples: tools, tool_calls and tool replies.
+
+Every function in a record's `tools` must be a well-formed declaration;
+every assistant tool call must name a declared function, carry an `id`,
+and have `function.arguments` that parse as a JSON object matching the
+function's `parameters` schema; every `tool` message must answer, by
+`tool_call_id`, a call an earlier assistant message actually issued.
+
+Each distinct `parameters` schema is compiled once and the validator
+cached by tool name (ToolChecker), so a file with hundreds of thousands
+of calls to a handful of functions pays for schema compilation a handful
+of times. With jsonschema installed the validator is jsonschema's for the
+schema's draft; without it, a built-in compiler covers the keywords
+function schemas use (type, properties, required, additionalProperties,
+items, enum, const, anyOf/oneOf/allOf, local $ref, length, size and
+range bounds, pattern) and ignores the rest. oneOf is checked as anyOf.
+"""
+import json
+import os
+import re
+import sys
+from collections import Counter
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_io import PARSE_ERRORS, loads
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+MAX_SCHEMA_VARIANTS = 8  # cached schemas per tool name; more are compiled per use
+MAX_ARGUMENT_ERRORS = 3  # schema violations reported per call
+_FUNCTION_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_JSON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool,
+               "object": dict, "array": list, "null": type(None)}
+
+
+class SchemaError(ValueError):
+    """A `parameters` value that is not a usable JSON schema."""
+
+
+def _json_type(value):
+    for name, kind in _JSON_TYPES.items():
+        if name not in ("integer", "number") and isinstance(value, kind):
+            return name
+    if isinstance(value, float) and not value.is_integer():
+        return "number"
+    return "integer"
+
+
+def _type_ok(value, name):
+    if name in ("integer", "number"):
+        if isinstance(value, bool):
+            return False
+        if name == "integer" and isinstance(value, float):
+            return value.is_integer()
+    return isinstance(value, _JSON_TYPES[name])
+
+
+def _show(value, limit=40):
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _resolve(root, ref):
+    if not ref.startswith("#"):
+        raise SchemaError(f"only local $ref is supported, got '{ref}'")
+    node = root
+    for part in ref[1:].lstrip("/").split("/") if ref != "#" else ():
+        part = part.replace("~1", "/").replace("~0", "~")
+        if not isinstance(node, dict) or part not in node:
+            raise SchemaError(f"unresolvable $ref '{ref}'")
+        node = node[part]
+    return node
+
+
+def _compile(schema, root, refs):
+    """check(value, path, errors) for `schema`, or None if it accepts anything."""
+    if schema is True or schema == {}:
+        return None
+    if schema is False:
+        return lambda value, path, errors: errors.append(f"{path}: not allowed")
+    if not isinstance(schema, dict):
+        raise SchemaError(f"expected a schema object, got {_json_type(schema)}")
+    checks = []
+
+    if "$ref" in schema:
+        ref = schema["$ref"]
+        if ref not in refs:
+            refs[ref] = None  # placeholder: recursive references resolve at call time
+            refs[ref] = _compile(_resolve(root, ref), root, refs)
+
+        def check_ref(value, path, errors):
+            target = refs[ref]
+            if target:
+                target(value, path, errors)
+        checks.append(check_ref)
+
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        if not isinstance(types, list) or any(t not in _JSON_TYPES for t in types):
+            raise SchemaError(f"invalid 'type' {_show(schema['type'])}")
+        expected = " or ".join(types)
+        if len(types) == 1 and types[0] not in ("integer", "number"):
+            kind = _JSON_TYPES[types[0]]  # plain isinstance: the common case, kept cheap
+
+            def check_type(value, path, errors):
+                if not isinstance(value, kind):
+                    errors.append(f"{path}: expected {expected}, got {_json_type(value)}")
+        else:
+            def check_type(value, path, errors):
+                if not any(_type_ok(value, t) for t in types):
+                    errors.append(f"{path}: expected {expected}, got {_json_type(value)}")
+        checks.append(check_type)
+
+    if "enum" in schema:
+        enum = schema["enum"]
+        if not isinstance(enum, list):
+            raise SchemaError("'enum' must be an array")
+
+        def check_enum(value, path, errors):
+            if value not in enum:
+                errors.append(f"{path}: {_show(value)} is not one of {_show(enum, 80)}")
+        checks.append(check_enum)
+
+    if "const" in schema:
+        const = schema["const"]
+
+        def check_const(value, path, errors):
+            if value != const:
+                errors.append(f"{path}: expected {_show(const)}")
+        checks.append(check_const)
+
+    properties = schema.get("properties", {})
+    required = schema.get("required", [])
+    additional = schema.get("additionalProperties", True)
+    if not isinstance(properties, dict) or not isinstance(required, list):
+        raise SchemaError("'properties' must be an object and 'required' an array")
+    if properties or required or additional is not True:
+        props = {name: _compile(sub, root, refs) for name, sub in properties.items()}
+        extra = _compile(additional, root, refs) if isinstance(additional, dict) else None
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}: missing required property '{name}'")
+            for name, item in value.items():
+                if name in props:
+                    if props[name]:
+                        props[name](item, f"{path}.{name}", errors)
+                elif additional is False:
+                    errors.append(f"{path}: unexpected property '{name}'")
+                elif extra:
+                    extra(item, f"{path}.{name}", errors)
+        checks.append(check_object)
+
+    items = _compile(schema["items"], root, refs) if isinstance(schema.get("items"), (dict, bool)) else None
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if items or min_items is not None or max_items is not None:
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                errors.append(f"{path}: {len(value)} items (min {min_items})")
+            if max_items is not None and len(value) > max_items:
+                errors.append(f"{path}: {len(value)} items (max {max_items})")
+            if items:
+                for i, item in enumerate(value):
+                    items(item, f"{path}[{i}]", errors)
+        checks.append(check_array)
+
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    pattern = schema.get("pattern")
+    if min_length is not None or max_length is not None or pattern is not None:
+        try:
+            regex = re.compile(pattern) if pattern is not None else None
+        except (re.error, TypeError) as e:
+            raise SchemaError(f"invalid 'pattern' ({e})")
+
+        def check_string(value, path, errors):
+            if not isinstance(value, str):
+                return
+            if min_length is not None and len(value) < min_length:
+                errors.append(f"{path}: shorter than {min_length} characters")
+            if max_length is not None and len(value) > max_length:
+                errors.append(f"{path}: longer than {max_length} characters")
+            if regex is not None and not regex.search(value):
+                errors.append(f"{path}: {_show(value)} does not match '{pattern}'")
+        checks.append(check_string)
+
+    bounds = [(key, schema[key]) for key in ("minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum")
+              if isinstance(schema.get(key), (int, float))]
+    if bounds:
+        def check_number(value, path, errors):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return
+            for key, bound in bounds:
+                if not (value >= bound if key == "minimum" else value <= bound if key == "maximum"
+                        else value > bound if key == "exclusiveMinimum" else value < bound):
+                    errors.append(f"{path}: {value} violates {key} {bound}")
+        checks.append(check_number)
+
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            if not isinstance(schema[key], list) or not schema[key]:
+                raise SchemaError(f"'{key}' must be a non-empty array")
+            options = [_compile(sub, root, refs) for sub in schema[key]]
+
+            def check_any(value, path, errors, options=options, key=key):
+                for option in options:
+                    found = []
+                    if option:
+                        option(value, path, found)
+                    if not found:
+                        return
+                errors.append(f"{path}: matches none of the {key} alternatives")
+            checks.append(check_any)
+
+    if "allOf" in schema:
+        checks += [c for c in (_compile(sub, root, refs) for sub in schema["allOf"]) if c]
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path, errors):
+        for check in checks:
+            check(value, path, errors)
+    return check_all
+
+
+def _error_path(error):
+    return "arguments" + "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in error.absolute_path)
+
+
+def compile_schema(schema):
+    """validate(value) -> [violation messages] for a JSON schema. Raises SchemaError."""
+    if jsonschema is not None:
+        cls = jsonschema.validators.validator_for(schema)
+        try:
+            cls.check_schema(schema)
+        except jsonschema.SchemaError as e:
+            raise SchemaError(e.message)
+        validator = cls(schema)
+        return lambda value: [f"{_error_path(e)}: {e.message}"
+                              for e in islice(validator.iter_errors(value), MAX_ARGUMENT_ERRORS)]
+    check = _compile(schema, schema, {})
+    if check is None:
+        return lambda value: []
+
+    def validate(value):
+        errors = []
+        check(value, "arguments", errors)
+        return errors
+    return validate
+
+
+class ToolChecker:
+    """Checks the tool-calling parts of SFT records, caching compiled schemas.
+
+    check() returns (where, level, message) tuples; `where` is "" for
+    record-level issues or ", message i, tool call j"-style, to follow the
+    caller's "Line N". Call counts merge across shards; the validator cache
+    is per process and dropped when pickled.
+    """
+
+    def __init__(self):
+        self._validators = {}  # tool name -> [(parameters, validator or None, schema error)]
+        self.compiled = 0       # schemas compiled by this process (not merged)
+        self.records = 0        # records using tools
+        self.tool_calls = 0
+        self.tool_replies = 0
+        self.functions = Counter()  # calls per function name
+
+    def _validator(self, name, parameters):
+        """(validator or None, schema error or None) for a tool's parameters."""
+        variants = self._validators.setdefault(name, [])
+        for schema, validator, error in variants:
+            if schema == parameters:
+                return validator, error
+        try:
+            validator, error = compile_schema(parameters), None
+        except SchemaError as e:
+            validator, error = None, str(e)
+        except RecursionError:
+            validator, error = None, "schema nests too deeply"
+        self.compiled += 1
+        if len(variants) < MAX_SCHEMA_VARIANTS:
+            variants.append((parameters, validator, error))
+        return validator, error
+
+    def _declare(self, tools, issues):
+        """{function name: validator or None} for a record's 'tools' list."""
+        if not isinstance(tools, list):
+            issues.append(("", "error", "'tools' must be an array"))
+            return {}
+        declared = {}
+        for k, tool in enumerate(tools):
+            where = f", tool {k}"
+            function = tool.get("function") if isinstance(tool, dict) else None
+            if not isinstance(function, dict) or tool.get("type", "function") != "function":
+                issues.append((where, "error", "expected {\"type\": \"function\", \"function\": {...}}"))
+                continue
+            name = function.get("name")
+            if not isinstance(name, str) or not _FUNCTION_NAME.fullmatch(name):
+                issues.append((where, "error", f"invalid function name {_show(name)} "
+                                               "(letters, digits, '_' and '-', at most 64)"))
+                continue
+            if name in declared:
+                issues.append((where, "error", f"function '{name}' is declared twice"))
+                continue
+            parameters = function.get("parameters")
+            declared[name] = None
+            if parameters is None:
+                continue
+            if not isinstance(parameters, dict):
+                issues.append((where, "error", f"'{name}' parameters must be a JSON schema object"))
+                continue
+            declared[name], error = self._validator(name, parameters)
+            if error:
+                issues.append((where, "error", f"'{name}' parameters are not a valid JSON schema: {error}"))
+        return declared
+
+    def _check_call(self, where, call, declared, pending, answered, issues):
+        if not isinstance(call, dict):
+            issues.append((where, "error", "tool call must be an object"))
+            return
+        self.tool_calls += 1
+        call_id = call.get("id")
+        if not isinstance(call_id, str) or not call_id:
+            issues.append((where, "error", "missing 'id' (tool replies refer to it as 'tool_call_id')"))
+        elif call_id in pending or call_id in answered:
+            issues.append((where, "error", f"duplicate tool call id '{call_id}'"))
+        else:
+            pending[call_id] = None
+        if call.get("type", "function") != "function":
+            issues.append((where, "error", f"unsupported type '{call.get('type')}' (expected: function)"))
+        function = call.get("function")
+        name = function.get("name") if isinstance(function, dict) else None
+        if not isinstance(name, str) or not name:
+            issues.append((where, "error", "missing 'function.name'"))
+            return
+        self.functions[name] += 1
+        arguments = function.get("arguments")
+        if not isinstance(arguments, str):
+            issues.append((where, "error", f"'function.arguments' must be a JSON-encoded string, "
+                                           f"got {_json_type(arguments)}"))
+            return
+        try:
+            args = loads(arguments)
+        except PARSE_ERRORS:
+            issues.append((where, "error", f"'function.arguments' is not valid JSON: {_show(arguments)}"))
+            return
+        if declared is None:
+            return
+        if name not in declared:
+            issues.append((where, "error", f"calls '{name}', which is not declared in 'tools'"))
+            return
+        if not isinstance(args, dict):
+            issues.append((where, "error", f"arguments for '{name}' must be a JSON object, "
+                                           f"got {_json_type(args)}"))
+            return
+        validator = declared[name]
+        errors = validator(args) if validator else ()
+        if errors:
+            more = f" (+{len(errors) - 1} more)" if len(errors) > 1 else ""
+            issues.append((where, "error", f"arguments do not match the '{name}' schema — {errors[0]}{more}"))
+
+    def check(self, messages, tools=None):
+        """Issues in one record's tool declarations, calls and replies."""
+        issues = []
+        declared = self._declare(tools, issues) if tools is not None else None
+        pending = {}     # ids of calls still waiting for a tool reply (insertion-ordered)
+        answered = set()
+        uses_tools = declared is not None
+        warned = False
+        for i, msg in enumerate(messages):
+            if not isinstance(msg, dict):
+                continue
+            role = msg.get("role")
+            if role == "tool":
+                uses_tools = True
+                self.tool_replies += 1
+                call_id = msg.get("tool_call_id")
+                if not isinstance(call_id, str) or not call_id:
+                    issues.append((f", message {i}", "error", "tool message without a 'tool_call_id'"))
+                elif call_id in pending:
+                    del pending[call_id]
+                    answered.add(call_id)
+                elif call_id in answered:
+                    issues.append((f", message {i}", "error", f"second reply to tool call '{call_id}'"))
+                else:
+                    issues.append((f", message {i}", "error",
+                                   f"'tool_call_id' '{call_id}' does not match a tool call issued earlier"))
+                continue
+            if pending and role in ("user", "assistant"):
+                ids = ", ".join(islice(pending, 3)) + (" ..." if len(pending) > 3 else "")
+                issues.append((f", message {i}", "error",
+                               f"{len(pending)} tool call(s) without a tool reply before this message ({ids})"))
+                pending.clear()
+            calls = msg.get("tool_calls")
+            if calls is None:
+                continue
+            uses_tools = True
+            if role != "assistant":
+                issues.append((f", message {i}", "error", "'tool_calls' are only allowed in assistant messages"))
+                continue
+            if not isinstance(calls, list) or not calls:
+                issues.append((f", message {i}", "error", "'tool_calls' must be a non-empty array"))
+                continue
+            if declared is None and not warned:
+                warned = True
+                issues.append(("", "warning", "tool calls without a 'tools' declaration — "
+                                              "arguments cannot be checked against a schema"))
+            for j, call in enumerate(calls):
+                self._check_call(f", message {i}, tool call {j}", call, declared, pending, answered, issues)
+        # Calls still pending at the end are the example's final turn: the call is the target
+        if uses_tools:
+            self.records += 1
+        return issues
+
+    def merge(self, other):
+        self.records += other.records
+        self.tool_calls += other.tool_calls
+        self.tool_replies += other.tool_replies
+        self.functions.update(other.functions)
+
+    def summary(self):
+        return {"records": self.records, "calls": self.tool_calls, "replies": self.tool_replies,
+                "functions": dict(self.functions.most_common(20))}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_validators"] = {}
+        return state
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Validate vision fine-tuning (SFT with images) JSONL files for Microsoft Foundry.
+
+Checks the limits in references/vision-fine-tuning.md on top of the SFT checks:
+- JPEG / PNG / WEBP only, RGB or RGBA, at most 10 MB per image
+- At most 64 images per example and 50,000 examples with images per file
+- Images only in 'user' messages; valid 'detail' values
+
+Base64 data URIs are sized and sniffed from their header bytes without being
+decoded (image_check.py). Public URLs are checked for their scheme, or fetched
+(first 64 KB) with --check-urls. --workers validates shards in parallel.
+
+The checks live in engine.py (SFTRules) and image_check.py; this script
+validates with the SFT rule set forced and prints the report.
+"""
+import argparse
+import os
+import sys
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+except (AttributeError, OSError):
+    pass  # Stream not reconfigurable (older Python or non-tty); default encoding is fine
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from engine import SFTRules, add_workers_argument, print_validation_report, validate_file
+
+
+def validate_vision(filepath, workers=1, check_urls=False, url_threads=16):
+    rules = SFTRules(fetch_images=check_urls, url_threads=url_threads)
+    result = validate_file(filepath, fmt="SFT", collect_stats=False, rules=rules, workers=workers)
+    print_validation_report(result)
+    if not result.rules.image_count:
+        print("\n⚠️  No image_url content blocks found — this looks like a text-only SFT file.")
+    if not result.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Validate vision fine-tuning JSONL files (image_url content blocks) for Microsoft Foundry."
+    )
+    parser.add_argument("filepath", help="Path to the JSONL file to validate")
+    add_workers_argument(parser)
+    parser.add_argument("--check-urls", action="store_true",
+                        help="Fetch the first 64 KB of every public image URL to check reachability, "
+                             "size, format and color mode")
+    parser.add_argument("--url-threads", type=int, default=16,
+                        help="Concurrent URL fetches with --check-urls (default: 16)")
+    args = parser.parse_args()
+    validate_vision(args.filepath, workers=args.workers, check_urls=args.check_urls,
+                    url_threads=args.url_threads)